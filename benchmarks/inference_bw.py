@@ -0,0 +1,91 @@
+"""Benchmark of the inference of results from body weights.
+
+Compares the row-wise inference (InferWeight per row of the results) with the
+columnar inference of `infer_weight` (one conversion factor per unit, weight
+unit and per_bw) on the outputs of test_inference_bw.py repeated `--scale`
+times, with varying values, weights and units.
+
+    python benchmarks/inference_bw.py --scale 100
+"""
+import argparse
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from pkdb_analysis.inference.body_weight import (
+    infer_intervention,
+    infer_output,
+    infer_weight,
+)
+from pkdb_analysis.test.test_inference_bw import (
+    GROUP_OUTPUT,
+    INDIVIDUAL_NO_BODYWEIGHT_OUTPUT,
+    INDIVIDUAL_OUTPUT,
+)
+
+
+UNITS = ["ng", "mg / kilogram", "milligram / liter", "hour * milligram / liter"]
+
+
+def results(scale: int, seed: int = 42) -> pd.DataFrame:
+    """Outputs of test_inference_bw.py repeated scale times with varying values."""
+    rng = np.random.default_rng(seed)
+    outputs = [INDIVIDUAL_OUTPUT, GROUP_OUTPUT, INDIVIDUAL_NO_BODYWEIGHT_OUTPUT]
+    df = pd.DataFrame(outputs * scale * len(UNITS))
+    n = len(df)
+    df["unit"] = np.repeat(UNITS, len(outputs) * scale)
+    for field in ["value", "mean", "sd"]:
+        values = df[field].astype(float) * rng.lognormal(0.0, 0.3, n)
+        df[field] = values.where(df[field].notnull(), None)
+    for field in ["value_weight", "mean_weight"]:
+        df[field] = df[field].astype(float) * rng.lognormal(0.0, 0.1, n)
+    df["intervention_value"] = df["intervention_value"] * rng.lognormal(0.0, 0.3, n)
+    return df
+
+
+def infer_weight_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """Row-wise inference with InferWeight (reference implementation)."""
+    result_infer = df.dropna(subset=["unit_weight"])
+    result_no_bodyweight = df[df["unit_weight"].isnull()]
+    inferred = result_infer.apply(infer_output, axis="columns").dropna(how="all")
+    result_infer = pd.concat([result_infer, inferred], ignore_index=True)
+    inferred = result_infer.apply(infer_intervention, axis="columns").dropna(how="all")
+    result_infer = pd.concat([result_infer, inferred], ignore_index=True)
+    return pd.concat([result_infer, result_no_bodyweight], ignore_index=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--scale", type=int, default=100)
+    args = parser.parse_args()
+
+    df = results(args.scale)
+    timings = {}
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        for name, f in [("rows", infer_weight_rows), ("columns", infer_weight)]:
+            start = time.perf_counter()
+            inferred = f(df)
+            timings[name] = time.perf_counter() - start
+            if name == "rows":
+                reference = inferred
+
+    for field in ["unit", "intervention_unit", "inferred", "per_bw"]:
+        assert (reference[field].astype(str) == inferred[field].astype(str)).all()
+    np.testing.assert_allclose(
+        reference["intervention_value"].astype(float),
+        inferred["intervention_value"].astype(float),
+    )
+
+    print(f"{len(df)} results, {len(inferred)} with inferred results")
+    print(f"{'rows [s]':>10} {'columns [s]':>12} {'speedup':>8}")
+    print(
+        f"{timings['rows']:>10.3f} {timings['columns']:>12.3f} "
+        f"{timings['rows'] / timings['columns']:>8.1f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
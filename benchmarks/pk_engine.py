@@ -0,0 +1,255 @@
+"""Benchmark suite of the pharmacokinetics engines on synthetic timecourses.
+
+Times the calculation of the pharmacokinetics of synthetic one- and
+two-compartment timecourses (see pk.synthetic) of different sizes, NaN
+densities and units with
+
+- `timecourse_pk`: loop over TimecoursePK (pint quantities in every step)
+- `timecourse_pk_resolved`: loop over TimecoursePK(..., resolve_units=True)
+- `batch_pk`: vectorized batch engine including the unit conversion
+- `batch_pk_magnitudes`: vectorized batch engine on magnitudes
+
+Every engine is timed with the default `min_treshold` and with a small
+`min_treshold`, which masks the concentrations of the terminal phase as NaN
+(`masking`). The results are written as JSON or CSV (by suffix of the
+output) to compare the engines between commits, e.g.
+
+    python benchmarks/pk_engine.py --output pk_engine_main.json
+    python benchmarks/pk_engine.py --quick --compare pk_engine_main.json
+"""
+import argparse
+import itertools
+import json
+import platform
+import subprocess
+import sys
+import timeit
+import warnings
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from pkdb_analysis.pk.batch import batch_pk, batch_pk_magnitudes
+from pkdb_analysis.pk.pharmacokinetics import TimecoursePK
+from pkdb_analysis.pk.synthetic import synthetic_timecourses
+from pkdb_analysis.units import ureg
+
+
+Q_ = ureg.Quantity
+
+ENGINES = [
+    "timecourse_pk",
+    "timecourse_pk_resolved",
+    "batch_pk",
+    "batch_pk_magnitudes",
+]
+# concentrations < cmax / MASKING_TRESHOLD are NaN, i.e. the terminal phase
+MASKING_TRESHOLD = 10.0
+UNITS = {
+    "uniform": (["hr"], ["mg/l"]),
+    "mixed": (["hr", "min", "day"], ["mg/l", "ng/ml", "µg/l"]),
+}
+
+GRID = dict(
+    n_timecourses=[10, 100, 1000],
+    n_points=[10, 50, 200],
+    model=["one_compartment", "two_compartment"],
+    nan_fraction=[0.0, 0.2],
+    units=["uniform", "mixed"],
+)
+QUICK_GRID = dict(
+    n_timecourses=[10, 100],
+    n_points=[10, 50],
+    model=["one_compartment", "two_compartment"],
+    nan_fraction=[0.0, 0.2],
+    units=["uniform", "mixed"],
+)
+
+
+def engine_function(engine: str, timecourses: pd.DataFrame, doses, min_treshold):
+    """Function calculating the pharmacokinetics of all timecourses."""
+    if engine == "batch_pk":
+        return lambda: batch_pk(timecourses, doses, min_treshold=min_treshold)
+
+    if engine == "batch_pk_magnitudes":
+        times = [np.asarray(t) for t in timecourses["time"]]
+        concentrations = [np.asarray(c) for c in timecourses["value"]]
+        dose_magnitudes = np.array([d.magnitude for d in doses])
+        return lambda: batch_pk_magnitudes(
+            times, concentrations, doses=dose_magnitudes, min_treshold=min_treshold
+        )
+
+    resolve_units = engine == "timecourse_pk_resolved"
+    rows = [
+        (Q_(np.asarray(t), time_unit), np.asarray(c), unit, dose)
+        for t, time_unit, c, unit, dose in zip(
+            timecourses["time"],
+            timecourses["time_unit"],
+            timecourses["value"],
+            timecourses["unit"],
+            doses,
+        )
+    ]
+
+    def f_pk():
+        for time, c, unit, dose in rows:
+            TimecoursePK(
+                time=time,
+                concentration=Q_(c.copy(), unit),
+                dose=dose,
+                ureg=ureg,
+                min_treshold=min_treshold,
+                resolve_units=resolve_units,
+            ).pk
+
+    return f_pk
+
+
+def benchmark_case(
+    case: Dict, engines: List[str], repeat: int, max_loop: int, seed: int
+) -> List[Dict]:
+    """Timings of the engines for a case of the grid.
+
+    The loop engines (TimecoursePK) are timed on at most `max_loop`
+    timecourses, all timings are reported per timecourse.
+    """
+    time_units, units = UNITS[case["units"]]
+    timecourses, doses = synthetic_timecourses(
+        case["n_timecourses"],
+        n_points=case["n_points"],
+        model=case["model"],
+        nan_fraction=case["nan_fraction"],
+        time_units=time_units,
+        units=units,
+        seed=seed,
+    )
+
+    results = []
+    for engine, masking in itertools.product(engines, [False, True]):
+        n = len(timecourses)
+        tcs, ds = timecourses, doses
+        if engine.startswith("timecourse_pk") and n > max_loop:
+            n = max_loop
+            tcs, ds = timecourses.iloc[:n], doses[:n]
+        f = engine_function(
+            engine, tcs, ds, min_treshold=MASKING_TRESHOLD if masking else 1e6
+        )
+        f()  # warm up
+        number = max(1, int(np.ceil(1000 / (n * case["n_points"]))))
+        timings = timeit.repeat(f, number=number, repeat=repeat)
+        seconds = min(timings) / number
+        results.append(
+            {
+                **case,
+                "engine": engine,
+                "masking": masking,
+                "timed_timecourses": n,
+                "seconds": seconds,
+                "us_per_timecourse": seconds / n * 1e6,
+                "timecourses_per_second": n / seconds,
+            }
+        )
+    return results
+
+
+def metadata() -> Dict:
+    """Environment of the benchmark."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+    }
+
+
+def write_results(path: Path, results: pd.DataFrame) -> None:
+    """Writes the results as JSON (with metadata) or CSV."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.suffix.lower() == ".csv":
+        results.to_csv(path, index=False)
+    else:
+        with open(path, "w") as f_json:
+            json.dump(
+                {"metadata": metadata(), "results": results.to_dict("records")},
+                f_json,
+                indent=2,
+            )
+
+
+def read_results(path: Path) -> pd.DataFrame:
+    """Reads results of write_results."""
+    if path.suffix.lower() == ".csv":
+        return pd.read_csv(path)
+    with open(path) as f_json:
+        return pd.DataFrame(json.load(f_json)["results"])
+
+
+def compare(results: pd.DataFrame, baseline: pd.DataFrame) -> pd.DataFrame:
+    """Ratio of the timings of the results and a baseline (> 1 is slower)."""
+    keys = list(GRID) + ["engine", "masking"]
+    df = results.merge(baseline, on=keys, suffixes=("", "_baseline"))
+    df["ratio"] = df["us_per_timecourse"] / df["us_per_timecourse_baseline"]
+    return df[keys + ["us_per_timecourse_baseline", "us_per_timecourse", "ratio"]]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--output", type=Path, default=Path("pk_engine.json"))
+    parser.add_argument("--compare", type=Path, help="results of a previous run")
+    parser.add_argument("--engines", nargs="+", choices=ENGINES, default=ENGINES)
+    parser.add_argument("--quick", action="store_true", help="smaller grid")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-loop", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    grid = QUICK_GRID if args.quick else GRID
+    results = []
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        for values in itertools.product(*grid.values()):
+            case = dict(zip(grid, values))
+            results.extend(
+                benchmark_case(
+                    case,
+                    engines=args.engines,
+                    repeat=args.repeat,
+                    max_loop=args.max_loop,
+                    seed=args.seed,
+                )
+            )
+    results = pd.DataFrame(results)
+    write_results(args.output, results)
+
+    summary = results.pivot_table(
+        index=["n_points", "masking"],
+        columns="engine",
+        values="us_per_timecourse",
+        aggfunc="median",
+    )
+    print("median time per timecourse [µs]")
+    print(summary.round(1).to_string())
+    if args.compare is not None:
+        ratios = compare(results, read_results(args.compare))
+        print(f"\nratio to '{args.compare}' (> 1 is slower)")
+        print(ratios.groupby("engine")["ratio"].describe().round(2).to_string())
+    print(f"\nresults: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
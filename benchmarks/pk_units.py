@@ -0,0 +1,64 @@
+"""Microbenchmark of the unit handling in TimecoursePK.
+
+Compares the pharmacokinetics calculation with pint quantities in every step
+with the calculation on magnitudes with resolved units (`resolve_units=True`)
+for timecourses of different lengths.
+
+    python benchmarks/pk_units.py --number 200
+"""
+import argparse
+import timeit
+import warnings
+
+import numpy as np
+
+from pkdb_analysis.pk.pharmacokinetics import TimecoursePK
+from pkdb_analysis.units import ureg
+
+
+Q_ = ureg.Quantity
+
+
+def benchmark(n_timepoints: int, number: int, repeat: int = 5) -> dict:
+    """Time per TimecoursePK in ms with and without resolved units."""
+    t = np.linspace(0.0, 24.0, num=n_timepoints)
+    c = 10.0 * (np.exp(-0.2 * t) - np.exp(-2.0 * t))
+    dose = Q_(100.0, "mg")
+
+    results = {"n_timepoints": n_timepoints}
+    for resolve_units in [False, True]:
+
+        def f_pk():
+            return TimecoursePK(
+                time=Q_(t, "hr"),
+                concentration=Q_(c.copy(), "mg/l"),
+                dose=dose,
+                ureg=ureg,
+                resolve_units=resolve_units,
+            )
+
+        timings = timeit.repeat(f_pk, number=number, repeat=repeat)
+        key = "resolved" if resolve_units else "quantities"
+        results[key] = min(timings) / number * 1000
+    results["speedup"] = results["quantities"] / results["resolved"]
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--number", type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"{'n':>6} {'quantities [ms]':>16} {'resolved [ms]':>14} {'speedup':>8}")
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        for n_timepoints in [5, 10, 50, 500]:
+            r = benchmark(n_timepoints, number=args.number)
+            print(
+                f"{r['n_timepoints']:>6} {r['quantities']:>16.3f} "
+                f"{r['resolved']:>14.3f} {r['speedup']:>8.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
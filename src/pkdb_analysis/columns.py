@@ -0,0 +1,147 @@
+"""Column functions for the results of the MetaAnalysis.
+
+Additional columns of the results (e.g. the `additional_information` of the
+plot factories) are created by functions of the results. Column functions are
+vectorized, i.e. they receive the results DataFrame (or only the selected
+`columns`) and return a Series with a value per row, e.g.
+
+    @column_function(columns=["per_bw", "intervention_per_bw"])
+    def per_bw_any(df: pd.DataFrame) -> pd.Series:
+        return df["per_bw"] | df["intervention_per_bw"]
+
+Column functions can be registered under a name (register_column_function) and
+referenced by the name, e.g. `additional_information={"category": "unit_category"}`.
+
+Functions without the decorator are row-wise functions, which are applied with
+`DataFrame.apply(f, axis=1)` for compatibility. Row-wise functions are timed and
+a warning is raised for slow functions, which are worth porting to column
+functions.
+"""
+import logging
+import time
+import warnings
+from typing import Callable, Dict, List, Union
+
+import numpy as np
+import pandas as pd
+
+
+logger = logging.getLogger(__name__)
+
+# row-wise functions slower than this raise a warning
+SLOW_ROW_FUNCTION_SECONDS = 0.5
+COLUMN_FUNCTIONS: Dict[str, Callable] = {}
+
+
+def column_function(f: Callable = None, *, columns: List[str] = None) -> Callable:
+    """Marks a function of a DataFrame returning a Series as column function.
+
+    :param columns: columns passed to the function, all columns if None
+    """
+
+    def decorator(g: Callable) -> Callable:
+        g.column_function = True
+        g.columns = None if columns is None else list(columns)
+        return g
+
+    if f is None:
+        return decorator
+    return decorator(f)
+
+
+def is_column_function(f: Callable) -> bool:
+    return getattr(f, "column_function", False)
+
+
+def register_column_function(
+    name: str, f: Callable = None, columns: List[str] = None
+) -> Callable:
+    """Registers a column function under the name (can be used as decorator)."""
+
+    def decorator(g: Callable) -> Callable:
+        if not is_column_function(g) or columns is not None:
+            g = column_function(g, columns=columns)
+        COLUMN_FUNCTIONS[name] = g
+        return g
+
+    if f is None:
+        return decorator
+    return decorator(f)
+
+
+def resolve_column_function(f: Union[str, Callable]) -> Callable:
+    """Function or registered column function of the name."""
+    if isinstance(f, str):
+        if f not in COLUMN_FUNCTIONS:
+            raise KeyError(
+                f"No column function registered as '{f}', registered functions are "
+                f"{sorted(COLUMN_FUNCTIONS)}."
+            )
+        return COLUMN_FUNCTIONS[f]
+    return f
+
+
+def _name(f: Callable) -> str:
+    return getattr(f, "__qualname__", repr(f))
+
+
+def apply_column_function(
+    df: pd.DataFrame,
+    f: Union[str, Callable],
+    name: str = None,
+    timings: Dict[str, float] = None,
+) -> pd.Series:
+    """Values of a column or row-wise function for every row of the DataFrame.
+
+    :param f: column function, name of a registered column function or
+        row-wise function
+    :param name: name of the column in log messages and timings
+    :param timings: dictionary for the duration of the function in seconds
+    """
+    f = resolve_column_function(f)
+    name = name or _name(f)
+    start = time.perf_counter()
+    if is_column_function(f):
+        values = f(df if f.columns is None else df[f.columns])
+        if not isinstance(values, pd.Series):
+            values = pd.Series(np.broadcast_to(values, len(df)), index=df.index)
+        if len(values) != len(df):
+            raise ValueError(
+                f"Column function '{name}' returned {len(values)} values for "
+                f"{len(df)} rows."
+            )
+    elif df.empty:
+        values = pd.Series(dtype=object, index=df.index)
+    else:
+        values = df.apply(f, axis=1)
+    seconds = time.perf_counter() - start
+
+    if timings is not None:
+        timings[name] = seconds
+    logger.debug(f"column '{name}' created in {seconds:.3f} s ({len(df)} rows)")
+    if not is_column_function(f) and seconds > SLOW_ROW_FUNCTION_SECONDS:
+        warnings.warn(
+            f"Row-wise function '{_name(f)}' of column '{name}' took {seconds:.3f} s "
+            f"for {len(df)} rows, consider a column function (see "
+            f"pkdb_analysis.columns.column_function)."
+        )
+    return values
+
+
+@register_column_function("unit_category")
+@column_function(columns=["per_bw", "intervention_per_bw"])
+def unit_category(df: pd.DataFrame) -> pd.Series:
+    """Category of the units of output and intervention (absolute or per body weight).
+
+    Vectorized version of deprecated.analysis.figure_category.
+    """
+    per_bw = df["per_bw"].astype(bool).values
+    intervention_per_bw = df["intervention_per_bw"].astype(bool).values
+    output = np.where(per_bw, "rel_output", "abs_output")
+    intervention = np.where(
+        intervention_per_bw, "rel_intervention", "abs_intervention"
+    )
+    return pd.Series(
+        np.char.add(np.char.add(output, "_"), intervention).astype(object),
+        index=df.index,
+    )
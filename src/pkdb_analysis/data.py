@@ -357,29 +357,169 @@ class PKData(object):
         return PKData(**resulting_kwargs)
 
     @classmethod
-    def from_download(cls, path: Union[BytesIO, os.PathLike]) -> "PKData":
-        """Load data from downloaded zip archive."""
-        pkdata = cls.from_archive(path=path)
+    def concat(cls, pkdatas: Iterable["PKData"]) -> "PKData":
+        """Merges PKData instances by the primary keys of the tables.
+
+        The rows of a primary key are taken from the first instance containing
+        the key, so entries contained in multiple instances are not duplicated.
+        """
+        pkdatas = list(pkdatas)
+        if not pkdatas:
+            raise ValueError("At least one PKData instance is required.")
+
+        data_dict = {}
+        for df_key in PKData.KEYS:
+            pk = getattr(pkdatas[0], df_key).pk
+            seen_pks = set()
+            dfs = []
+            for pkdata in pkdatas:
+                df = getattr(pkdata, df_key).df
+                if pk in df.columns:
+                    pks = df[pk]
+                    df = df[~pks.isin(seen_pks)]
+                    seen_pks.update(pks.unique())
+                dfs.append(df)
+            data_dict[df_key] = pd.concat(dfs, ignore_index=True)
+
+        return PKData(**data_dict)
+
+    @classmethod
+    def from_download(
+        cls,
+        path: Union[BytesIO, os.PathLike],
+        tables: Iterable[str] = None,
+        columns: Dict[str, Iterable[str]] = None,
+    ) -> "PKData":
+        """Load data from downloaded zip archive (see PKData.from_archive)."""
+        pkdata = cls.from_archive(path=path, tables=tables, columns=columns)
         # fix the intervention keys due to different serialization format
         pkdata = cls._intervention_pk_update(pkdata)
         return pkdata
 
     @classmethod
-    def from_archive(cls, path: Union[BytesIO, os.PathLike]) -> "PKData":
-        """Load data from serialized archive."""
+    def from_archive(
+        cls,
+        path: Union[BytesIO, os.PathLike],
+        tables: Iterable[str] = None,
+        columns: Dict[str, Iterable[str]] = None,
+    ) -> "PKData":
+        """Load data from serialized archive.
+
+        Only the given tables are parsed and of these only the given columns
+        (in addition to the key columns, see PKData.is_key_column) are read.
+        Excluded tables are empty tables with the columns of the archive,
+        tables missing in the archive are empty tables with the schema from the
+        dtypes.
+
+        :param path: path or buffer of the zip archive
+        :param tables: keys of the tables to load, all tables if None
+        :param columns: columns to load per table key, all columns of tables
+            not in columns
+        """
+        tables = PKData.KEYS if tables is None else PKData.validate_keys(tables)
+        columns = columns or {}
+        PKData.validate_keys(columns)
+
         data_dict = {}
         with zipfile.ZipFile(path, "r") as archive:
+            filenames = set(archive.namelist())
             for key in PKData.KEYS:
-                df = pd.read_csv(archive.open(f"{key}.csv", "r"), low_memory=False)
-                data_dict[key] = PKData.clean_types(df, DTYPES[key])
+                selected = columns.get(key)
+                if f"{key}.csv" not in filenames:
+                    data_dict[key] = PKData.empty_table(key, columns=selected)
+                    continue
+
+                usecols = PKData._csv_column_selector(selected)
+                # only the header of excluded tables, so that the columns of
+                # the empty table are the parsed columns
+                nrows = None if key in tables else 0
+                df = pd.read_csv(
+                    archive.open(f"{key}.csv", "r"),
+                    low_memory=False,
+                    usecols=usecols,
+                    nrows=nrows,
+                )
+                dtypes = {k: v for k, v in DTYPES[key].items() if k in df.columns}
+                data_dict[key] = PKData.clean_types(df, dtypes)
         # create data from data frames
         return PKData(**data_dict)
 
-    def to_archive(self, path: Path) -> None:
-        """Saves data to zip archive"""
+    @staticmethod
+    def validate_keys(keys: Iterable[str]) -> List[str]:
+        """Checks that all keys are table keys of PKData."""
+        keys = list(keys)
+        unsupported = [key for key in keys if key not in PKData.KEYS]
+        if unsupported:
+            raise ValueError(
+                f"Unsupported keys '{unsupported}', keys must be in '{PKData.KEYS}'"
+            )
+        return keys
+
+    @staticmethod
+    def is_key_column(column: str) -> bool:
+        """Checks if the column is a primary or foreign key of the tables.
+
+        Key columns (`sid`, `study_sid` and `*_pk`) link the tables and are
+        always loaded.
+        """
+        return column in {"sid", "study_sid"} or column.endswith("_pk")
+
+    @staticmethod
+    def _column_selector(columns: Iterable[str]) -> Callable[[str], bool]:
+        """Selector for the given columns and the key columns."""
+        columns = set(columns)
+        return lambda column: column in columns or PKData.is_key_column(column)
+
+    @staticmethod
+    def _csv_column_selector(columns: Iterable[str] = None) -> Callable[[str], bool]:
+        """Selector of the columns of a table csv without the index column.
+
+        The index of the tables is stored as unnamed first column.
+        """
+        selector = None if columns is None else PKData._column_selector(columns)
+        return lambda column: not column.startswith("Unnamed: ") and (
+            selector is None or selector(column)
+        )
+
+    @staticmethod
+    def empty_table(key: str, columns: Iterable[str] = None) -> pd.DataFrame:
+        """Empty table with the schema from the dtypes.
+
+        :param key: table key
+        :param columns: columns of the table (in addition to the key columns),
+            all columns if None
+        """
+        dtypes = DTYPES[key]
+        if columns is not None:
+            selector = PKData._column_selector(columns)
+            dtypes = {k: v for k, v in dtypes.items() if selector(k)}
+        return pd.DataFrame(
+            {
+                column: pd.Series(dtype=PKData._pandas_dtype(dtype))
+                for column, dtype in dtypes.items()
+            }
+        )
+
+    @staticmethod
+    def _pandas_dtype(dtype):
+        """Pandas dtype for the dtype of a column in the dtypes."""
+        if dtype in (int, INT_MINUS_1):
+            return "int64"
+        if dtype in (float, bool, NULLABLE_INT, DATE_DTYPE):
+            return dtype
+        # strings and tuples
+        return object
+
+    def to_archive(self, path: Path, tables: Iterable[str] = None) -> None:
+        """Saves data to zip archive
+
+        :param path: path of the zip archive
+        :param tables: keys of the tables to store, all tables if None
+        """
+        tables = PKData.KEYS if tables is None else PKData.validate_keys(tables)
         create_parent(path)
         with zipfile.ZipFile(path, "w") as archive:
-            for key in PKData.KEYS:
+            for key in tables:
                 df = getattr(self, key)  # type: pd.DataFrame
                 with tempfile.NamedTemporaryFile() as fp:
                     df.to_csv(fp.name)
@@ -514,6 +654,39 @@ class PKData(object):
         )
         return timecourses
 
+    def compute_pk(
+        self,
+        n_jobs: int = 1,
+        chunk_size: int = None,
+        resolve_units: bool = True,
+        cache=None,
+    ) -> pd.DataFrame:
+        """Pharmacokinetics of all timecourses.
+
+        Every timecourse is joined to the dose and time of its dosing (see
+        pk.timecourses.timecourse_dosings) and the pharmacokinetic parameters
+        are calculated with TimecoursePK. Warnings (and errors) are captured
+        for every timecourse instead of being printed.
+
+        :param n_jobs: number of processes, all cpus if -1
+        :param chunk_size: number of timecourses per task in the process pool
+        :param resolve_units: calculate on magnitudes with resolved units
+        :param cache: persistent cache of the results (pk.cache.PKCache), only
+            new or changed timecourses are calculated
+        :return: DataFrame with one row per timecourse, keyed by subset_pk,
+            with the fields of PKParameters and the captured warnings
+        """
+        # imported on use, the pk package depends on matplotlib and scipy
+        from pkdb_analysis.pk.timecourses import compute_pk
+
+        return compute_pk(
+            self,
+            n_jobs=n_jobs,
+            chunk_size=chunk_size,
+            resolve_units=resolve_units,
+            cache=cache,
+        )
+
     def _df_mi(self, field: str, index_fields: List[str]) -> pd.DataFrame:
         """Create multi-index DataFrame
 
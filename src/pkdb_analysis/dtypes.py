@@ -6,6 +6,7 @@ DATE_DTYPE = "datetime64[ns]"
 NULLABLE_INT = "Int64"
 STUDIES_DTYPES = {
     "sid": str,
+    "name": str,
     "licence": str,
     "access": str,
     "date": str,  # todo:  date dtype
@@ -48,6 +49,7 @@ INTERVENTION_DTYPES = {
     "sd": float,
     "se": float,
     "cv": float,
+    "unit": object,  # not cast to str, missing units stay null
 }
 GROUP_DTYPES = {
     "study_name": str,
@@ -13,6 +13,9 @@ from pkdb_analysis.units import ureg
 
 Q_ = ureg.Quantity
 
+WEIGHT_FIELDS = ("value_weight", "mean_weight", "median_weight")
+INFER_FIELDS = ("value", "mean", "median", "min", "max", "sd", "se")
+
 
 class InferWeight(object):
     """
@@ -36,7 +39,7 @@ class InferWeight(object):
 
     def get_weight(
         self,
-        weight_fields=("value_weight", "mean_weight", "median_weight"),
+        weight_fields=WEIGHT_FIELDS,
         weight_unit_field="unit_weight",
     ) -> Tuple[Optional[Quantity], Optional[str]]:
         """helper function to get the weight of a subject or group"""
@@ -53,7 +56,7 @@ class InferWeight(object):
     def bw_infer(
         self,
         unit_field="unit",
-        infer_fields=("value", "mean", "median", "min", "max", "sd", "se"),
+        infer_fields=INFER_FIELDS,
         per_bw_field="per_bw",
     ) -> pd.Series:
         """helper function to infer values from the weight of a subject or group"""
@@ -88,18 +91,93 @@ def infer_intervention(series: pd.Series):
     )
 
 
-def infer_weight(df: pd.DataFrame, by_intervention=True, by_output=True):
+def _weights(df: pd.DataFrame, weight_fields: Tuple[str] = WEIGHT_FIELDS) -> np.ndarray:
+    """Weight of every row, first value of the weight_fields (see get_weight)."""
+    weight = np.full(len(df), np.nan)
+    for weight_field in weight_fields:
+        if weight_field in df.columns:
+            values = df[weight_field].astype(float).values
+            weight = np.where(np.isnan(weight), values, weight)
+    return weight
+
+
+def _scale(values: pd.Series, factors: np.ndarray) -> pd.Series:
+    """Scales the float values (numbers of other types and None are kept)."""
+    if values.dtype.kind == "f":
+        return values * factors
+    if values.dtype != object:
+        return values
+    values = values.copy()
+    is_float = values.map(lambda v: isinstance(v, (float, np.ndarray))).values
+    values[is_float] = [v * f for v, f in zip(values[is_float], factors[is_float])]
+    return values
+
+
+def infer_table(
+    df: pd.DataFrame,
+    unit_field: str = "unit",
+    infer_fields: Tuple[str] = INFER_FIELDS,
+    per_bw_field: str = "per_bw",
+    ureg: UnitRegistry = ureg,
+) -> pd.DataFrame:
+    """Infers values from the weight of the subjects for all rows of the table.
+
+    Columnar version of InferWeight.bw_infer. The conversion factor and unit are
+    calculated once per combination of unit, weight unit and per_bw and applied to
+    all rows of the combination.
+
+    :return: inferred rows (rows without weight or unit are not inferred)
+    """
+    weight = _weights(df)
+    is_inferable = ~np.isnan(weight) & df[unit_field].notnull().values
+    df = df[is_inferable]
+    weight = weight[is_inferable]
+    per_bw = df[unit_field].str.endswith("/ kilogram").values.astype(bool)
+
+    factors = np.empty(len(df))
+    units = np.empty(len(df), dtype=object)
+    groups = pd.DataFrame(
+        {"unit": df[unit_field].values, "weight_unit": df["unit_weight"].values}
+    ).assign(per_bw=per_bw)
+    for (unit, weight_unit, is_per_bw), idx in groups.groupby(
+        ["unit", "weight_unit", "per_bw"]
+    ).indices.items():
+        per_bw_exp = InferWeight.per_bw_exp(is_per_bw)
+        factor = ureg(unit) * Q_(1, weight_unit) ** per_bw_exp
+        factors[idx] = factor.m * weight[idx] ** per_bw_exp
+        units[idx] = str(factor.u)
+
+    inferred = df.copy()
+    for infer_field in infer_fields:
+        inferred[infer_field] = _scale(df[infer_field], factors)
+    inferred[unit_field] = units
+    inferred["inferred"] = True
+    inferred[per_bw_field] = ~per_bw
+    return inferred
+
+
+def infer_weight(
+    df: pd.DataFrame, by_intervention: bool = True, by_output: bool = True
+) -> pd.DataFrame:
+    """Adds the results inferred from the weight of the subjects.
+
+    Outputs are inferred per body weight (or absolute for outputs per body weight),
+    interventions are inferred for the outputs and the inferred outputs.
+    """
     result_infer = df.dropna(subset=["unit_weight"])
     result_no_bodyweight = df[df["unit_weight"].isnull()]
     if by_output:
-        result_infer_outputs = result_infer.apply(infer_output, axis="columns").dropna(
-            how="all"
+        result_infer = pd.concat(
+            [result_infer, infer_table(result_infer)], ignore_index=True
         )
-        result_infer = result_infer.append(result_infer_outputs, ignore_index=True)
     if by_intervention:
-        result_infer_outputs = result_infer.apply(
-            infer_intervention, axis="columns"
-        ).dropna(how="all")
-        result_infer = result_infer.append(result_infer_outputs, ignore_index=True)
-    result_infer = result_infer.append(result_no_bodyweight, ignore_index=True)
-    return result_infer
+        result_infer_interventions = infer_table(
+            result_infer,
+            unit_field="intervention_unit",
+            infer_fields=("intervention_value",),
+            per_bw_field="intervention_per_bw",
+        )
+        result_infer = pd.concat(
+            [result_infer, result_infer_interventions], ignore_index=True
+        )
+    return pd.concat([result_infer, result_no_bodyweight], ignore_index=True)
@@ -1,11 +1,12 @@
+import hashlib
 import warnings
-from typing import Dict, Set, Tuple
+from typing import Callable, Dict, List, Set, Tuple, Union
 
 import numpy as np
 import pandas as pd
 
 from pkdb_analysis import PKData
-from pkdb_analysis.deprecated.analysis import figure_category
+from pkdb_analysis.columns import apply_column_function
 from pkdb_analysis.filter import pk_info
 from pkdb_analysis.inference.body_weight import infer_weight
 
@@ -14,6 +15,8 @@ INTERVENTION_FIELDS = ["substance", "value", "unit", "route", "form", "applicati
 NUMERIC_FIELDS_NO_VALUE = ["mean", "min", "max", "median", "count", "sd", "se", "unit"]
 NUMERIC_FIELDS = ["value"] + NUMERIC_FIELDS_NO_VALUE
 MISSING_VALUE = "unknown"
+# tables of the results
+RESULTS_KEYS = ["studies", "interventions", "groups", "individuals", "outputs"]
 
 
 def len1(d: pd.DataFrame) -> pd.DataFrame:
@@ -48,6 +51,69 @@ def markers(d: pd.Series) -> str:
         return "o"
 
 
+class RowRange(object):
+    """Lazy reference to the rows [start, stop) of a table (see GroupedIndex)."""
+
+    __slots__ = ["table", "start", "stop"]
+
+    def __init__(self, table: pd.DataFrame, start: int, stop: int):
+        self.table = table
+        self.start = start
+        self.stop = stop
+
+    @property
+    def df(self) -> pd.DataFrame:
+        """Referenced rows."""
+        return self.table.iloc[self.start : self.stop]
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+    def __repr__(self) -> str:
+        return f"RowRange({self.start}:{self.stop})"
+
+
+class GroupedIndex(object):
+    """Rows of a table grouped by a key column.
+
+    The table is sorted (stable) by the key, so that the rows of every key are a
+    contiguous row range. Lookups are a binary search instead of a scan of the table.
+    """
+
+    def __init__(self, df: pd.DataFrame, key: str):
+        self.key = key
+        self.df = df.sort_values(key, kind="mergesort")
+        self.keys, self.starts, counts = np.unique(
+            self.df[key].values, return_index=True, return_counts=True
+        )
+        self.stops = self.starts + counts
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __contains__(self, key) -> bool:
+        k = np.searchsorted(self.keys, key)
+        return k < len(self.keys) and self.keys[k] == key
+
+    def get(self, key) -> pd.DataFrame:
+        """Rows of the key (empty DataFrame for unknown keys)."""
+        if key not in self:
+            return self.df.iloc[0:0]
+        k = np.searchsorted(self.keys, key)
+        return self.df.iloc[self.starts[k] : self.stops[k]]
+
+    def ranges(self) -> pd.Series:
+        """RowRange of every key."""
+        return pd.Series(
+            [
+                RowRange(self.df, start, stop)
+                for start, stop in zip(self.starts, self.stops)
+            ],
+            index=self.keys,
+            dtype=object,
+        )
+
+
 class MetaAnalysis(object):
     """Main class for meta analysis. Main functionality of the class is to merge the tables of an PKData objet into
     one Dataframe (self.results). The result is used for interactive plots, static plots, and table reports."""
@@ -67,45 +133,110 @@ class MetaAnalysis(object):
         self.intervention_substances = intervention_substances
         self.url = url
         self.first_intervention = first_intervention
-
-    def create_intervention_extra(self):
-        """Returns the 'intervention_extra' column with complete information on intervention."""
+        self.intervention_warnings = None
+        self._subject_indexes = {}
+        self._study_results = {}
+        self.calculated_studies = []
+        self.column_timings = {}
+
+    def create_intervention_extra(self, warn: bool = True) -> pd.DataFrame:
+        """Returns the interventions with the 'extra' column referencing the complete
+        information on intervention.
+
+        For every intervention_pk the intervention of the intervention_substances (any
+        substance if not given) is selected, with `first_intervention` the first of
+        multiple such interventions by time. The column 'number' is the number of
+        interventions of the intervention_pk, 'extra' references these interventions
+        (see RowRange). Interventions without a unique selection are removed and
+        reported in self.intervention_warnings and in one aggregated warning (if warn).
+        """
         table = self.pkdata.interventions
-        _table = pd.DataFrame()
-        for table_pk, df in table.df.groupby(table.pk):
-            if self.intervention_substances:
-                subset = df[df["substance"].isin(self.intervention_substances)].copy()
-            else:
-                subset = df.copy()
-            subset["number"] = len(df)
-            if len(subset) == 1:
-                subset = subset.iloc[0]
-                subset["extra"] = df
-                _table = _table.append(subset)
-            else:
-                if self.first_intervention:
-                    subset = subset.sort_values("time").iloc[0]
-                    subset["extra"] = df
-                    _table = _table.append(subset)
-                else:
-                    ds = df.iloc[0]
-                    warnings.warn(
-                        f"Outputs with interventions <{list(subset['name'])}> in study <{ds['study_name']}> are "
-                        f"removed from the plots. Due to the administration of one of the "
-                        f"substances <{self.intervention_substances}> multiple times. It is not clear how to "
-                        f"calculated the dosage and compare to a single dose application."
-                    )
+        pk = table.pk
+        index = GroupedIndex(table.df, pk)
+        df = index.df
+
+        if self.intervention_substances:
+            is_selected = df["substance"].isin(self.intervention_substances)
+        else:
+            is_selected = pd.Series(True, index=df.index)
+        number = df.groupby(pk)[pk].transform("size")
+        n_selected = is_selected.groupby(df[pk]).transform("sum")
+
+        subset = df[is_selected].assign(number=number[is_selected])
+        if self.first_intervention:
+            _table = (
+                subset.sort_values([pk, "time"], kind="mergesort").groupby(pk).head(1)
+            )
+        else:
+            _table = subset[n_selected[is_selected] == 1]
+        _table = _table.assign(extra=_table[pk].map(index.ranges()))
+
+        removed = df[~df[pk].isin(_table[pk])]
+        report = removed.groupby(pk).agg(
+            study_sid=("study_sid", "first"),
+            study_name=("study_name", "first"),
+            n_interventions=("name", "size"),
+        )
+        names = subset[subset[pk].isin(report.index)].groupby(pk)["name"].agg(list)
+        report["interventions"] = [names.get(key, []) for key in report.index]
+        self.intervention_warnings = report
+        if warn:
+            self.warn_interventions()
         return _table
 
+    def warn_interventions(self):
+        """Warns about the removed interventions in self.intervention_warnings."""
+        if self.intervention_warnings is None or self.intervention_warnings.empty:
+            return
+        warnings.warn(
+            f"Outputs with the interventions below are removed from the plots. "
+            f"Due to the administration of one of the substances "
+            f"<{self.intervention_substances}> multiple times (or not at all). "
+            f"It is not clear how to calculated the dosage and compare to a "
+            f"single dose application.\n"
+            f"{self.intervention_warnings.to_string()}"
+        )
+
     @staticmethod
     def subject_numeric_info(df: pd.DataFrame, measurement_type: str) -> Tuple:
         """Returns values for a numeric measurement type (e.g weight , height, age)"""
-        measurement_data = df.extra[df.extra["measurement_type"] == measurement_type]
+        extra = df.extra.df
+        measurement_data = extra[extra["measurement_type"] == measurement_type]
         if len(measurement_data) == 1:
             return tuple(measurement_data.iloc[0][NUMERIC_FIELDS].values)
         else:
             return tuple([np.nan for _ in NUMERIC_FIELDS])
 
+    @staticmethod
+    def subject_numeric_table(
+        subject_df: pd.DataFrame, pk: str, measurement_types: List[str]
+    ) -> pd.DataFrame:
+        """Returns the numeric fields of the measurement types indexed by pk.
+
+        The columns are '{field}_{measurement_type}' for all NUMERIC_FIELDS. Values
+        are only given for subjects with a single characteristica of the measurement
+        type, otherwise NaN (see subject_numeric_info).
+        """
+        df = subject_df[subject_df["measurement_type"].isin(measurement_types)]
+        n = df.groupby([pk, "measurement_type"])[pk].transform("size")
+        table = (
+            df[n == 1]
+            .set_index([pk, "measurement_type"])[NUMERIC_FIELDS]
+            .unstack("measurement_type")
+            .reindex(
+                columns=pd.MultiIndex.from_product([NUMERIC_FIELDS, measurement_types])
+            )
+        )
+        table.columns = [f"{k}_{measurement_type}" for k, measurement_type in table]
+        return table
+
+    def subject_index(self, subject: str) -> GroupedIndex:
+        """Returns the characteristica of the subjects grouped by the subject pk."""
+        if subject not in self._subject_indexes:
+            subject_df = getattr(self.pkdata, subject)
+            self._subject_indexes[subject] = GroupedIndex(subject_df, subject_df.pk)
+        return self._subject_indexes[subject]
+
     def create_subject_table(
         self,
         subject: str,
@@ -113,21 +244,21 @@ class MetaAnalysis(object):
         categorical_fields: Tuple[str] = ("sex",),
         add_healthy: bool = True,
     ) -> pd.DataFrame:
-        """Creates a table with subject information compatible with outputs table."""
+        """Creates a table with subject information compatible with outputs table.
+
+        The column 'extra' references the characteristica of the subject (see
+        subject_index), numeric fields of the numeric_fields, age and weight are
+        added as '{field}_{measurement_type}' (see subject_numeric_table).
+        """
 
         subject_core = getattr(self.pkdata, f"{subject}_core")
         subject_df = getattr(self.pkdata, subject)
+        pk = subject_df.pk
 
         if add_healthy:
             healthy_subjects_pks = getattr(self.pkdata.healthy(), subject).pks
-            subject_core["healthy"] = subject_core[subject_df.pk].isin(
-                healthy_subjects_pks
-            )
+            subject_core["healthy"] = subject_core[pk].isin(healthy_subjects_pks)
 
-        subject_numeric_extra = [
-            pk_info(subject_df, numeric_field, NUMERIC_FIELDS)
-            for numeric_field in numeric_fields
-        ]
         subject_categorical_extra = []
         for categorical_field in categorical_fields:
             detail_info = pk_info(subject_df, categorical_field, ["choice"]).rename(
@@ -135,43 +266,43 @@ class MetaAnalysis(object):
             )
             subject_categorical_extra.append(detail_info)
 
-        for individuals_info in [*subject_categorical_extra, *subject_numeric_extra]:
-            subject_core = pd.merge(
-                subject_core, individuals_info, on=subject_df.pk, how="left"
-            )
+        for individuals_info in subject_categorical_extra:
+            subject_core = pd.merge(subject_core, individuals_info, on=pk, how="left")
 
         for categorical_field in categorical_fields:
             subject_core[categorical_field] = subject_core[categorical_field].fillna(
                 MISSING_VALUE
             )
 
-        pk = subject_df.pk
-
-        subject_core["extra"] = getattr(subject_core, pk).apply(
-            lambda x: subject_df[subject_df[pk] == x]
+        subject_core["extra"] = subject_core[pk].map(
+            self.subject_index(subject).ranges()
         )
-        for measurement_type in ["age", "weight"]:
-            subject_extra = subject_core.apply(
-                self.subject_numeric_info,
-                args=(measurement_type,),
-                axis=1,
-                result_type="expand",
+        measurement_types = list(dict.fromkeys([*numeric_fields, "age", "weight"]))
+        subject_numeric_extra = self.subject_numeric_table(
+            subject_df, pk, measurement_types
+        )
+        return pd.merge(
+            subject_core,
+            subject_numeric_extra,
+            left_on=pk,
+            right_index=True,
+            how="left",
+        )
+
+    def add_columns(self, functions: Dict[str, Union[str, Callable]]):
+        """Adds a column to the results for every column function (see columns).
+
+        Row-wise functions are applied for compatibility, the durations of the
+        functions are stored in self.column_timings.
+        """
+        for column, f in functions.items():
+            self.results[column] = apply_column_function(
+                self.results, f, name=column, timings=self.column_timings
             )
-            if subject_extra.empty:
-                subject_core[
-                    [f"{k}_{measurement_type}" for k in NUMERIC_FIELDS]
-                ] = tuple([np.nan for _ in NUMERIC_FIELDS])
-            else:
-                subject_core[
-                    [f"{k}_{measurement_type}" for k in NUMERIC_FIELDS]
-                ] = subject_extra
-        return subject_core
 
     def add_extra_info(self, replacements: Dict[str, Dict[str, str]]):
         """a generic function to"""
-        self.results["unit_category"] = self.results[
-            ["per_bw", "intervention_per_bw"]
-        ].apply(figure_category, axis=1)
+        self.add_columns({"unit_category": "unit_category"})
         self.results["y"] = self.results[["mean", "median", "value"]].max(axis=1)
         self.results["y_min"] = self.results["y"] - self.results["sd"]
         self.results["y_max"] = self.results["y"] + self.results["sd"]
@@ -196,8 +327,8 @@ class MetaAnalysis(object):
         else:
             self.results["subject_count"] = 1
 
-        self.results["url"] = self.results["study_sid"].apply(
-            lambda x: f"{self.url}/data/{x}"
+        self.results["url"] = f"{self.url}/data/" + self.results["study_sid"].astype(
+            str
         )
         # self.results = self.results.replace({"NR", "not reported"}, regex=True)
 
@@ -214,8 +345,8 @@ class MetaAnalysis(object):
         results["inferred"] = False
         self.results = results
 
-    def add_intervention_info(self):
-        intervention_table = self.create_intervention_extra()
+    def add_intervention_info(self, warn: bool = True):
+        intervention_table = self.create_intervention_extra(warn=warn)
         # intervention_table.unit = intervention_table.unit.astype(str)
         intervention_table["per_bw"] = intervention_table.unit.str.endswith(
             "/ kilogram"
@@ -280,6 +411,130 @@ class MetaAnalysis(object):
         self.results = results_inferred
 
     def create_results(self):
-        self.create_results_base()
-        self.add_intervention_info()
-        self.add_subject_info()
+        """Creates the results of all studies.
+
+        The results are stored per study with the fingerprint of the study in the
+        RESULTS_KEYS tables (see study_fingerprints). Only new or changed studies are calculated, e.g. after
+        assigning `pkdata` with additionally curated studies; the results of unchanged
+        studies are reused. Changing `intervention_substances`, `first_intervention`
+        or `url` recalculates all studies. The calculated studies are listed in
+        `self.calculated_studies`.
+        """
+        # the settings of the analysis are part of the key of the stored results
+        settings = (
+            None
+            if self.intervention_substances is None
+            else tuple(sorted(self.intervention_substances)),
+            self.first_intervention,
+            self.url,
+        )
+        fingerprints = study_fingerprints(self.pkdata, keys=RESULTS_KEYS)
+        fingerprints = fingerprints.map(lambda fingerprint: (fingerprint, settings))
+        calculated = [
+            sid
+            for sid, fingerprint in fingerprints.items()
+            if self._study_results.get(sid, (None,))[0] != fingerprint
+        ]
+        results = {}
+        intervention_warnings = {}
+        if calculated:
+            pkdata = study_subset(self.pkdata, calculated)
+            if not pkdata.outputs.df.empty:
+                meta_analysis = MetaAnalysis(
+                    pkdata,
+                    intervention_substances=self.intervention_substances,
+                    url=self.url,
+                    first_intervention=self.first_intervention,
+                )
+                meta_analysis.create_results_base()
+                meta_analysis.add_intervention_info(warn=False)
+                meta_analysis.add_subject_info()
+                results = dict(tuple(meta_analysis.results.groupby("study_sid")))
+                intervention_warnings = dict(
+                    tuple(meta_analysis.intervention_warnings.groupby("study_sid"))
+                )
+        for sid in calculated:
+            self._study_results[sid] = (
+                fingerprints[sid],
+                results.get(sid),
+                intervention_warnings.get(sid),
+            )
+        for sid in set(self._study_results).difference(fingerprints.index):
+            del self._study_results[sid]
+        self.calculated_studies = calculated
+
+        stored = [self._study_results[sid] for sid in sorted(self._study_results)]
+        self.results = _concat([results for _, results, _ in stored], ignore_index=True)
+        self.intervention_warnings = _concat([w for _, _, w in stored])
+        self.warn_interventions()
+
+
+def _concat(dfs: List[pd.DataFrame], ignore_index: bool = False) -> pd.DataFrame:
+    dfs = [df for df in dfs if df is not None]
+    if not dfs:
+        return pd.DataFrame()
+    return pd.concat(dfs, ignore_index=ignore_index)
+
+
+def _study_column(df: pd.DataFrame) -> str:
+    """Column of the study sid (studies are identified by 'sid')."""
+    return "study_sid" if "study_sid" in df.columns else "sid"
+
+
+def study_fingerprints(pkdata: PKData, keys: List[str] = None) -> pd.Series:
+    """Returns the fingerprint of every study.
+
+    The fingerprint is a hash of the hashed rows of the study in the tables (all
+    tables if keys is None). It is independent of the order of rows and columns.
+
+    :return: Series of hex digests indexed by study sid
+    """
+    hashes = []
+    for k, key in enumerate(keys or PKData.KEYS):
+        df = getattr(pkdata, key).df
+        if df.empty:
+            continue
+        row_hashes = pd.util.hash_pandas_object(
+            df[sorted(df.columns)], index=False
+        ).values
+        hashes.append(
+            pd.DataFrame(
+                {"sid": df[_study_column(df)].values, "key": k, "hash": row_hashes}
+            )
+        )
+    if not hashes:
+        return pd.Series(dtype=object)
+
+    hashes = pd.concat(hashes).sort_values(["sid", "key", "hash"])
+    values = hashes[["key", "hash"]].values.astype(np.uint64)
+    sids, starts = np.unique(hashes["sid"].values, return_index=True)
+    return pd.Series(
+        [
+            hashlib.sha256(values[start:stop].tobytes()).hexdigest()
+            for start, stop in zip(starts, [*starts[1:], len(values)])
+        ],
+        index=sids,
+        dtype=object,
+    )
+
+
+def results_pkdata(pkdata: PKData) -> PKData:
+    """Returns the PKData with the tables of the results (RESULTS_KEYS)."""
+    return PKData(
+        **{
+            key: df if key in RESULTS_KEYS else df.iloc[0:0]
+            for key, df in pkdata.as_dict().items()
+        }
+    )
+
+
+def study_subset(pkdata: PKData, study_sids: List[str]) -> PKData:
+    """Returns the PKData of the studies."""
+    return PKData(
+        **{
+            key: df[df[_study_column(df)].isin(study_sids)]
+            if _study_column(df) in df.columns
+            else df
+            for key, df in pkdata.as_dict().items()
+        }
+    )
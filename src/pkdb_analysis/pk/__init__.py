@@ -2,3 +2,6 @@
 
 Calculates pk parameters from timecourses.
 """
+from pkdb_analysis.pk.batch import batch_pk
+from pkdb_analysis.pk.figures import render_pk_figures
+from pkdb_analysis.pk.uncertainty import monte_carlo_pk
@@ -0,0 +1,136 @@
+"""Integration rules for the area under the curve (AUC) and first moment (AUMC).
+
+- `linear`: linear trapezoid rule on all intervals
+- `linear_up_log_down`: linear trapezoid rule for increasing or constant
+  concentrations, logarithmic trapezoid rule for decreasing (positive)
+  concentrations (exponential decline between the data points)
+
+All functions work elementwise on arrays of intervals, so that they can be
+used for a single timecourse as well as for the flat arrays of many
+timecourses (segments).
+"""
+import numpy as np
+
+
+AUC_METHODS = ["linear", "linear_up_log_down"]
+
+
+def check_auc_method(method: str) -> None:
+    """Checks the integration method."""
+    if method not in AUC_METHODS:
+        raise ValueError(f"'auc_method' must be one of {AUC_METHODS}: '{method}'")
+
+
+def _log_down(c1: np.ndarray, c2: np.ndarray, method: str) -> np.ndarray:
+    """Intervals integrated with the logarithmic trapezoid rule."""
+    if method == "linear":
+        return np.zeros(np.shape(c1), dtype=bool)
+    return (c2 < c1) & (c2 > 0)
+
+
+def auc_intervals(
+    t1: np.ndarray, t2: np.ndarray, c1: np.ndarray, c2: np.ndarray, method: str
+) -> np.ndarray:
+    """AUC of the intervals [t1, t2] with the concentrations c1 and c2."""
+    auc = (t2 - t1) * (c2 + c1) / 2.0
+    log = _log_down(c1, c2, method)
+    if np.any(log):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            auc_log = (t2 - t1) * (c1 - c2) / np.log(c1 / c2)
+        auc = np.where(log, auc_log, auc)
+    return auc
+
+
+def aumc_intervals(
+    t1: np.ndarray, t2: np.ndarray, c1: np.ndarray, c2: np.ndarray, method: str
+) -> np.ndarray:
+    """Area under the first moment curve (t*c) of the intervals [t1, t2]."""
+    dt = t2 - t1
+    aumc = dt * (t2 * c2 + t1 * c1) / 2.0
+    log = _log_down(c1, c2, method)
+    if np.any(log):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            k = np.log(c1 / c2)
+            aumc_log = dt * (t1 * c1 - t2 * c2) / k + dt ** 2 * (c1 - c2) / k ** 2
+        aumc = np.where(log, aumc_log, aumc)
+    return aumc
+
+
+def interpolate(
+    t1: np.ndarray,
+    t2: np.ndarray,
+    c1: np.ndarray,
+    c2: np.ndarray,
+    x: np.ndarray,
+    method: str,
+) -> np.ndarray:
+    """Concentrations at x in [t1, t2] consistent with the integration rule."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fraction = np.where(t2 > t1, (x - t1) / (t2 - t1), 0.0)
+        c = c1 + fraction * (c2 - c1)
+        log = _log_down(c1, c2, method)
+        if np.any(log):
+            c = np.where(log, c1 * np.exp(fraction * np.log(c2 / c1)), c)
+    return c
+
+
+def partial_auc(
+    t: np.ndarray,
+    c: np.ndarray,
+    ids: np.ndarray,
+    n_segments: int,
+    start: np.ndarray,
+    end: np.ndarray,
+    method: str = "linear",
+) -> np.ndarray:
+    """AUC in the windows [start, end] of every segment.
+
+    The concentrations at the window boundaries are interpolated with the
+    integration rule. The AUC is NaN for windows outside of the time range of
+    the segment (no extrapolation).
+
+    :param t: sorted times without NaN concentrations
+    :param c: concentrations without NaN
+    :param ids: segment id of the data points (sorted)
+    :param n_segments: number of segments
+    :param start: start of the window of every segment
+    :param end: end of the window of every segment
+    :param method: integration method (see AUC_METHODS)
+    :return: AUC of every segment in the window
+    """
+    check_auc_method(method)
+    t = np.asarray(t, dtype=float)
+    c = np.asarray(c, dtype=float)
+    ids = np.asarray(ids, dtype=int)
+    start = np.broadcast_to(np.asarray(start, dtype=float), (n_segments,))
+    end = np.broadcast_to(np.asarray(end, dtype=float), (n_segments,))
+
+    lengths = np.bincount(ids, minlength=n_segments)
+    starts = np.cumsum(lengths) - lengths
+    same = ids[1:] == ids[:-1]
+    areas = np.where(
+        same, auc_intervals(t[:-1], t[1:], c[:-1], c[1:], method), 0.0
+    )
+    cumulative = np.concatenate([[0.0], np.cumsum(areas)])
+
+    def auc_to(x: np.ndarray) -> np.ndarray:
+        """AUC from the first data point to x."""
+        counts = np.bincount(ids, weights=t <= x[ids], minlength=n_segments)
+        counts = counts.astype(int)
+        idx = np.clip(starts + counts - 1, 0, max(t.size - 1, 0))
+        nxt = np.clip(idx + 1, 0, max(t.size - 1, 0))
+        inner = (counts >= 1) & (counts < lengths)
+        auc = np.full(n_segments, np.nan)
+        if t.size == 0:
+            return auc
+        t1, c1 = t[idx], c[idx]
+        cx = interpolate(t1, t[nxt], c1, c[nxt], x, method)
+        rest = np.where(inner, auc_intervals(t1, x, c1, cx, method), 0.0)
+        last = (counts == lengths) & (lengths > 0) & (x == t[idx])
+        valid = inner | last
+        auc[valid] = (cumulative[idx] - cumulative[starts] + rest)[valid]
+        return auc
+
+    auc = auc_to(end) - auc_to(start)
+    auc[start > end] = np.nan
+    return auc
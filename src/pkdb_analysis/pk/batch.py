@@ -0,0 +1,582 @@
+"""Batch calculation of pharmacokinetics for many timecourses.
+
+The timecourses are concatenated in flat arrays with a segment id per data
+point. All pharmacokinetic parameters are calculated with segmented NumPy
+reductions on the magnitudes, units are resolved once per combination of
+time, concentration and dose units (see pk_units). The results are identical
+(within floating point tolerance) to TimecoursePK and TimecoursePKNoDosing.
+
+In contrast to TimecoursePK no warnings are emitted, parameters which can
+not be calculated for a timecourse are NaN.
+"""
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+import pandas as pd
+from pint import Quantity, UnitRegistry
+from scipy import stats
+
+from pkdb_analysis.pk.auc import (
+    auc_intervals,
+    aumc_intervals,
+    check_auc_method,
+    partial_auc,
+)
+from pkdb_analysis.pk.cache import PKCache, content_hash
+from pkdb_analysis.pk.pharmacokinetics import pk_units
+from pkdb_analysis.pk.regression import best_fit_regression, check_lambda_z
+
+
+PARAMETERS = [
+    "auc",
+    "aucinf",
+    "tmax",
+    "cmax",
+    "tmaxhalf",
+    "cmaxhalf",
+    "kel",
+    "thalf",
+    "aumc",
+    "aumcinf",
+    "mrt",
+]
+DOSE_PARAMETERS = ["dose", "vd", "vdss", "cl"]
+REGRESSION_PARAMETERS = ["slope", "intercept", "r_value", "p_value", "std_err", "max_idx"]
+
+
+class Segments:
+    """Ragged arrays concatenated in flat arrays.
+
+    :param lengths: number of data points of the segments
+    """
+
+    def __init__(self, lengths: np.ndarray):
+        self.lengths = np.asarray(lengths, dtype=int)
+        self.n = len(self.lengths)
+        self.starts = np.concatenate([[0], np.cumsum(self.lengths)[:-1]]).astype(int)
+        self.ids = np.repeat(np.arange(self.n), self.lengths)
+        # position of the data points within the segments
+        self.positions = np.arange(self.ids.size) - self.starts[self.ids]
+
+    def reduce(self, ufunc: np.ufunc, values: np.ndarray, empty=np.nan) -> np.ndarray:
+        """Reduces the values of every segment with the ufunc."""
+        out = np.full(self.n, empty, dtype=float)
+        nonempty = self.lengths > 0
+        if nonempty.any():
+            out[nonempty] = ufunc.reduceat(values, self.starts[nonempty])
+        return out
+
+    def sum(self, values: np.ndarray, mask: np.ndarray = None) -> np.ndarray:
+        """Sum of the values of every segment."""
+        ids = self.ids
+        if mask is not None:
+            ids, values = ids[mask], values[mask]
+        return np.bincount(ids, weights=values, minlength=self.n)
+
+    def first(self, mask: np.ndarray) -> np.ndarray:
+        """Flat index of the first data point in every segment fulfilling the mask.
+
+        :return: flat indices, -1 for segments without such data point
+        """
+        idx = np.flatnonzero(mask)
+        first = np.full(self.n, -1, dtype=int)
+        ids, pos = np.unique(self.ids[idx], return_index=True)
+        first[ids] = idx[pos]
+        return first
+
+    def last(self, mask: np.ndarray) -> np.ndarray:
+        """Flat index of the last data point in every segment fulfilling the mask.
+
+        :return: flat indices, -1 for segments without such data point
+        """
+        idx = np.flatnonzero(mask)[::-1]
+        last = np.full(self.n, -1, dtype=int)
+        ids, pos = np.unique(self.ids[idx], return_index=True)
+        last[ids] = idx[pos]
+        return last
+
+
+def _take(values: np.ndarray, idx: np.ndarray) -> np.ndarray:
+    """Values at the flat indices, NaN for -1."""
+    out = np.full(idx.size, np.nan)
+    valid = idx >= 0
+    out[valid] = values[idx[valid]]
+    return out
+
+
+def per_data_point(values, size: int) -> np.ndarray:
+    """Values of the data points, scalars (e.g. NaN) are used for all data points."""
+    values = np.asarray(values, dtype=float)
+    if values.ndim == 0:
+        return np.full(size, values)
+    return values
+
+
+def linregress(
+    x: np.ndarray, y: np.ndarray, segments: Segments, mask: np.ndarray
+) -> List[np.ndarray]:
+    """Linear regression of y on x for every segment (see scipy.stats.linregress).
+
+    :param mask: data points used in the regression
+    :return: slope, intercept, r_value, p_value, std_err of the segments,
+        NaN for segments with less than two data points
+    """
+    n = segments.sum(mask.astype(float), mask)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        xmean = segments.sum(x, mask) / n
+        ymean = segments.sum(y, mask) / n
+        dx = x - xmean[segments.ids]
+        dy = y - ymean[segments.ids]
+        ssxm = segments.sum(dx * dx, mask) / n
+        ssym = segments.sum(dy * dy, mask) / n
+        ssxym = segments.sum(dx * dy, mask) / n
+
+        r = np.clip(ssxym / np.sqrt(ssxm * ssym), -1.0, 1.0)
+        r[(ssxm == 0.0) | (ssym == 0.0)] = 0.0
+        r[(ssxym == 0.0) & ((ssxm == 0.0) | (ssym == 0.0))] = np.nan
+        slope = ssxym / ssxm
+        intercept = ymean - slope * xmean
+
+        df = n - 2
+        tiny = 1.0e-20
+        t = r * np.sqrt(df / ((1.0 - r + tiny) * (1.0 + r + tiny)))
+        p_value = 2 * stats.t.sf(np.abs(t), df)
+        std_err = np.sqrt((1 - r ** 2) * ssym / ssxm / df)
+
+    # two data points
+    two = n == 2
+    if two.any():
+        y_first = _take(y, segments.first(mask))
+        y_last = _take(y, segments.last(mask))
+        p_value[two] = np.where(y_first[two] == y_last[two], 1.0, 0.0)
+        std_err[two] = 0.0
+
+    # regression not possible
+    invalid = (n < 2) | (ssxm == 0.0)
+    for values in [slope, intercept, r, p_value, std_err]:
+        values[invalid] = np.nan
+
+    return [slope, intercept, r, p_value, std_err]
+
+
+def batch_pk_magnitudes(
+    times: Iterable[np.ndarray],
+    concentrations: Iterable[np.ndarray],
+    doses: np.ndarray = None,
+    intervention_times: np.ndarray = None,
+    min_treshold: float = 1e6,
+    lambda_z: str = "after_max",
+    auc_method: str = "linear",
+    auc_windows: Dict[str, Tuple[np.ndarray, np.ndarray]] = None,
+) -> pd.DataFrame:
+    """Pharmacokinetic parameters of many timecourses on magnitudes.
+
+    The parameters are in the units of the given time, concentration and dose
+    magnitudes (see pk_units for the conversion to the units of TimecoursePK).
+
+    :param times: time points of the timecourses
+    :param concentrations: concentrations of the timecourses
+    :param doses: dose of every timecourse, parameters without dose if None
+    :param intervention_times: intervention time of every timecourse in the
+        time units of the timecourse, 0 if None
+    :param min_treshold: concentrations smaller than cmax/min_treshold are
+        set to NaN
+    :param lambda_z: selection of the terminal phase, "after_max" or "best_fit"
+        (see TimecoursePKNoDosing)
+    :param auc_method: integration rule of AUC and AUMC, "linear" or
+        "linear_up_log_down" (see pk.auc)
+    :param auc_windows: name: (start, end) of windows for partial AUCs with
+        start and end of every timecourse relative to the intervention time
+    :return: DataFrame with a row of parameters for every timecourse and the
+        partial AUCs
+    """
+    times = [np.asarray(t, dtype=float) for t in times]
+    concentrations = [np.asarray(c, dtype=float) for c in concentrations]
+    lengths = np.array([t.size for t in times], dtype=int)
+    if not np.array_equal(lengths, [c.size for c in concentrations]):
+        raise ValueError("'times' and 'concentrations' must have the same sizes.")
+
+    return flat_pk_magnitudes(
+        t=np.concatenate(times) if lengths.size else np.array([]),
+        c=np.concatenate(concentrations) if lengths.size else np.array([]),
+        lengths=lengths,
+        doses=doses,
+        intervention_times=intervention_times,
+        min_treshold=min_treshold,
+        lambda_z=lambda_z,
+        auc_method=auc_method,
+        auc_windows=auc_windows,
+    )
+
+
+def flat_pk_magnitudes(
+    t: np.ndarray,
+    c: np.ndarray,
+    lengths: np.ndarray,
+    doses: np.ndarray = None,
+    intervention_times: np.ndarray = None,
+    min_treshold: float = 1e6,
+    lambda_z: str = "after_max",
+    auc_method: str = "linear",
+    auc_windows: Dict[str, Tuple[np.ndarray, np.ndarray]] = None,
+) -> pd.DataFrame:
+    """Pharmacokinetic parameters of timecourses concatenated in flat arrays.
+
+    See batch_pk_magnitudes, the timecourses are given by the concatenated
+    times and concentrations and the number of data points of every
+    timecourse, e.g. `np.tile(time, n)`, `samples.ravel()` and
+    `np.full(n, time.size)` for n samples of concentrations at the same times.
+    """
+    check_lambda_z(lambda_z)
+    check_auc_method(auc_method)
+    segments = Segments(np.asarray(lengths, dtype=int))
+    lengths = segments.lengths
+    ids = segments.ids
+    n = segments.n
+    t = np.asarray(t, dtype=float)
+    c = np.array(c, dtype=float)
+    if t.size != c.size or t.size != lengths.sum():
+        raise ValueError("'t' and 'c' must have the size of the sum of 'lengths'.")
+
+    # very small concentrations are set to NaN
+    nonzero = (c != 0) & ~np.isnan(c)
+    cmin = segments.reduce(np.minimum, np.where(nonzero, c, np.inf))
+    cmax = segments.reduce(np.fmax, c)
+    small = (min_treshold * cmin < cmax)[ids] & (c * min_treshold < cmax[ids])
+    c[small] = np.nan
+
+    # calculate all results relative to the intervention time
+    if intervention_times is not None:
+        t = t - np.asarray(intervention_times, dtype=float)[ids]
+
+    # auc and aumc via trapezoid rule on the non NaN concentrations
+    valid = ~np.isnan(c)
+    tv, cv, idv = t[valid], c[valid], ids[valid]
+    same = idv[1:] == idv[:-1]
+    intervals = (tv[:-1], tv[1:], cv[:-1], cv[1:], auc_method)
+    auc = np.bincount(
+        idv[1:][same], weights=auc_intervals(*intervals)[same], minlength=n
+    )
+    aumc = np.bincount(
+        idv[1:][same], weights=aumc_intervals(*intervals)[same], minlength=n
+    )
+    idx_last = segments.last(valid)
+    c_last = _take(c, idx_last)
+    t_last = _take(t, idx_last)
+
+    # maximum (not changed by removing small concentrations)
+    idx_max = segments.first(c == cmax[ids])
+    tmax = _take(t, idx_max)
+    max_idx = np.where(idx_max >= 0, idx_max - segments.starts, -1)
+
+    # half maximum before the maximum
+    before = segments.positions < max_idx[ids]
+    distance = np.abs(c - 0.5 * cmax[ids])
+    distance = np.where(before & ~np.isnan(distance), distance, np.inf)
+    distance_min = segments.reduce(np.minimum, distance, empty=np.inf)
+    idx_half = segments.first(
+        (distance == distance_min[ids]) & np.isfinite(distance_min[ids])
+    )
+    idx_half[max_idx <= 0] = -1
+    tmaxhalf = _take(t, idx_half)
+    cmaxhalf = _take(c, idx_half)
+
+    # linear regression on the log timecourse after the maximum
+    regression = (max_idx >= 0) & (max_idx <= lengths - 4)
+    after = regression[ids] & (segments.positions > max_idx[ids])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        y = np.log(c)
+    mask = after & np.isfinite(t) & np.isfinite(y)
+    if lambda_z == "best_fit":
+        fit = best_fit_regression(t[mask], y[mask], ids[mask], n)
+        slope, intercept, r_value, p_value, std_err = [
+            fit[key] for key in ["slope", "intercept", "r_value", "p_value", "std_err"]
+        ]
+    else:
+        slope, intercept, r_value, p_value, std_err = linregress(
+            t, y, segments, mask
+        )
+    positive = slope > 0.0
+    slope[positive] = np.nan
+    intercept[positive] = np.nan
+    max_idx = np.where(regression, max_idx, np.nan)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        kel = -slope
+        thalf = np.log(2) / kel
+        aucinf = auc - c_last / slope
+        aumcinf = aumc + c_last * t_last / kel + c_last / kel ** 2
+        mrt = aumcinf / aucinf
+
+    results = {
+        "auc": auc,
+        "aucinf": aucinf,
+        "tmax": tmax,
+        "cmax": cmax,
+        "tmaxhalf": tmaxhalf,
+        "cmaxhalf": cmaxhalf,
+        "kel": kel,
+        "thalf": thalf,
+        "aumc": aumc,
+        "aumcinf": aumcinf,
+        "mrt": mrt,
+    }
+    if doses is not None:
+        doses = np.asarray(doses, dtype=float)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            vd = doses / (aucinf * kel)
+            results["dose"] = doses
+            results["vd"] = vd
+            results["vdss"] = doses / np.exp(intercept)
+            results["cl"] = kel * vd
+    results.update(
+        {
+            "slope": slope,
+            "intercept": intercept,
+            "r_value": r_value,
+            "p_value": p_value,
+            "std_err": std_err,
+            "max_idx": max_idx,
+        }
+    )
+    for name, (start, end) in (auc_windows or {}).items():
+        results[name] = partial_auc(
+            tv, cv, idv, n, start=start, end=end, method=auc_method
+        )
+    return pd.DataFrame(results)
+
+
+def split_doses(
+    doses: Iterable[Quantity], n: int, ureg: UnitRegistry
+) -> Tuple[np.ndarray, List]:
+    """Magnitudes and units of the doses, None or NaN for unknown doses.
+
+    :return: magnitudes (None if doses is None) and units of the doses
+    """
+    if doses is None:
+        return None, [None] * n
+    doses = list(doses)
+    if len(doses) != n:
+        raise ValueError("'doses' must contain a dose for every timecourse.")
+    doses = [ureg.Quantity(np.nan, "mg") if d is None else d for d in doses]
+    return np.array([d.magnitude for d in doses], dtype=float), [d.units for d in doses]
+
+
+def time_magnitudes(times: Iterable[Quantity], time_units: List) -> np.ndarray:
+    """Magnitudes of the times in the time units of every timecourse."""
+    return np.array(
+        [q.to(unit).magnitude for q, unit in zip(times, time_units)], dtype=float
+    )
+
+
+def unit_factors(
+    ureg: UnitRegistry,
+    parameters: List[str],
+    time_units: List,
+    units: List,
+    dose_units: List,
+    dose_nan: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Conversion factors and units of the parameters of every timecourse.
+
+    Units are resolved once per combination of units (see pk_units).
+
+    :return: factors and unit strings with shape (timecourses, parameters)
+    """
+    n = len(time_units)
+    unit_groups = {}
+    for k, key in enumerate(zip(time_units, units, dose_units, dose_nan)):
+        unit_groups.setdefault(key, []).append(k)
+
+    factors = np.ones((n, len(parameters)))
+    unit_strs = np.empty((n, len(parameters)), dtype=object)
+    for (time_unit, unit, dose_unit, nan), rows in unit_groups.items():
+        resolved = pk_units(ureg, time_unit, unit, dose_unit, dose_nan=nan)
+        for j, parameter in enumerate(parameters):
+            factor, parameter_unit = resolved[parameter]
+            factors[rows, j] = factor
+            unit_strs[rows, j] = str(parameter_unit)
+    return factors, unit_strs
+
+
+def _cached_batch_pk(
+    timecourses: pd.DataFrame,
+    doses: Iterable[Quantity],
+    ureg: UnitRegistry,
+    intervention_times: Iterable[Quantity],
+    cache: PKCache,
+    **options,
+) -> pd.DataFrame:
+    """batch_pk with the results of unchanged timecourses from the cache."""
+    n = len(timecourses)
+    doses = list(doses) if doses is not None else None
+    intervention_times = (
+        list(intervention_times) if intervention_times is not None else None
+    )
+    substances = (
+        timecourses["substance"]
+        if "substance" in timecourses.columns
+        else ["substance"] * n
+    )
+    keys = [
+        content_hash(
+            "batch_pk",
+            np.asarray(time, dtype=float),
+            np.asarray(concentration, dtype=float),
+            time_unit,
+            unit,
+            substance,
+            doses is not None,
+            doses[k] if doses is not None else None,
+            intervention_times[k] if intervention_times is not None else None,
+            options,
+        )
+        for k, (time, concentration, time_unit, unit, substance) in enumerate(
+            zip(
+                timecourses["time"],
+                timecourses[options["concentration"]],
+                timecourses["time_unit"],
+                timecourses["unit"],
+                substances,
+            )
+        )
+    ]
+
+    results = cache.get_many(keys)
+    missing = [k for k, key in enumerate(keys) if key not in results]
+    if missing:
+        df = batch_pk(
+            timecourses.iloc[missing],
+            doses=[doses[k] for k in missing] if doses is not None else None,
+            ureg=ureg,
+            intervention_times=(
+                [intervention_times[k] for k in missing]
+                if intervention_times is not None
+                else None
+            ),
+            **options,
+        )
+        computed = dict(zip([keys[k] for k in missing], df.to_dict("records")))
+        cache.set_many(computed)
+        results.update(computed)
+
+    return pd.DataFrame([results[key] for key in keys], index=timecourses.index)
+
+
+def batch_pk(
+    timecourses: pd.DataFrame,
+    doses: Iterable[Quantity] = None,
+    ureg: UnitRegistry = None,
+    intervention_times: Iterable[Quantity] = None,
+    concentration: str = "value",
+    min_treshold: float = 1e6,
+    lambda_z: str = "after_max",
+    auc_method: str = "linear",
+    auc_windows: Dict[str, Tuple[Quantity, Quantity]] = None,
+    cache: PKCache = None,
+) -> pd.DataFrame:
+    """Pharmacokinetic parameters for all timecourses.
+
+    Vectorized version of TimecoursePK (TimecoursePKNoDosing if no doses are
+    given) for many timecourses. The timecourses require the columns `time`,
+    `time_unit`, `unit` and the concentration column with tuples or arrays of
+    values (as in the timecourses of PKData), the `substance` is used as
+    compound if available. The parameters of timecourses with a scalar in the
+    concentration column (e.g. NaN in the `mean` of individual timecourses)
+    are NaN.
+
+    :param timecourses: timecourses, one row per timecourse
+    :param doses: dose of every timecourse (None or NaN for unknown doses),
+        parameters without dose if None
+    :param ureg: unit registry, registry of pkdb_analysis if None
+    :param intervention_times: intervention time of every timecourse, 0 if None
+    :param concentration: column of the concentrations, e.g. "mean" or "median"
+    :param min_treshold: concentrations smaller than cmax/min_treshold are
+        set to NaN
+    :param lambda_z: selection of the terminal phase, "after_max" or "best_fit"
+    :param auc_method: integration rule of AUC and AUMC, "linear" or
+        "linear_up_log_down"
+    :param auc_windows: name: (start, end) of windows for partial AUCs relative
+        to the intervention time, e.g. {"auc_0_4": (Q_(0, "hr"), Q_(4, "hr"))},
+        the partial AUCs are added in the units of the AUC
+    :param cache: persistent cache of the results, only timecourses which are
+        not in the cache are calculated (see PKCache)
+    :return: DataFrame with the fields of PKParameters (PKParametersNoDosing)
+        and units as strings, indexed like timecourses
+    """
+    if ureg is None:
+        from pkdb_analysis.units import ureg
+    options = dict(
+        concentration=concentration,
+        min_treshold=min_treshold,
+        lambda_z=lambda_z,
+        auc_method=auc_method,
+        auc_windows=auc_windows,
+    )
+    if cache is not None and len(timecourses) > 0:
+        return _cached_batch_pk(
+            timecourses, doses, ureg, intervention_times, cache, **options
+        )
+
+    time_units = timecourses["time_unit"].tolist()
+    units = timecourses["unit"].tolist()
+    n = len(timecourses)
+    times = [np.asarray(t, dtype=float) for t in timecourses["time"]]
+    concentrations = timecourses[concentration].tolist()
+    # timecourses reported in another concentration column have a scalar NaN
+    no_concentration = np.array([np.ndim(c) == 0 for c in concentrations], bool)
+    concentrations = [per_data_point(c, t.size) for c, t in zip(concentrations, times)]
+
+    dose_magnitudes, dose_units = split_doses(doses, n, ureg)
+    t_int = None
+    if intervention_times is not None:
+        t_int = time_magnitudes(intervention_times, time_units)
+
+    windows = {}
+    for name, (start, end) in (auc_windows or {}).items():
+        windows[name] = tuple(
+            time_magnitudes([q] * n, time_units) for q in (start, end)
+        )
+
+    df = batch_pk_magnitudes(
+        times=times,
+        concentrations=concentrations,
+        doses=dose_magnitudes,
+        intervention_times=t_int,
+        min_treshold=min_treshold,
+        lambda_z=lambda_z,
+        auc_method=auc_method,
+        auc_windows=windows,
+    )
+
+    # conversion of the magnitudes to the units of TimecoursePK
+    parameters = PARAMETERS + (DOSE_PARAMETERS if doses is not None else [])
+    parameters += ["slope", "intercept"]
+    dose_nan = np.isnan(dose_magnitudes) if doses is not None else np.zeros(n, bool)
+    factors, unit_strs = unit_factors(
+        ureg, parameters, time_units, units, dose_units, dose_nan
+    )
+
+    data = {
+        "compound": (
+            timecourses["substance"].values
+            if "substance" in timecourses.columns
+            else "substance"
+        )
+    }
+    for j, parameter in enumerate(parameters):
+        data[parameter] = df[parameter].values * factors[:, j]
+        data[f"{parameter}_unit"] = unit_strs[:, j]
+    for parameter in REGRESSION_PARAMETERS[2:]:
+        data[parameter] = df[parameter].values
+    j_auc = parameters.index("auc")
+    for name in windows:
+        data[name] = df[name].values * factors[:, j_auc]
+        data[f"{name}_unit"] = unit_strs[:, j_auc]
+
+    results = pd.DataFrame(data, index=timecourses.index)
+    if no_concentration.any():
+        columns = [p for p in parameters if p != "dose"]
+        columns += REGRESSION_PARAMETERS[2:] + list(windows)
+        results.loc[no_concentration, columns] = np.nan
+    return results
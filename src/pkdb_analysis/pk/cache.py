@@ -0,0 +1,158 @@
+"""Persistent content-hash cache of pharmacokinetic results.
+
+Results are stored in a local SQLite database under the hash of all inputs
+of the calculation (times, concentrations, units, dose, intervention time,
+options and ENGINE_VERSION). Unchanged timecourses are therefore not
+recalculated in subsequent runs, e.g.
+
+    cache = PKCache("pk_cache.sqlite")
+    pk_df = batch_pk(timecourses, doses, cache=cache)
+    pk_df = pkdata.compute_pk(cache=cache)
+
+The least recently used results are evicted if the stored results exceed
+`max_size` bytes.
+"""
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+import zlib
+from contextlib import closing, contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Union
+
+import numpy as np
+from pint import Quantity, Unit
+
+
+logger = logging.getLogger(__name__)
+
+# increase on every change of the results of the pharmacokinetics calculation
+ENGINE_VERSION = "1"
+
+
+def _json_default(obj):
+    """JSON representation of numpy and pint objects."""
+    if isinstance(obj, np.ndarray):
+        obj = np.ascontiguousarray(obj)
+        digest = hashlib.sha256(obj.tobytes()).hexdigest()
+        return {"dtype": str(obj.dtype), "shape": obj.shape, "sha256": digest}
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, Quantity):
+        return [_json_default(np.asarray(obj.magnitude)), str(obj.units)]
+    if isinstance(obj, Unit):
+        return str(obj)
+    return str(obj)
+
+
+def content_hash(*parts) -> str:
+    """Hash of the content of the parts and the ENGINE_VERSION.
+
+    Parts must be JSON serializable, numpy arrays (hashed by their bytes),
+    numpy scalars or pint quantities and units.
+    """
+    content = json.dumps(
+        [ENGINE_VERSION, parts], default=_json_default, sort_keys=True
+    )
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class PKCache(object):
+    """Persistent cache of pharmacokinetic results with size based eviction."""
+
+    def __init__(self, path: Union[str, Path], max_size: int = 100 * 2 ** 20):
+        """Opens (or creates) the cache.
+
+        :param path: path of the SQLite database
+        :param max_size: maximal size of the stored results in bytes
+        """
+        self.path = Path(path)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as con:
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, value BLOB, size INTEGER, accessed REAL)"
+            )
+            con.execute(
+                "CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        """Connection committing on success and closed afterwards."""
+        with closing(sqlite3.connect(self.path, timeout=30)) as con:
+            with con:
+                yield con
+
+    def __len__(self) -> int:
+        with self._connect() as con:
+            return con.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    @property
+    def size(self) -> int:
+        """Size of the stored results in bytes."""
+        with self._connect() as con:
+            size = con.execute("SELECT SUM(size) FROM results").fetchone()[0]
+        return size or 0
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Dict]:
+        """Cached results of the keys (missing keys are not contained)."""
+        keys = list(dict.fromkeys(keys))
+        results = {}
+        with self._connect() as con:
+            for k in range(0, len(keys), 500):
+                chunk = keys[k : k + 500]
+                rows = con.execute(
+                    f"SELECT key, value FROM results WHERE key IN "
+                    f"({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                for key, value in rows:
+                    results[key] = json.loads(zlib.decompress(value))
+            con.executemany(
+                "UPDATE results SET accessed = ? WHERE key = ?",
+                [(time.time(), key) for key in results],
+            )
+        self.hits += len(results)
+        self.misses += len(keys) - len(results)
+        return results
+
+    def set_many(self, items: Dict[str, Dict]) -> None:
+        """Stores the results and evicts the least recently used results."""
+        now = time.time()
+        rows = []
+        for key, result in items.items():
+            value = zlib.compress(
+                json.dumps(result, default=_json_default).encode("utf-8")
+            )
+            rows.append((key, value, len(value), now))
+        with self._connect() as con:
+            con.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)", rows)
+        self.evict()
+
+    def evict(self) -> int:
+        """Evicts the least recently used results exceeding max_size.
+
+        :return: number of evicted results
+        """
+        with self._connect() as con:
+            n = con.execute(
+                "DELETE FROM results WHERE key IN ("
+                "SELECT key FROM (SELECT key, SUM(size) OVER "
+                "(ORDER BY accessed DESC, key ROWS UNBOUNDED PRECEDING) AS total "
+                "FROM results) WHERE total > ?)",
+                (self.max_size,),
+            ).rowcount
+        if n:
+            logger.info(f"{n} results evicted from PKCache '{self.path}'.")
+        return n
+
+    def clear(self) -> None:
+        """Removes all results."""
+        with self._connect() as con:
+            con.execute("DELETE FROM results")
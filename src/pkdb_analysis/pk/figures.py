@@ -0,0 +1,316 @@
+"""Batch rendering of pharmacokinetic figures for the QC of many timecourses.
+
+In contrast to TimecoursePKNoDosing.figure, which creates a new pyplot figure
+per timecourse, a single figure template (Agg canvas without pyplot) is
+created per process and its artists are updated for every timecourse. Pages
+are streamed into a multipage PDF or tiled into image grids, so that the
+memory stays constant independent of the number of timecourses, e.g.
+
+    render_pk_figures(pkdata.timecourses.df, "timecourses.pdf", n_jobs=4)
+    render_pk_figures(pkdata.timecourses.df, "timecourses.png", grid=(4, 4))
+
+With `n_jobs > 1` the pages are rendered in a process pool and returned as
+raster images, with `n_jobs=1` the PDF pages are vector graphics.
+"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.backends.backend_pdf import PdfPages
+from matplotlib.figure import Figure
+from matplotlib.image import imsave
+from matplotlib.lines import Line2D
+from matplotlib.patches import Patch
+from pint import Quantity
+
+from pkdb_analysis.pk.batch import batch_pk_magnitudes, time_magnitudes
+
+
+class PKFigureTemplate(object):
+    """Reusable figure of a timecourse with its pharmacokinetic parameters.
+
+    The figure has the content of TimecoursePKNoDosing.figure (AUC,
+    extrapolated AUC, regression, cmax and tmax on a linear and a log axis).
+    """
+
+    def __init__(self, figsize: Tuple[float, float] = (10, 5), dpi: int = 100):
+        self.figure = Figure(figsize=figsize, dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.axes = self.figure.subplots(nrows=1, ncols=2)
+        self._fills = []
+        self._artists = []
+        for ax in self.axes:
+            artists = {
+                "data": ax.plot(
+                    [], [], "o-", color="black", markersize=6, linewidth=2
+                )[0],
+                "points": ax.plot(
+                    [], [], "s", color="blue", linewidth=2, markersize=8
+                )[0],
+                "fit": ax.plot([], [], "-", color="blue", linewidth=2.0)[0],
+                "extrapolation": ax.plot([], [], linestyle="-", color="black")[0],
+                "tend": ax.plot([], [], linestyle="-", color="black")[0],
+                "cmax": ax.plot([], [], linestyle="--", color="black")[0],
+                "tmax": ax.plot([], [], linestyle="--", color="black")[0],
+                "annotation": ax.text(0, 0, "(tmax, cmax)"),
+            }
+            self._artists.append(artists)
+            ax.legend(
+                handles=[
+                    Patch(color="green", alpha=0.2, label="AUCend"),
+                    Patch(color="red", alpha=0.2, label="AUCinf"),
+                    Line2D([], [], color="blue", linewidth=2.0, label="fit"),
+                ]
+            )
+        self.axes[1].set_yscale("log")
+
+    def draw(self, curve: Dict) -> None:
+        """Updates the figure with the curve.
+
+        :param curve: dictionary with t, c (relative to the intervention time),
+            title, time_unit, unit and the parameters tmax, cmax, slope,
+            intercept and max_idx of the curve
+        """
+        for fill in self._fills:
+            fill.remove()
+        self._fills = []
+
+        t = np.asarray(curve["t"], dtype=float)
+        c = np.asarray(curve["c"], dtype=float)
+        slope, intercept = curve["slope"], curve["intercept"]
+        tmax, cmax = curve["tmax"], curve["cmax"]
+        max_idx = curve["max_idx"]
+        if max_idx is None or np.isnan(max_idx):
+            max_idx = c.size - 1
+        max_idx = int(max_idx)
+        valid = ~np.isnan(c)
+        tend = t[valid][-1] if valid.any() else np.nan
+        cend = c[valid][-1] if valid.any() else np.nan
+        fit = not np.isnan(slope)
+
+        t_aucinf = np.linspace(0, 0.3 * tend, 50) if fit else np.array([])
+        c_aucinf = cend * np.exp(slope * t_aucinf)
+
+        for ax, artists in zip(self.axes, self._artists):
+            ax.set_title(curve["title"])
+            ax.set_xlabel(f"time [{curve['time_unit']}]")
+            ax.set_ylabel(f"concentration [{curve['unit']}]")
+            artists["data"].set_data(t, c)
+            artists["tend"].set_data([tend, tend], [0, cend])
+            artists["cmax"].set_data([0, tmax], [cmax, cmax])
+            artists["tmax"].set_data([tmax, tmax], [0, cmax])
+            artists["extrapolation"].set_data(tend + t_aucinf, c_aucinf)
+            artists["fit"].set_data(
+                (t, np.exp(intercept) * np.exp(slope * t)) if fit else ([], [])
+            )
+            artists["points"].set_data(
+                (t[max_idx + 2 :], c[max_idx + 2 :])
+                if fit and max_idx < c.size - 1
+                else ([], [])
+            )
+            artists["annotation"].set_position((tmax, cmax))
+            artists["annotation"].set_visible(bool(np.isfinite([tmax, cmax]).all()))
+
+            self._fills.append(
+                ax.fill_between(t, np.zeros_like(c), c, color="green", alpha=0.2)
+            )
+            if fit:
+                self._fills.append(
+                    ax.fill_between(
+                        tend + t_aucinf,
+                        c_aucinf,
+                        np.zeros_like(c_aucinf),
+                        color="red",
+                        alpha=0.2,
+                    )
+                )
+            ax.relim()
+            ax.autoscale_view()
+            tmin = np.nanmin(t) if t.size else 0.0
+            ax.set_xlim(left=min(0.0, tmin) if np.isfinite(tmin) else 0.0)
+        self.axes[0].set_ylim(bottom=0)
+
+    def to_array(self) -> np.ndarray:
+        """RGBA image of the figure."""
+        self.canvas.draw()
+        return np.asarray(self.canvas.buffer_rgba()).copy()
+
+
+@lru_cache(maxsize=4)
+def _template(figsize: Tuple[float, float], dpi: int) -> PKFigureTemplate:
+    """Figure template of the process."""
+    return PKFigureTemplate(figsize=figsize, dpi=dpi)
+
+
+def _render_chunk(
+    curves: List[Dict], figsize: Tuple[float, float], dpi: int
+) -> List[np.ndarray]:
+    """RGBA images of the curves."""
+    template = _template(figsize, dpi)
+    images = []
+    for curve in curves:
+        template.draw(curve)
+        images.append(template.to_array())
+    return images
+
+
+def pk_curves(
+    timecourses: pd.DataFrame,
+    intervention_times: Iterable[Quantity] = None,
+    concentration: str = "value",
+    titles: Iterable[str] = None,
+    **kwargs,
+) -> Iterator[Dict]:
+    """Curves with the parameters for the figures (see PKFigureTemplate.draw).
+
+    The parameters are calculated with batch_pk_magnitudes in the units of
+    the timecourses, kwargs are passed to batch_pk_magnitudes.
+    """
+    time_units = timecourses["time_unit"].tolist()
+    t_int = np.zeros(len(timecourses))
+    if intervention_times is not None:
+        t_int = time_magnitudes(intervention_times, time_units)
+    pk = batch_pk_magnitudes(
+        times=timecourses["time"],
+        concentrations=timecourses[concentration],
+        intervention_times=t_int,
+        **kwargs,
+    )
+    if titles is None:
+        titles = (
+            timecourses["substance"].astype(str)
+            if "substance" in timecourses.columns
+            else timecourses.index.astype(str)
+        )
+    for k, (time, c, title) in enumerate(
+        zip(timecourses["time"], timecourses[concentration], titles)
+    ):
+        yield {
+            "t": np.asarray(time, dtype=float) - t_int[k],
+            "c": np.asarray(c, dtype=float),
+            "title": title,
+            "time_unit": time_units[k],
+            "unit": timecourses["unit"].iloc[k],
+            **{
+                key: pk[key].iloc[k]
+                for key in ["tmax", "cmax", "slope", "intercept", "max_idx"]
+            },
+        }
+
+
+def _chunks(iterable: Iterable, size: int) -> Iterator[List]:
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _images(
+    curves: Iterator[Dict],
+    figsize: Tuple[float, float],
+    dpi: int,
+    n_jobs: int,
+    chunk_size: int,
+) -> Iterator[np.ndarray]:
+    """Images of the curves in order, at most 2 * n_jobs chunks are pending."""
+    if n_jobs == 1:
+        for chunk in _chunks(curves, chunk_size):
+            yield from _render_chunk(chunk, figsize, dpi)
+        return
+
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        pending = deque()
+        for chunk in _chunks(curves, chunk_size):
+            pending.append(executor.submit(_render_chunk, chunk, figsize, dpi))
+            if len(pending) >= 2 * n_jobs:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def render_pk_figures(
+    timecourses: pd.DataFrame,
+    path: Union[str, Path],
+    intervention_times: Iterable[Quantity] = None,
+    concentration: str = "value",
+    titles: Iterable[str] = None,
+    n_jobs: int = 1,
+    chunk_size: int = 10,
+    grid: Tuple[int, int] = (3, 3),
+    figsize: Tuple[float, float] = (10, 5),
+    dpi: int = 100,
+    **kwargs,
+) -> List[Path]:
+    """Renders the figures of the timecourses.
+
+    For a `.pdf` path every timecourse is a page of the multipage PDF, for
+    other image formats (e.g. `.png`) the figures are tiled in grids of
+    (rows, columns) and saved as `<stem>_<page>.<suffix>`.
+
+    :param timecourses: timecourses, one row per timecourse (see batch_pk)
+    :param path: path of the PDF or the images
+    :param intervention_times: intervention time of every timecourse, 0 if None
+    :param concentration: column of the concentrations
+    :param titles: titles of the figures, substances if None
+    :param n_jobs: number of processes rendering the figures
+    :param chunk_size: number of figures per task in the process pool
+    :param grid: rows and columns of the figures per image
+    :param figsize: size of a figure in inches
+    :param dpi: resolution of a figure
+    :param kwargs: options of the pharmacokinetics (see batch_pk_magnitudes)
+    :return: paths of the written files
+    """
+    if n_jobs < 1:
+        raise ValueError(f"'n_jobs' must be >= 1: {n_jobs}")
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    curves = pk_curves(
+        timecourses,
+        intervention_times=intervention_times,
+        concentration=concentration,
+        titles=titles,
+        **kwargs,
+    )
+
+    if path.suffix.lower() == ".pdf":
+        with PdfPages(path) as pdf:
+            if n_jobs == 1:
+                template = _template(figsize, dpi)
+                for curve in curves:
+                    template.draw(curve)
+                    pdf.savefig(template.figure)
+            else:
+                page = Figure(figsize=figsize, dpi=dpi)
+                FigureCanvasAgg(page)
+                for image in _images(curves, figsize, dpi, n_jobs, chunk_size):
+                    figimage = page.figimage(image, resize=False)
+                    pdf.savefig(page, dpi=dpi)
+                    figimage.remove()
+        return [path]
+
+    rows, cols = grid
+    paths = []
+    for k, chunk in enumerate(
+        _chunks(_images(curves, figsize, dpi, n_jobs, chunk_size), rows * cols)
+    ):
+        blank = np.full_like(chunk[0], 255)
+        chunk = chunk + [blank] * (rows * cols - len(chunk))
+        tiles = np.concatenate(
+            [
+                np.concatenate(chunk[r * cols : (r + 1) * cols], axis=1)
+                for r in range(rows)
+            ]
+        )
+        page_path = path.with_name(f"{path.stem}_{k:03d}{path.suffix}")
+        imsave(page_path, tiles)
+        paths.append(page_path)
+    return paths
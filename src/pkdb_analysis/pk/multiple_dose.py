@@ -0,0 +1,238 @@
+"""Multiple dosing and steady state by superposition of single dose profiles.
+
+For linear pharmacokinetics the concentration after multiple doses is the sum
+of the single dose profiles shifted by the dosing times (and scaled by the
+relative doses)
+
+    c(t) = sum_i w_i * c_sd(t - t_i)
+
+The single dose profile is interpolated between the data points with the
+trapezoid rule (see pk.auc) and extrapolated with the elimination rate after
+the last data point. The superposition is evaluated as a discrete
+convolution of the profile with the dosing events, i.e. as a single
+(time points x dosing events) array, so that schedules with hundreds of doses
+remain cheap.
+
+Dosing schedules are given by the time pattern of the interventions (see
+parse_dosing_schedule).
+"""
+import re
+import warnings
+from typing import Dict
+
+import numpy as np
+
+from pkdb_analysis.pk.auc import auc_intervals, interpolate
+
+
+def parse_dosing_schedule(time: str, time_end: float = None) -> np.ndarray:
+    """Dosing times of the time pattern of an intervention.
+
+    Supported patterns are
+
+    - single dosing time, e.g. "0"
+    - list of dosing times, e.g. "0, 12, 24", "[0, 12, 24]" or "0;12;24"
+    - regular schedule "start:interval:end" (including end), e.g. "0:12:72"
+    - regular schedule "start:interval" until `time_end`
+
+    :param time: time pattern of the intervention
+    :param time_end: end of the regular schedule for "start:interval"
+    :return: sorted dosing times
+    """
+    if isinstance(time, (int, float, np.number)):
+        if np.isnan(time):
+            raise ValueError("No dosing time.")
+        return np.array([float(time)])
+
+    pattern = str(time).strip().strip("[]()").strip()
+    try:
+        if ":" in pattern:
+            values = [float(v) for v in pattern.split(":")]
+            if len(values) == 2 and time_end is not None and not np.isnan(time_end):
+                values.append(float(time_end))
+            if len(values) != 3:
+                raise ValueError
+            start, interval, end = values
+            if interval <= 0 or end < start:
+                raise ValueError
+            n = int(np.floor((end - start) / interval + 1e-9)) + 1
+            return start + interval * np.arange(n)
+        times = np.array(
+            [float(v) for v in re.split(r"[,;\s]+", pattern) if v], dtype=float
+        )
+    except ValueError:
+        raise ValueError(f"Invalid dosing schedule: '{time}'")
+    if times.size == 0 or np.isnan(times).any():
+        raise ValueError(f"Invalid dosing schedule: '{time}'")
+    return np.sort(times)
+
+
+def single_dose_profile(
+    t: np.ndarray,
+    c: np.ndarray,
+    kel: float,
+    t_eval: np.ndarray,
+    method: str = "linear",
+) -> np.ndarray:
+    """Concentrations of the single dose profile at the times t_eval.
+
+    The profile is 0 before the dosing (t_eval < 0), interpolated from 0 at
+    the dosing to the first data point, interpolated with the trapezoid rule
+    between the data points and extrapolated with c_last * exp(-kel * dt)
+    after the last data point (NaN without kel).
+
+    :param t: times of the data points relative to the dosing (without NaN)
+    :param c: concentrations of the data points (without NaN)
+    :param kel: elimination rate
+    :param t_eval: times of the evaluation (any shape)
+    :param method: trapezoid rule, "linear" or "linear_up_log_down"
+    :return: concentrations with the shape of t_eval
+    """
+    t = np.asarray(t, dtype=float)
+    c = np.asarray(c, dtype=float)
+    if t.size == 0 or t[0] < 0:
+        raise ValueError("Data points at times >= 0 are required.")
+    if t[0] > 0:
+        t = np.concatenate([[0.0], t])
+        c = np.concatenate([[0.0], c])
+
+    t_eval = np.asarray(t_eval, dtype=float)
+    idx = np.clip(np.searchsorted(t, t_eval, side="right") - 1, 0, t.size - 1)
+    nxt = np.clip(idx + 1, 0, t.size - 1)
+    profile = interpolate(t[idx], t[nxt], c[idx], c[nxt], t_eval, method)
+    with np.errstate(invalid="ignore"):
+        tail = c[-1] * np.exp(-kel * (t_eval - t[-1]))
+    profile = np.where(t_eval >= t[-1], tail, profile)
+    return np.where(t_eval < 0, 0.0, profile)
+
+
+def superposition(
+    t: np.ndarray,
+    c: np.ndarray,
+    kel: float,
+    dosing_times: np.ndarray,
+    t_eval: np.ndarray,
+    weights: np.ndarray = None,
+    method: str = "linear",
+) -> np.ndarray:
+    """Concentrations of the multiple dosing at the times t_eval.
+
+    :param t: times of the single dose data points relative to the dosing
+    :param c: concentrations of the single dose data points
+    :param kel: elimination rate of the single dose profile
+    :param dosing_times: times of the doses
+    :param t_eval: times of the evaluation (1D)
+    :param weights: doses relative to the single dose, 1 if None
+    :param method: trapezoid rule, "linear" or "linear_up_log_down"
+    :return: concentrations at t_eval
+    """
+    dosing_times = np.asarray(dosing_times, dtype=float)
+    if weights is None:
+        weights = np.ones_like(dosing_times)
+    # time points x dosing events
+    profiles = single_dose_profile(
+        t, c, kel, np.subtract.outer(np.asarray(t_eval, float), dosing_times), method
+    )
+    return profiles @ np.asarray(weights, dtype=float)
+
+
+def _integrate(t: np.ndarray, c: np.ndarray, method: str) -> float:
+    return float(np.sum(auc_intervals(t[:-1], t[1:], c[:-1], c[1:], method)))
+
+
+def multiple_dose_parameters(
+    t: np.ndarray,
+    c: np.ndarray,
+    kel: float,
+    dosing_times: np.ndarray,
+    tau: float = None,
+    weights: np.ndarray = None,
+    method: str = "linear",
+    n_points: int = 200,
+) -> Dict[str, float]:
+    """Parameters of the last dosing interval of a multiple dosing.
+
+    The last dosing interval is [t_n, t_n + tau] with the last dosing time t_n
+    and the dosing interval tau (last interval of the schedule if None). The
+    profile is evaluated on a grid of n_points and the break points of the
+    superposed single dose profiles within the interval.
+
+    :return: dictionary with tau, cmax, tmax (relative to the last dose), cmin,
+        cavg, auctau (AUC of the last interval), accumulation_ratio (auctau
+        relative to the AUC of the first interval after a single dose) and
+        n_doses
+    """
+    t = np.asarray(t, dtype=float)
+    c = np.asarray(c, dtype=float)
+    dosing_times = np.sort(np.asarray(dosing_times, dtype=float))
+    if tau is None:
+        if dosing_times.size < 2:
+            raise ValueError("'tau' is required for a single dose.")
+        tau = dosing_times[-1] - dosing_times[-2]
+    if tau <= 0:
+        raise ValueError(f"'tau' must be > 0: {tau}")
+
+    # grid and break points of the single dose profiles within the interval
+    start = dosing_times[-1]
+    breaks = (np.add.outer(dosing_times, np.concatenate([[0.0], t])) - start).ravel()
+    grid = np.concatenate(
+        [np.linspace(0, tau, n_points), breaks[(breaks > 0) & (breaks < tau)]]
+    )
+    grid = np.unique(grid)
+
+    conc = superposition(
+        t, c, kel, dosing_times, start + grid, weights=weights, method=method
+    )
+    single = single_dose_profile(t, c, kel, grid, method=method)
+    auctau = _integrate(grid, conc, method)
+    auctau_single = _integrate(grid, single, method)
+    k_max = int(np.nanargmax(conc)) if np.isfinite(conc).any() else 0
+    return {
+        "tau": float(tau),
+        "cmax": float(conc[k_max]),
+        "tmax": float(grid[k_max]),
+        "cmin": float(np.nanmin(conc)),
+        "cavg": auctau / tau,
+        "auctau": auctau,
+        "accumulation_ratio": auctau / auctau_single,
+        "n_doses": int(dosing_times.size),
+    }
+
+
+def steady_state_parameters(
+    t: np.ndarray,
+    c: np.ndarray,
+    kel: float,
+    tau: float,
+    method: str = "linear",
+    n_points: int = 200,
+    tolerance: float = 1e-6,
+    max_doses: int = 10000,
+) -> Dict[str, float]:
+    """Parameters at steady state for doses every tau.
+
+    The steady state is approximated by the last interval of a regular
+    schedule with enough doses, that the contribution of further doses is
+    below the relative `tolerance` (see multiple_dose_parameters). A warning
+    is raised if more than `max_doses` doses are required, the parameters of
+    the last of `max_doses` intervals are not at steady state.
+    """
+    if not kel > 0:
+        raise ValueError(f"Steady state requires an elimination rate > 0: {kel}")
+    t_last = np.asarray(t, dtype=float)[-1]
+    n_doses = int(np.ceil(-np.log(tolerance) / (kel * tau) + t_last / tau)) + 1
+    if n_doses > max_doses:
+        warnings.warn(
+            f"Steady state requires {n_doses} doses > max_doses ({max_doses}), "
+            f"the parameters after {max_doses} doses are not converged."
+        )
+        n_doses = max_doses
+    return multiple_dose_parameters(
+        t,
+        c,
+        kel,
+        dosing_times=tau * np.arange(n_doses),
+        tau=tau,
+        method=method,
+        n_points=n_points,
+    )
@@ -6,14 +6,27 @@ Pharmacokinetic parameters are than calculated and returned.
 """
 import warnings
 from dataclasses import dataclass
-from typing import List
+from functools import lru_cache
+from typing import Dict, List, Tuple
 
 import numpy as np
 from matplotlib import pyplot as plt
 from matplotlib.pyplot import Figure
-from pint import Quantity, UnitRegistry
+from pint import Quantity, Unit, UnitRegistry
 from scipy import stats
 
+from pkdb_analysis.pk.auc import (
+    auc_intervals,
+    aumc_intervals,
+    check_auc_method,
+    partial_auc,
+)
+from pkdb_analysis.pk.multiple_dose import (
+    multiple_dose_parameters,
+    steady_state_parameters,
+)
+from pkdb_analysis.pk.regression import best_fit_regression, check_lambda_z
+
 
 with warnings.catch_warnings():
     warnings.simplefilter("ignore")
@@ -33,6 +46,9 @@ class PKParametersNoDosing:
     cmaxhalf: Quantity
     kel: Quantity
     thalf: Quantity
+    aumc: Quantity
+    aumcinf: Quantity
+    mrt: Quantity
     slope: Quantity
     intercept: Quantity
     r_value: float
@@ -43,7 +59,19 @@ class PKParametersNoDosing:
     @property
     def parameters(self) -> List[str]:
         """Get parameter ids."""
-        return ["auc", "aucinf", "tmax", "cmax", "tmaxhalf", "cmaxhalf", "kel", "thalf"]
+        return [
+            "auc",
+            "aucinf",
+            "tmax",
+            "cmax",
+            "tmaxhalf",
+            "cmaxhalf",
+            "kel",
+            "thalf",
+            "aumc",
+            "aumcinf",
+            "mrt",
+        ]
 
     @property
     def regression_parameters(self) -> List[str]:
@@ -83,6 +111,95 @@ class PKParameters(PKParametersNoDosing):
         return super().parameters + ["dose", "vd", "vdss", "cl"]
 
 
+@dataclass
+class MultipleDoseParameters:
+    """Pharmacokinetics parameters of the last interval of multiple dosing."""
+
+    compound: str
+    tau: Quantity
+    cmax: Quantity
+    tmax: Quantity
+    cmin: Quantity
+    cavg: Quantity
+    auctau: Quantity
+    accumulation_ratio: float
+    n_doses: int
+
+
+@lru_cache(maxsize=256)
+def pk_units(
+    ureg: UnitRegistry,
+    time_unit,
+    concentration_unit,
+    dose_unit=None,
+    dose_nan: bool = False,
+) -> Dict[str, Tuple[float, Unit]]:
+    """Conversion factors and units of the pharmacokinetic parameters.
+
+    The parameters calculated on the magnitudes in the given time, concentration
+    and dose units multiplied with the factors are the magnitudes of the
+    parameters of TimecoursePK in the returned units. The units are resolved
+    by the same unit operations as in TimecoursePK._f_pk, results are cached
+    (do not modify the returned dictionary).
+
+    :param ureg: unit registry
+    :param time_unit: unit of time
+    :param concentration_unit: unit of concentration
+    :param dose_unit: unit of dose, parameters without dose if None
+    :param dose_nan: units of the parameters for a NaN dose
+    :return: dictionary of parameter: (factor, unit)
+    """
+    Q_ = ureg.Quantity
+    t = Q_(1.0, time_unit)
+    c = Q_(1.0, concentration_unit)
+    slope = Q_(1.0, ureg.Unit(f"1/{t.units}"))
+    auc = t * c
+
+    units = {}
+    for key, q in [
+        ("auc", auc),
+        ("aucinf", auc),
+        ("tmax", t),
+        ("cmax", c),
+        ("tmaxhalf", t),
+        ("cmaxhalf", c),
+        ("kel", slope),
+        ("thalf", 1 / slope),
+        ("aumc", auc * t),
+        ("aumcinf", auc * t),
+        ("mrt", t),
+        ("slope", slope),
+        ("intercept", c),
+    ]:
+        q = q.to_reduced_units()
+        units[key] = (q.magnitude, q.units)
+
+    if dose_unit is not None and dose_nan:
+        dose = Q_(1.0, dose_unit)
+        vd = Q_(1.0, dose.units / (auc.units / slope.units))
+        cl = Q_(1.0, slope.units * vd.units).to_reduced_units()
+        dose = dose.to_reduced_units()
+        for key, q in [("dose", dose), ("vd", vd), ("vdss", vd), ("cl", cl)]:
+            units[key] = (q.magnitude, q.units)
+
+    elif dose_unit is not None:
+        dose = Q_(1.0, dose_unit)
+        vdss = dose / c
+        vd = dose / (auc * slope)
+        cl = slope * vd
+        for vd_par in [vd, vdss]:
+            if vd_par.check("[length] ** 3"):
+                vd_par.ito("liter")
+            elif vd_par.check("[length] ** 3/[mass]"):
+                vd_par.ito("liter/kg")
+        dose = dose.to_reduced_units()
+        cl = cl.to_reduced_units()
+        for key, q in [("dose", dose), ("vd", vd), ("vdss", vdss), ("cl", cl)]:
+            units[key] = (q.magnitude, q.units)
+
+    return units
+
+
 class TimecoursePKNoDosing:
     """Class for pharmacokinetics from timecourses without dose information."""
 
@@ -93,10 +210,38 @@ class TimecoursePKNoDosing:
         ureg: UnitRegistry,
         substance: str = "substance",
         min_treshold=1e6,
+        resolve_units: bool = False,
+        lambda_z: str = "after_max",
+        auc_method: str = "linear",
         **kwargs,
     ):
+        """Pharmacokinetics parameters are calculated for the timecourse.
 
-        self._init(time, concentration, ureg, substance, min_treshold, **kwargs)
+        With `resolve_units` the parameters are calculated on the magnitudes and
+        the units of the parameters are resolved once from the units of time
+        and concentration (see pk_units). The results are identical, but the
+        overhead of the unit handling is avoided.
+
+        The terminal elimination phase for kel and thalf is either all data
+        points after the maximum (`lambda_z="after_max"`) or the trailing
+        window with the best adjusted R² (`lambda_z="best_fit"`, see
+        best_fit_regression).
+
+        The AUC and AUMC are integrated with the linear trapezoid rule
+        (`auc_method="linear"`) or with the linear-up/log-down rule
+        (`auc_method="linear_up_log_down"`, see pk.auc).
+        """
+        self._init(
+            time,
+            concentration,
+            ureg,
+            substance,
+            min_treshold,
+            resolve_units=resolve_units,
+            lambda_z=lambda_z,
+            auc_method=auc_method,
+            **kwargs,
+        )
         self.pk = self._f_pk()
 
     def _init(
@@ -106,10 +251,18 @@ class TimecoursePKNoDosing:
         ureg: UnitRegistry,
         substance: str = "substance",
         min_treshold=1e8,
+        resolve_units: bool = False,
+        lambda_z: str = "after_max",
+        auc_method: str = "linear",
         **kwargs,
     ):
         self.ureg = ureg
         self.Q_ = ureg.Quantity
+        self.resolve_units = resolve_units
+        check_lambda_z(lambda_z)
+        self.lambda_z = lambda_z
+        check_auc_method(auc_method)
+        self.auc_method = auc_method
 
         if not isinstance(time, Quantity):
             raise ValueError(f"'time' must be a pint Quantity: {type(time)}")
@@ -123,13 +276,12 @@ class TimecoursePKNoDosing:
 
         # for numerical simulations problems in calculations can arise
         # if values are getting too small
-        cmin = np.nanmin(
-            concentration[np.nonzero(concentration)]
-        )  # only take non-zero values
-        cmax = np.nanmax(concentration)
+        c = concentration.magnitude
+        cmin = np.nanmin(c[np.nonzero(c)])  # only take non-zero values
+        cmax = np.nanmax(c)
         if (min_treshold * cmin) < cmax:
             warnings.warn("Very small concentrations values are set to NaN.")
-            concentration[concentration * min_treshold < cmax] = np.nan
+            c[c * min_treshold < cmax] = np.nan
 
         self.t = time
         self.c = concentration
@@ -142,6 +294,13 @@ class TimecoursePKNoDosing:
         - create a report with pk_report
         - create a visualization with pk_figure
         """
+        if self.resolve_units:
+            values = self._f_pk_magnitudes(self.t.magnitude, self.c.magnitude)
+            units = pk_units(self.ureg, self.t.units, self.c.units)
+            return PKParametersNoDosing(
+                compound=self.substance, **self._attach_units(values, units)
+            )
+
         c = self.c
         t = self.t
         # simple pk
@@ -162,6 +321,9 @@ class TimecoursePKNoDosing:
         kel = self._kel(slope=slope)
         thalf = self._thalf(kel=kel)
         aucinf = self._aucinf(t, c, slope=slope, auc=auc)
+        aumc = self._aumc(t, c)
+        aumcinf = self._aumcinf(t, c, kel=kel, aumc=aumc)
+        mrt = self._mrt(aucinf=aucinf, aumcinf=aumcinf)
 
         return PKParametersNoDosing(
             compound=self.substance,
@@ -173,6 +335,9 @@ class TimecoursePKNoDosing:
             cmaxhalf=cmaxhalf.to_reduced_units(),
             kel=kel.to_reduced_units(),
             thalf=thalf.to_reduced_units(),
+            aumc=aumc.to_reduced_units(),
+            aumcinf=aumcinf.to_reduced_units(),
+            mrt=mrt.to_reduced_units(),
             slope=slope.to_reduced_units(),
             intercept=intercept.to_reduced_units(),
             r_value=r_value,
@@ -181,17 +346,66 @@ class TimecoursePKNoDosing:
             max_idx=max_idx,
         )
 
+    def _f_pk_magnitudes(self, t: np.ndarray, c: np.ndarray) -> Dict[str, float]:
+        """Calculate the pk parameters without dose on magnitudes."""
+        auc = self._auc(t, c)
+        tmax, cmax = self._max(t, c)
+        tmaxhalf, cmaxhalf = self._max_half(t, c)
+        [slope, intercept, r_value, p_value, std_err, max_idx] = self._ols_regression(
+            t, c
+        )
+        kel = self._kel(slope=slope)
+        thalf = self._thalf(kel=kel)
+        aucinf = self._aucinf(t, c, slope=slope, auc=auc)
+        aumc = self._aumc(t, c)
+        aumcinf = self._aumcinf(t, c, kel=kel, aumc=aumc)
+
+        return {
+            "auc": auc,
+            "aucinf": aucinf,
+            "tmax": tmax,
+            "cmax": cmax,
+            "tmaxhalf": tmaxhalf,
+            "cmaxhalf": cmaxhalf,
+            "kel": kel,
+            "thalf": thalf,
+            "aumc": aumc,
+            "aumcinf": aumcinf,
+            "mrt": self._mrt(aucinf=aucinf, aumcinf=aumcinf),
+            "slope": slope,
+            "intercept": intercept,
+            "r_value": r_value,
+            "p_value": p_value,
+            "std_err": std_err,
+            "max_idx": max_idx,
+        }
+
+    def _attach_units(
+        self, values: Dict[str, float], units: Dict[str, Tuple[float, Unit]]
+    ) -> Dict:
+        """Converts the magnitudes to quantities with the resolved units."""
+        values = values.copy()
+        for key, (factor, unit) in units.items():
+            values[key] = self.Q_(values[key] * factor, unit)
+        return values
+
+    def _nan_like(self, x):
+        """NaN with the units of x."""
+        if isinstance(x, Quantity):
+            return self.Q_(np.nan, x.units)
+        return np.nan
+
     def _ols_regression(self, t, c):
         """Linear regression on the log timecourse after maximal value.
 
-        No check is performed if already in equilibrium distribution !.
-        The linear regression is calculated from all data points after the maximum.
+        With `lambda_z="after_max"` the linear regression is calculated from all
+        data points after the maximum, no check is performed if already in
+        equilibrium distribution. With `lambda_z="best_fit"` the trailing window
+        of at least 3 data points after the maximum with the best adjusted R² is
+        used (see best_fit_regression).
 
         :return:
         """
-        slope_units = self.ureg.Unit(f"1/{t.units}")
-        intercept_units = self.ureg.Unit(c.units)
-
         max_index = np.nanargmax(c)
         # at least three data points after maximum are required for a regression
 
@@ -201,38 +415,51 @@ class TimecoursePKNoDosing:
                 "Regression could not be calculated, "
                 "at least 3 data points after maximum required."
             )
-            return [self.Q_(np.nan, slope_units), self.Q_(np.nan, intercept_units)] + [
-                np.nan
-            ] * 4
-
-        # linear regression start regression on data point after maximum
-        x = t.magnitude[max_index + 1 :]
-        y = np.log(c.magnitude[max_index + 1 :])
-
-        # using mask to remove nan values
-        mask = ~np.isnan(x) & ~np.isnan(y)
-        slope, intercept, r_value, p_value, std_err = stats.linregress(x[mask], y[mask])
-
-        # handle possible regression issues
-        if np.isnan(slope) or np.isnan(intercept):
-            warnings.warn("Regression could not be calculated on timecourse curve.")
-        elif slope > 0.0:
-            warnings.warn(
-                "Regression gave a positive slope, "
-                "resulting in a negative elimination rate. "
-                "Slope is set to NaN."
-            )
-            slope = np.nan
-            intercept = np.nan
+            slope, intercept = np.nan, np.nan
+            r_value, p_value, std_err, max_index = [np.nan] * 4
+        else:
+            # linear regression start regression on data point after maximum
+            x = getattr(t, "magnitude", t)[max_index + 1 :]
+            y = np.log(getattr(c, "magnitude", c)[max_index + 1 :])
+
+            # using mask to remove nan values and log of zero concentrations
+            mask = np.isfinite(x) & np.isfinite(y)
+            if self.lambda_z == "best_fit":
+                fit = best_fit_regression(
+                    x[mask], y[mask], np.zeros(mask.sum(), dtype=int), 1
+                )
+                slope, intercept, r_value, p_value, std_err = [
+                    fit[key][0]
+                    for key in ["slope", "intercept", "r_value", "p_value", "std_err"]
+                ]
+            else:
+                slope, intercept, r_value, p_value, std_err = stats.linregress(
+                    x[mask], y[mask]
+                )
 
-        slope = self.Q_(slope, slope_units)
-        intercept = self.Q_(intercept, intercept_units)
+            # handle possible regression issues
+            if np.isnan(slope) or np.isnan(intercept):
+                warnings.warn("Regression could not be calculated on timecourse curve.")
+            elif slope > 0.0:
+                warnings.warn(
+                    "Regression gave a positive slope, "
+                    "resulting in a negative elimination rate. "
+                    "Slope is set to NaN."
+                )
+                slope = np.nan
+                intercept = np.nan
+
+        if isinstance(t, Quantity):
+            slope = self.Q_(slope, self.ureg.Unit(f"1/{t.units}"))
+            intercept = self.Q_(intercept, self.ureg.Unit(c.units))
 
         return [slope, intercept, r_value, p_value, std_err, max_index]
 
     def _auc(self, t: np.ndarray, c: np.ndarray, rm_nan: bool = True):
         """Calculate the area under the curve (AUC) via trapezoid rule.
 
+        The trapezoid rule is selected with `auc_method` (see pk.auc).
+
         :param t = time array
         :param c = concentration array
         :param rm_nan = remove nan values array
@@ -240,9 +467,152 @@ class TimecoursePKNoDosing:
         if rm_nan:
             idx = np.where(~np.isnan(c))
             t, c = t[idx], c[idx]
-        auc = np.sum((t[1:] - t[0:-1]) * (c[1:] + c[0:-1]) / 2.0)
+        tm, cm = getattr(t, "magnitude", t), getattr(c, "magnitude", c)
+        auc = np.sum(auc_intervals(tm[:-1], tm[1:], cm[:-1], cm[1:], self.auc_method))
+        if isinstance(t, Quantity):
+            auc = self.Q_(auc, t.units * c.units)
         return auc
 
+    def _aumc(self, t: np.ndarray, c: np.ndarray, rm_nan: bool = True):
+        """Calculate the area under the first moment curve (AUMC, t*c).
+
+        :param t = time array
+        :param c = concentration array
+        :param rm_nan = remove nan values array
+        """
+        if rm_nan:
+            idx = np.where(~np.isnan(c))
+            t, c = t[idx], c[idx]
+        tm, cm = getattr(t, "magnitude", t), getattr(c, "magnitude", c)
+        aumc = np.sum(
+            aumc_intervals(tm[:-1], tm[1:], cm[:-1], cm[1:], self.auc_method)
+        )
+        if isinstance(t, Quantity):
+            aumc = self.Q_(aumc, t.units * t.units * c.units)
+        return aumc
+
+    def _aumcinf(self, t, c, kel, aumc, rm_nan: bool = True):
+        """Area under the first moment curve extrapolated to infinity.
+
+        Integrating t*c[-1]*exp(-kel*(t-t[-1])) from t[-1] to infinity gives
+        c[-1]*t[-1]/kel + c[-1]/kel**2.
+        """
+        if rm_nan:
+            idx = np.where(~np.isnan(c))
+            t, c = t[idx], c[idx]
+        return aumc + c[-1] * t[-1] / kel + c[-1] / kel ** 2
+
+    def _mrt(self, aucinf, aumcinf):
+        """Mean residence time (MRT = AUMCinf/AUCinf)."""
+        return aumcinf / aucinf
+
+    def _time(self):
+        """Time relative to the intervention time."""
+        return self.t
+
+    def _single_dose(self):
+        """Data points after the dosing and kel in the units of the time."""
+        t = self._time()
+        c = self.c
+        idx = np.where(~np.isnan(c.magnitude) & (t.magnitude >= 0))
+        kel = self.pk.kel.to(1 / t.units).magnitude
+        return t.magnitude[idx], c.magnitude[idx], kel
+
+    def _multiple_dose_parameters(self, values: Dict) -> MultipleDoseParameters:
+        t_units, c_units = self.t.units, self.c.units
+        return MultipleDoseParameters(
+            compound=self.substance,
+            tau=self.Q_(values["tau"], t_units),
+            cmax=self.Q_(values["cmax"], c_units),
+            tmax=self.Q_(values["tmax"], t_units),
+            cmin=self.Q_(values["cmin"], c_units),
+            cavg=self.Q_(values["cavg"], c_units),
+            auctau=self.Q_(values["auctau"], t_units * c_units).to_reduced_units(),
+            accumulation_ratio=values["accumulation_ratio"],
+            n_doses=values["n_doses"],
+        )
+
+    def multiple_dose(
+        self,
+        dosing_times: Quantity,
+        tau: Quantity = None,
+        weights: np.ndarray = None,
+        n_points: int = 200,
+    ) -> MultipleDoseParameters:
+        """Pharmacokinetics of multiple dosing by superposition.
+
+        The timecourse is the single dose profile, the parameters are
+        calculated for the last dosing interval (see pk.multiple_dose).
+        Dosing schedules of interventions can be parsed with
+        pk.multiple_dose.parse_dosing_schedule.
+
+        :param dosing_times: times of the doses
+        :param tau: dosing interval after the last dose, last interval of the
+            schedule if None
+        :param weights: doses relative to the dose of the timecourse
+        :param n_points: number of grid points in the dosing interval
+        :return: parameters of the last dosing interval
+        """
+        t, c, kel = self._single_dose()
+        values = multiple_dose_parameters(
+            t,
+            c,
+            kel,
+            dosing_times=dosing_times.to(self.t.units).magnitude,
+            tau=tau.to(self.t.units).magnitude if tau is not None else None,
+            weights=weights,
+            method=self.auc_method,
+            n_points=n_points,
+        )
+        return self._multiple_dose_parameters(values)
+
+    def steady_state(
+        self, tau: Quantity, n_points: int = 200, max_doses: int = 10000
+    ) -> MultipleDoseParameters:
+        """Pharmacokinetics at steady state for doses every tau.
+
+        Cmax,ss, Cmin,ss, AUCtau,ss and the accumulation ratio of the
+        steady state by superposition (see pk.multiple_dose). A warning is
+        raised if the steady state is not reached within `max_doses` doses.
+        """
+        t, c, kel = self._single_dose()
+        values = steady_state_parameters(
+            t,
+            c,
+            kel,
+            tau=tau.to(self.t.units).magnitude,
+            method=self.auc_method,
+            n_points=n_points,
+            max_doses=max_doses,
+        )
+        return self._multiple_dose_parameters(values)
+
+    def partial_auc(self, start: Quantity, end: Quantity) -> Quantity:
+        """Area under the curve in the window [start, end].
+
+        The concentrations at the window boundaries are interpolated with the
+        trapezoid rule of `auc_method`, the AUC is NaN for windows outside of
+        the timecourse (no extrapolation).
+
+        :param start: start of the window (relative to the intervention time)
+        :param end: end of the window (relative to the intervention time)
+        :return: partial AUC
+        """
+        t = self._time()
+        c = self.c
+        idx = np.where(~np.isnan(c.magnitude))
+        t, c = t[idx], c[idx]
+        auc = partial_auc(
+            t.magnitude,
+            c.magnitude,
+            np.zeros(t.size, dtype=int),
+            1,
+            start=start.to(t.units).magnitude,
+            end=end.to(t.units).magnitude,
+            method=self.auc_method,
+        )[0]
+        return self.Q_(auc, t.units * c.units).to_reduced_units()
+
     def _aucinf(self, t, c, slope=None, auc=None, rm_nan: bool = True):
         """Area under the curve extrapolated to infinity.
 
@@ -269,7 +639,7 @@ class TimecoursePKNoDosing:
             # indicates that more sampling is needed for an accurate estimate of the elimination
             # rate constant and the observed area under the curve.
             warnings.warn(
-                f"AUC(t-oo) is >25% ({round((auc_d/auc*100).magnitude, 2)}%) of total AUC, "
+                f"AUC(t-oo) is >25% ({round(float(auc_d / auc * 100), 2)}%) of total AUC, "
                 f"calculation may be unreliable."
             )
 
@@ -299,7 +669,7 @@ class TimecoursePKNoDosing:
                 warnings.warn("No MAXIMUM reached within time course, last value used.")
             if idx == 0:
                 # no maximum in time course
-                return self.Q_(np.nan, t.units), self.Q_(np.nan, c.units)
+                return self._nan_like(t), self._nan_like(c)
 
             cmax = c[idx]
             tnew = t[:idx]
@@ -308,7 +678,7 @@ class TimecoursePKNoDosing:
             return tnew[idx_half], c[idx_half]
         except ValueError:
             # often only NaN values before maximum (e.g., iv dosing)
-            return self.Q_(np.nan, t.units), self.Q_(np.nan, c.units)
+            return self._nan_like(t), self._nan_like(c)
 
     def _kel(self, slope):
         """Elimination rate constant.
@@ -464,11 +834,15 @@ class TimecoursePK(TimecoursePKNoDosing):
         intervention_time: Quantity = None,
         substance: str = "substance",
         min_treshold=1e6,
+        resolve_units: bool = False,
+        lambda_z: str = "after_max",
+        auc_method: str = "linear",
         **kwargs,
     ):
         """Pharmacokinetics parameters are calculated for a single dose experiment.
 
-        TODO: support errors on concentrations which are then used in calculation
+        Errors on concentrations are not used, see pk.uncertainty.monte_carlo_pk
+        for the uncertainty of the parameters from sd, se or cv.
         FIXME: ctype is used in kwargs for "value", "mean", "median", but not
          processed
 
@@ -480,10 +854,28 @@ class TimecoursePK(TimecoursePKNoDosing):
         :param ureg: unit registry, allowing to calculate the pk in the respective unit system
         :param substance: name of compound/substance
         :param intervention_time: time of intervention (with unit)
+        :param resolve_units: calculate on magnitudes and resolve the units of
+            the parameters once from the units of time, concentration and dose
+            (see pk_units), avoiding the overhead of the unit handling
+        :param lambda_z: selection of the terminal phase for the regression,
+            all data points after the maximum ("after_max") or the trailing
+            window with the best adjusted R² ("best_fit")
+        :param auc_method: integration rule of AUC and AUMC, "linear" or
+            "linear_up_log_down"
 
         :return: pharmacokinetic parameters
         """
-        self._init(time, concentration, ureg, substance, min_treshold, **kwargs)
+        self._init(
+            time,
+            concentration,
+            ureg,
+            substance,
+            min_treshold,
+            resolve_units=resolve_units,
+            lambda_z=lambda_z,
+            auc_method=auc_method,
+            **kwargs,
+        )
         if intervention_time is None:
             intervention_time = self.Q_(0.0, "hr")
         if dose is None:
@@ -528,6 +920,9 @@ class TimecoursePK(TimecoursePKNoDosing):
         - create a visualization with pk_figure
 
         """
+        if self.resolve_units:
+            return self._f_pk_resolved()
+
         # calculate all results relative to the intervention time
         t = self.t - self.intervention_time
         c = self.c
@@ -544,6 +939,9 @@ class TimecoursePK(TimecoursePKNoDosing):
         kel = self._kel(slope=slope)
         thalf = self._thalf(kel=kel)
         aucinf = self._aucinf(t, c, auc=auc, slope=slope)
+        aumc = self._aumc(t, c)
+        aumcinf = self._aumcinf(t, c, kel=kel, aumc=aumc)
+        mrt = self._mrt(aucinf=aucinf, aumcinf=aumcinf)
 
         if self.dose is not None and not np.isnan(self.dose.magnitude):
             # parameters depending on dose
@@ -576,6 +974,9 @@ class TimecoursePK(TimecoursePKNoDosing):
             cmaxhalf=cmaxhalf.to_reduced_units(),
             kel=kel.to_reduced_units(),
             thalf=thalf.to_reduced_units(),
+            aumc=aumc.to_reduced_units(),
+            aumcinf=aumcinf.to_reduced_units(),
+            mrt=mrt.to_reduced_units(),
             vd=vd,
             vdss=vdss,
             cl=cl.to_reduced_units(),
@@ -587,6 +988,34 @@ class TimecoursePK(TimecoursePKNoDosing):
             max_idx=max_idx,
         )
 
+    def _time(self):
+        """Time relative to the intervention time."""
+        return self.t - self.intervention_time
+
+    def _f_pk_resolved(self) -> PKParameters:
+        """Calculate all pk parameters on magnitudes with resolved units."""
+        t = self.t.magnitude - self.intervention_time.magnitude
+        values = self._f_pk_magnitudes(t, self.c.magnitude)
+
+        dose = self.dose.magnitude
+        dose_nan = bool(np.isnan(dose))
+        if not dose_nan:
+            values["vdss"] = self._vdss(dose=dose, intercept=values["intercept"])
+            values["vd"] = self._vd(
+                aucinf=values["aucinf"], dose=dose, kel=values["kel"]
+            )
+            values["cl"] = values["kel"] * values["vd"]
+        else:
+            values["vdss"], values["vd"], values["cl"] = np.nan, np.nan, np.nan
+        values["dose"] = dose
+
+        units = pk_units(
+            self.ureg, self.t.units, self.c.units, self.dose.units, dose_nan=dose_nan
+        )
+        return PKParameters(
+            compound=self.substance, **self._attach_units(values, units)
+        )
+
     def _vdss(self, dose, intercept=None):
         """Apparent volume of distribution.
 
@@ -610,7 +1039,9 @@ class TimecoursePK(TimecoursePKNoDosing):
         The term "apparent" underscores the fact that where the drug is distributed cannot be
         determined from Vd; only that it goes somewhere.
         """
-        return dose / self.Q_(np.exp(intercept.magnitude), intercept.units)
+        if isinstance(intercept, Quantity):
+            return dose / self.Q_(np.exp(intercept.magnitude), intercept.units)
+        return dose / np.exp(intercept)
 
     def _vd(self, aucinf, dose, kel):
         """Apparent volume of distribution.
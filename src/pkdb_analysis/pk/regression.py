@@ -0,0 +1,141 @@
+"""Best-fit selection of the terminal elimination phase (lambda_z).
+
+The terminal phase of a timecourse is the trailing window of data points with
+the best adjusted R² of the log-linear regression. All trailing windows with
+at least `min_points` data points are evaluated with running sums, so that
+the selection costs linear time per timecourse. Windows with an adjusted R²
+within `tolerance` of the best window are considered equally good and the
+window with the most data points is selected (as in standard NCA tools).
+
+The functions work on flat arrays of many timecourses (segments), a single
+timecourse is a single segment.
+"""
+from typing import Dict
+
+import numpy as np
+from scipy import stats
+
+
+LAMBDA_Z_METHODS = ["after_max", "best_fit"]
+
+
+def check_lambda_z(lambda_z: str) -> None:
+    """Checks the method for the selection of the terminal phase."""
+    if lambda_z not in LAMBDA_Z_METHODS:
+        raise ValueError(
+            f"'lambda_z' must be one of {LAMBDA_Z_METHODS}: '{lambda_z}'"
+        )
+
+
+def _reverse_cumsum(
+    values: np.ndarray, ids: np.ndarray, starts: np.ndarray, n_segments: int
+) -> np.ndarray:
+    """Sum of the values from every data point to the end of its segment.
+
+    The sum of the segment minus the exclusive cumulative sum within the
+    segment, computed on the flat arrays. The values are centered on the mean
+    of their segment before the cumulative sum, so that the rounding errors
+    do not grow with the preceding segments. Non-finite values are not summed.
+
+    :param starts: flat index of the first data point of every segment
+    """
+    values = np.where(np.isfinite(values), values, 0.0)
+    lengths = np.bincount(ids, minlength=n_segments)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        means = np.bincount(ids, weights=values, minlength=n_segments) / lengths
+    centered = values - means[ids]
+    exclusive = np.cumsum(centered) - centered
+    within = exclusive - exclusive[starts[ids]]
+    totals = np.bincount(ids, weights=centered, minlength=n_segments)
+    remaining = starts[ids] + lengths[ids] - np.arange(ids.size)
+    return totals[ids] - within + means[ids] * remaining
+
+
+def best_fit_regression(
+    x: np.ndarray,
+    y: np.ndarray,
+    ids: np.ndarray,
+    n_segments: int,
+    min_points: int = 3,
+    tolerance: float = 1e-4,
+) -> Dict[str, np.ndarray]:
+    """Log-linear regression on the best trailing window of every segment.
+
+    Only windows with a negative slope are considered.
+
+    :param x: times of the candidate data points (e.g. after the maximum)
+    :param y: log concentrations of the candidate data points, non-finite data
+        points are ignored
+    :param ids: segment id of the data points (sorted)
+    :param n_segments: number of segments
+    :param min_points: minimal number of data points of a window
+    :param tolerance: tolerance of the adjusted R² for preferring larger windows
+    :return: dictionary with slope, intercept, r_value, p_value, std_err,
+        adj_r_squared and n_points (0 without valid window) of the segments
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    ids = np.asarray(ids, dtype=int)
+    # non-finite data points (e.g. log of zero concentrations) are not used
+    finite = np.isfinite(x) & np.isfinite(y)
+    x, y, ids = x[finite], y[finite], ids[finite]
+    lengths = np.bincount(ids, minlength=n_segments)
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+
+    # center on the last data point of the segments for numerical stability
+    x_ref = np.zeros(n_segments)
+    y_ref = np.zeros(n_segments)
+    nonempty = lengths > 0
+    x_ref[nonempty] = x[ends[nonempty] - 1]
+    y_ref[nonempty] = y[ends[nonempty] - 1]
+    dx = x - x_ref[ids]
+    dy = y - y_ref[ids]
+
+    n = _reverse_cumsum(np.ones_like(x), ids, starts, n_segments)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        xmean = _reverse_cumsum(dx, ids, starts, n_segments) / n
+        ymean = _reverse_cumsum(dy, ids, starts, n_segments) / n
+        ssxm = _reverse_cumsum(dx * dx, ids, starts, n_segments) / n - xmean ** 2
+        ssym = _reverse_cumsum(dy * dy, ids, starts, n_segments) / n - ymean ** 2
+        ssxym = _reverse_cumsum(dx * dy, ids, starts, n_segments) / n - xmean * ymean
+        slope = ssxym / ssxm
+        r_squared = np.clip(ssxym ** 2 / (ssxm * ssym), 0.0, 1.0)
+        adj_r_squared = 1 - (1 - r_squared) * (n - 1) / (n - 2)
+
+    valid = (n >= min_points) & (ssxm > 0) & (ssym > 0) & (slope < 0)
+    adj = np.where(valid, adj_r_squared, -np.inf)
+    best = np.full(n_segments, -np.inf)
+    np.maximum.at(best, ids, adj)
+    # largest window (first start) within the tolerance of the best window
+    eligible = valid & (adj >= best[ids] - tolerance)
+    idx = np.flatnonzero(eligible)
+    segments, pos = np.unique(ids[idx], return_index=True)
+    start = np.full(n_segments, -1)
+    start[segments] = idx[pos]
+
+    results = {
+        key: np.full(n_segments, np.nan)
+        for key in ["slope", "intercept", "r_value", "p_value", "std_err"]
+    }
+    results["adj_r_squared"] = np.full(n_segments, np.nan)
+    results["n_points"] = np.zeros(n_segments, dtype=int)
+
+    k = start[segments]
+    n_k = n[k]
+    slope_k = slope[k]
+    r = -np.sqrt(r_squared[k])
+    df = n_k - 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = r * np.sqrt(df / ((1.0 - r + 1.0e-20) * (1.0 + r + 1.0e-20)))
+        std_err = np.sqrt((1 - r ** 2) * ssym[k] / ssxm[k] / df)
+    results["slope"][segments] = slope_k
+    results["intercept"][segments] = (
+        ymean[k] + y_ref[segments] - slope_k * (xmean[k] + x_ref[segments])
+    )
+    results["r_value"][segments] = r
+    results["p_value"][segments] = 2 * stats.t.sf(np.abs(t), df)
+    results["std_err"][segments] = std_err
+    results["adj_r_squared"][segments] = adj_r_squared[k]
+    results["n_points"][segments] = n_k.astype(int)
+    return results
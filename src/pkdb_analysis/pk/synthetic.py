@@ -0,0 +1,149 @@
+"""Synthetic concentration timecourses for benchmarks and tests.
+
+Timecourses after an oral dose are generated from one- and two-compartment
+models with random parameters, e.g.
+
+    timecourses, doses = synthetic_timecourses(1000, n_points=20, seed=42)
+    pk_df = batch_pk(timecourses, doses)
+
+The timecourses have the columns of the timecourses of PKData used by the
+pharmacokinetics (see batch_pk).
+"""
+from typing import List, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from pint import Quantity, UnitRegistry
+
+
+MODELS = ["one_compartment", "two_compartment"]
+
+
+def compartment_concentrations(
+    t: np.ndarray,
+    dose: np.ndarray,
+    ka: np.ndarray,
+    kel: np.ndarray,
+    vd: np.ndarray,
+    k12: np.ndarray = None,
+    k21: np.ndarray = None,
+) -> np.ndarray:
+    """Concentrations of compartment models after an oral dose at t=0.
+
+    Without k12 and k21 the one-compartment model
+
+        c(t) = dose * ka / (vd * (ka - kel)) * (exp(-kel t) - exp(-ka t))
+
+    otherwise the two-compartment model with the distribution rates k12 and
+    k21 (sum of the exponentials with the hybrid rates alpha and beta).
+    The parameters are arrays of the timecourses (broadcasted against t).
+
+    :param t: times with shape (timecourses, points)
+    :return: concentrations with the shape of t
+    """
+    t = np.asarray(t, dtype=float)
+    dose, ka, kel, vd = (
+        np.asarray(p, dtype=float)[:, None] for p in (dose, ka, kel, vd)
+    )
+    if k12 is None or k21 is None:
+        return dose * ka / (vd * (ka - kel)) * (np.exp(-kel * t) - np.exp(-ka * t))
+
+    k12, k21 = (np.asarray(p, dtype=float)[:, None] for p in (k12, k21))
+    s = kel + k12 + k21
+    root = np.sqrt(s ** 2 - 4 * kel * k21)
+    alpha, beta = (s + root) / 2, (s - root) / 2
+    a = ka * (k21 - alpha) / ((ka - alpha) * (beta - alpha))
+    b = ka * (k21 - beta) / ((ka - beta) * (alpha - beta))
+    return (dose / vd) * (
+        a * np.exp(-alpha * t) + b * np.exp(-beta * t) - (a + b) * np.exp(-ka * t)
+    )
+
+
+def synthetic_timecourses(
+    n_timecourses: int,
+    n_points: int = 20,
+    model: str = "one_compartment",
+    nan_fraction: float = 0.0,
+    noise: float = 0.0,
+    time_units: Union[str, Sequence[str]] = "hr",
+    units: Union[str, Sequence[str]] = "mg/l",
+    ureg: UnitRegistry = None,
+    seed: int = None,
+) -> Tuple[pd.DataFrame, List[Quantity]]:
+    """Random timecourses of one- or two-compartment models.
+
+    The rates (1/hr), volumes (l) and doses (mg) of the timecourses are
+    lognormally distributed around typical values of orally administered
+    drugs, the time points are equally spaced over about five terminal
+    half-lives with a time point at the dosing. Time units and concentration
+    units are cycled over the timecourses, i.e. the timecourses in different
+    units describe the same pharmacokinetics.
+
+    :param n_timecourses: number of timecourses
+    :param n_points: number of time points per timecourse
+    :param model: compartment model (see MODELS)
+    :param nan_fraction: fraction of concentrations after the dosing which
+        are NaN (e.g. below the limit of quantification)
+    :param noise: coefficient of variation of the multiplicative lognormal
+        measurement error
+    :param time_units: time unit(s) of the timecourses
+    :param units: concentration unit(s) of the timecourses
+    :param ureg: unit registry, registry of pkdb_analysis if None
+    :param seed: seed of the random number generator
+    :return: timecourses (time, time_unit, value, unit, substance) and doses
+    """
+    if ureg is None:
+        from pkdb_analysis.units import ureg
+    if model not in MODELS:
+        raise ValueError(f"'model' must be one of {MODELS}: '{model}'")
+    if n_points < 2:
+        raise ValueError(f"'n_points' must be >= 2: {n_points}")
+    if not 0 <= nan_fraction < 1:
+        raise ValueError(f"'nan_fraction' must be in [0, 1): {nan_fraction}")
+
+    rng = np.random.default_rng(seed)
+    size = n_timecourses
+
+    def lognormal(median: float, cv: float = 0.3) -> np.ndarray:
+        return median * rng.lognormal(0.0, np.sqrt(np.log1p(cv ** 2)), size)
+
+    dose = lognormal(100.0)
+    ka, kel, vd = lognormal(1.5), lognormal(0.15), lognormal(50.0)
+    k12 = k21 = None
+    kel_terminal = kel
+    if model == "two_compartment":
+        k12, k21 = lognormal(0.5), lognormal(0.2)
+        s = kel + k12 + k21
+        kel_terminal = (s - np.sqrt(s ** 2 - 4 * kel * k21)) / 2
+
+    t_end = 5 * np.log(2) / kel_terminal
+    t = np.linspace(0, 1, n_points)[None, :] * t_end[:, None]
+    c = compartment_concentrations(t, dose, ka, kel, vd, k12, k21)
+    if noise > 0:
+        sigma = np.sqrt(np.log1p(noise ** 2))
+        c = c * rng.lognormal(-(sigma ** 2) / 2, sigma, c.shape)
+    if nan_fraction > 0:
+        mask = rng.random(c.shape) < nan_fraction
+        mask[:, 0] = False
+        c[mask] = np.nan
+
+    time_units = [time_units] if isinstance(time_units, str) else list(time_units)
+    units = [units] if isinstance(units, str) else list(units)
+    time_unit = [time_units[k % len(time_units)] for k in range(size)]
+    unit = [units[k % len(units)] for k in range(size)]
+    t_factors = {u: ureg.Quantity(1, "hr").to(u).magnitude for u in time_units}
+    c_factors = {u: ureg.Quantity(1, "mg/l").to(u).magnitude for u in units}
+    t = t * np.array([t_factors[u] for u in time_unit])[:, None]
+    c = c * np.array([c_factors[u] for u in unit])[:, None]
+
+    timecourses = pd.DataFrame(
+        {
+            "substance": "synthetic",
+            "time": [tuple(row) for row in t],
+            "time_unit": time_unit,
+            "value": [tuple(row) for row in c],
+            "unit": unit,
+        }
+    )
+    doses = [ureg.Quantity(d, "mg") for d in dose]
+    return timecourses, doses
@@ -0,0 +1,270 @@
+"""Pharmacokinetics of the timecourses of PKData.
+
+Every timecourse is joined to its dosing intervention (dose and time of
+dosing) and the pharmacokinetic parameters are calculated with TimecoursePK.
+The timecourses are split in chunks which are processed in a process pool.
+Warnings are captured for every timecourse and returned with the results.
+Results of unchanged timecourses can be reused from a persistent cache.
+"""
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+from pint import Quantity
+
+from pkdb_analysis.pk.cache import PKCache, content_hash
+from pkdb_analysis.pk.multiple_dose import parse_dosing_schedule
+from pkdb_analysis.pk.pharmacokinetics import TimecoursePK
+from pkdb_analysis.units import ureg
+
+
+CONCENTRATION_FIELDS = ["value", "mean", "median"]
+
+
+def timecourse_dosings(
+    timecourses: pd.DataFrame, interventions: pd.DataFrame
+) -> pd.DataFrame:
+    """Dosing of every timecourse.
+
+    The dosing of a timecourse is the dosing intervention of the substance of
+    the timecourse or, if not available, the only dosing intervention of the
+    timecourse (e.g. for metabolites). Normed interventions are preferred.
+    The dosing schedule is parsed from the time pattern of the intervention
+    (see parse_dosing_schedule), the dosing time is NaN for multiple dosing.
+
+    :param timecourses: timecourses with a single intervention_pk per row
+    :param interventions: interventions
+    :return: DataFrame indexed like the timecourses with the columns
+        dosing_substance, dose, dose_unit, dosing_time, dosing_time_unit and
+        dosing_schedule (tuple of dosing times)
+    """
+    dosings = interventions[interventions["measurement_type"] == "dosing"]
+    dosings = dosings.sort_values("normed", ascending=False).drop_duplicates(
+        ["intervention_pk", "substance"]
+    )
+    schedules = [
+        _dosing_schedule(time, time_end)
+        for time, time_end in zip(dosings["time"], dosings["time_end"])
+    ]
+    dosings = pd.DataFrame(
+        {
+            "intervention_pk": dosings["intervention_pk"],
+            "dosing_substance": dosings["substance"],
+            "dose": dosings["value"],
+            "dose_unit": dosings["unit"],
+            "dosing_time": [
+                s[0] if isinstance(s, tuple) and len(s) == 1 else np.nan
+                for s in schedules
+            ],
+            "dosing_time_unit": dosings["time_unit"],
+            "dosing_schedule": pd.Series(
+                schedules, index=dosings.index, dtype=object
+            ),
+        }
+    )
+    keys = timecourses[["intervention_pk", "substance"]].reset_index()
+
+    # dosing of the timecourse substance
+    same_substance = keys.merge(
+        dosings,
+        how="inner",
+        left_on=["intervention_pk", "substance"],
+        right_on=["intervention_pk", "dosing_substance"],
+    )
+    # only dosing of the timecourse
+    counts = dosings["intervention_pk"].value_counts()
+    single = dosings[dosings["intervention_pk"].map(counts) == 1]
+    single_dosing = keys.merge(single, how="inner", on="intervention_pk")
+
+    result = pd.concat([same_substance, single_dosing]).drop_duplicates(
+        "index", keep="first"
+    )
+    columns = list(dosings.columns[1:])
+    return result.set_index("index")[columns].reindex(timecourses.index)
+
+
+def _dosing_schedule(time, time_end):
+    """Dosing times of the intervention, NaN if not available."""
+    try:
+        return tuple(parse_dosing_schedule(time, time_end))
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def timecourse_records(pkdata) -> List[Dict]:
+    """Records with the data for the calculation of every timecourse."""
+    tcs = pkdata.timecourses.df
+    dosings = timecourse_dosings(tcs, pkdata.interventions.df)
+
+    records = []
+    for (_, tc), (_, dosing) in zip(tcs.iterrows(), dosings.iterrows()):
+        messages = []
+        field = next(
+            (
+                f
+                for f in CONCENTRATION_FIELDS
+                if f in tc.index and isinstance(tc[f], (tuple, list, np.ndarray))
+            ),
+            None,
+        )
+        dose = dosing["dose"]
+        if not pd.isnull(dose) and pd.isnull(dosing["dose_unit"]):
+            dose = np.nan
+            messages.append(
+                f"No unit for the dose of intervention '{tc['intervention_pk']}', "
+                f"parameters depending on the dose are not calculated."
+            )
+        elif pd.isnull(dose):
+            messages.append(
+                f"No dosing for intervention '{tc['intervention_pk']}' and "
+                f"substance '{tc['substance']}', parameters depending on the "
+                f"dose are not calculated."
+            )
+        dosing_time = dosing["dosing_time"]
+        if pd.isnull(dosing_time):
+            dosing_time = None
+            if not pd.isnull(dose):
+                messages.append("No single dosing time, dosing at time 0 is used.")
+
+        records.append(
+            {
+                "subset_pk": tc["subset_pk"],
+                "substance": tc["substance"],
+                "time": tc["time"],
+                "time_unit": tc["time_unit"],
+                "concentration": tc[field] if field else None,
+                "concentration_field": field,
+                "unit": tc["unit"],
+                "dose": dose,
+                "dose_unit": dosing["dose_unit"],
+                "dosing_time": dosing_time,
+                "dosing_time_unit": dosing["dosing_time_unit"],
+                "warnings": messages,
+            }
+        )
+    return records
+
+
+def compute_pk_records(records: List[Dict], resolve_units: bool = True) -> List[Dict]:
+    """Calculates the pharmacokinetics of the records.
+
+    Warnings and errors of the calculation are captured for every record.
+    """
+    Q_ = ureg.Quantity
+    results = []
+    for record in records:
+        result = {
+            "subset_pk": record["subset_pk"],
+            "compound": record["substance"],
+            "concentration_field": record["concentration_field"],
+        }
+        messages = list(record["warnings"])
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            try:
+                if record["concentration"] is None:
+                    raise ValueError("No concentration values in timecourse.")
+                dose = None
+                if not pd.isnull(record["dose"]):
+                    dose = Q_(record["dose"], record["dose_unit"])
+                dosing_time = None
+                if record["dosing_time"] is not None:
+                    dosing_time = Q_(record["dosing_time"], record["dosing_time_unit"])
+                tcpk = TimecoursePK(
+                    time=Q_(np.array(record["time"], dtype=float), record["time_unit"]),
+                    concentration=Q_(
+                        np.array(record["concentration"], dtype=float), record["unit"]
+                    ),
+                    dose=dose,
+                    intervention_time=dosing_time,
+                    substance=record["substance"],
+                    ureg=ureg,
+                    resolve_units=resolve_units,
+                )
+                for key, value in tcpk.pk.to_dict().items():
+                    if isinstance(value, Quantity):
+                        result[f"{key}_unit"] = str(value.units)
+                        value = value.magnitude
+                    elif key.endswith("_unit"):
+                        value = str(value)
+                    result[key] = value
+            except Exception as err:
+                messages.append(f"{err.__class__.__name__}: {err}")
+        messages.extend(str(w.message) for w in caught)
+        result["warnings"] = messages
+        results.append(result)
+
+    return results
+
+
+def compute_pk(
+    pkdata,
+    n_jobs: int = 1,
+    chunk_size: int = None,
+    resolve_units: bool = True,
+    cache: PKCache = None,
+) -> pd.DataFrame:
+    """Pharmacokinetics of all timecourses of the PKData (see PKData.compute_pk)."""
+    records = timecourse_records(pkdata)
+    if n_jobs == -1:
+        n_jobs = os.cpu_count() or 1
+    if n_jobs < 1:
+        raise ValueError(f"'n_jobs' must be >= 1 or -1: {n_jobs}")
+
+    if cache is not None:
+        keys = [record_key(record, resolve_units) for record in records]
+        cached = cache.get_many(keys)
+        missing = [record for record, key in zip(records, keys) if key not in cached]
+        computed = _compute_pk_records(missing, n_jobs, chunk_size, resolve_units)
+        new = {}
+        for record, result in zip(missing, computed):
+            new[record_key(record, resolve_units)] = {
+                k: v for k, v in result.items() if k != "subset_pk"
+            }
+        cache.set_many(new)
+        cached.update(new)
+        results = [
+            {"subset_pk": record["subset_pk"], **cached[key]}
+            for record, key in zip(records, keys)
+        ]
+    else:
+        results = _compute_pk_records(records, n_jobs, chunk_size, resolve_units)
+
+    df = pd.DataFrame(results)
+    if df.empty:
+        df = pd.DataFrame(columns=["subset_pk", "compound", "warnings"])
+    # warnings last
+    columns = [c for c in df.columns if c != "warnings"] + ["warnings"]
+    return df[columns]
+
+
+def record_key(record: Dict, resolve_units: bool) -> str:
+    """Content hash of a record for the cache."""
+    record = {k: v for k, v in record.items() if k != "subset_pk"}
+    for key in ["time", "concentration"]:
+        if record[key] is not None:
+            record[key] = np.asarray(record[key], dtype=float)
+    return content_hash("compute_pk", record, resolve_units)
+
+
+def _compute_pk_records(
+    records: List[Dict], n_jobs: int, chunk_size: int, resolve_units: bool
+) -> List[Dict]:
+    """Calculates the records in chunks in a process pool for n_jobs > 1."""
+    if n_jobs == 1 or len(records) <= 1:
+        results = compute_pk_records(records, resolve_units=resolve_units)
+    else:
+        if chunk_size is None:
+            chunk_size = int(np.ceil(len(records) / (4 * n_jobs)))
+        chunks = [
+            records[k : k + chunk_size] for k in range(0, len(records), chunk_size)
+        ]
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            chunk_results = executor.map(
+                compute_pk_records, chunks, [resolve_units] * len(chunks)
+            )
+            results = [result for chunk in chunk_results for result in chunk]
+    return results
@@ -0,0 +1,213 @@
+"""Monte-Carlo uncertainty of pharmacokinetic parameters.
+
+Concentration profiles are sampled from the reported dispersion of the
+timecourses (sd, se or cv) and the pharmacokinetic parameters of all samples
+are calculated with the batch engine (see pk.batch). The samples of all
+timecourses are drawn at once as a (samples x data points) array, so that no
+Python loop over the samples is required. The distribution of the parameters
+over the samples is summarized by mean, sd, median and confidence interval.
+"""
+import warnings
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+from pint import Quantity, UnitRegistry
+from scipy import special
+
+from pkdb_analysis.pk.batch import (
+    DOSE_PARAMETERS,
+    PARAMETERS,
+    flat_pk_magnitudes,
+    per_data_point,
+    split_doses,
+    time_magnitudes,
+    unit_factors,
+)
+
+
+DISPERSIONS = ["sd", "se", "cv"]
+DISTRIBUTIONS = ["lognormal", "normal"]
+
+
+def sample_concentrations(
+    c: np.ndarray,
+    sd: np.ndarray,
+    n_samples: int,
+    rng: np.random.Generator,
+    distribution: str = "lognormal",
+) -> np.ndarray:
+    """Samples of the concentrations with the given standard deviations.
+
+    The lognormal distribution has the mean c and standard deviation sd, the
+    normal distribution is truncated to positive concentrations (sampled by the
+    inverse of the cumulative distribution), so that no sample is zero in the
+    log-linear regression of the terminal phase. Concentrations without (or
+    with NaN) standard deviation are not varied.
+
+    :param c: concentrations
+    :param sd: standard deviations of the concentrations
+    :param n_samples: number of samples
+    :param rng: random number generator
+    :param distribution: distribution of the concentrations (see DISTRIBUTIONS)
+    :return: samples with shape (n_samples, c.size)
+    """
+    if distribution not in DISTRIBUTIONS:
+        raise ValueError(
+            f"'distribution' must be one of {DISTRIBUTIONS}: '{distribution}'"
+        )
+    c = np.asarray(c, dtype=float)
+    sd = np.nan_to_num(np.asarray(sd, dtype=float), nan=0.0)
+    if distribution == "normal":
+        # Z > -c/sd, i.e. -Z is a standard normal truncated above at c/sd
+        u = 1.0 - rng.random((n_samples, c.size))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            z = -special.ndtri(u * special.ndtr(c / sd))
+            samples = c + sd * z
+        return np.where((sd > 0) & np.isfinite(samples), samples, c)
+
+    z = rng.standard_normal((n_samples, c.size))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sigma2 = np.log1p((sd / c) ** 2)
+        mu = np.log(c) - sigma2 / 2
+        samples = np.exp(mu + np.sqrt(sigma2) * z)
+    return np.where((c > 0) & (sd > 0), samples, c)
+
+
+def monte_carlo_pk(
+    timecourses: pd.DataFrame,
+    doses: Iterable[Quantity] = None,
+    ureg: UnitRegistry = None,
+    intervention_times: Iterable[Quantity] = None,
+    concentration: str = "mean",
+    dispersion: str = "sd",
+    n_samples: int = 1000,
+    ci: float = 0.95,
+    distribution: str = "lognormal",
+    seed: int = None,
+    min_treshold: float = 1e6,
+    lambda_z: str = "after_max",
+    auc_method: str = "linear",
+) -> pd.DataFrame:
+    """Monte-Carlo uncertainty of the pharmacokinetic parameters.
+
+    For every timecourse `n_samples` concentration profiles are sampled from
+    the concentrations and their dispersion, the parameters are calculated
+    for all profiles (see batch_pk). The dispersion column must contain a
+    value per data point like the concentrations, the coefficient of
+    variation is relative to the concentration (sd = cv * concentration).
+    Scalar values (e.g. NaN in the timecourses of PKData without reported
+    dispersion or mean) are used for all data points, i.e. such timecourses
+    are not varied or have NaN parameters.
+
+    :param timecourses: timecourses, one row per timecourse (see batch_pk)
+    :param doses: dose of every timecourse, parameters without dose if None
+    :param ureg: unit registry, registry of pkdb_analysis if None
+    :param intervention_times: intervention time of every timecourse, 0 if None
+    :param concentration: column of the concentrations
+    :param dispersion: column of the dispersion (see DISPERSIONS)
+    :param n_samples: number of samples per timecourse
+    :param ci: level of the confidence interval
+    :param distribution: distribution of the concentrations (see DISTRIBUTIONS)
+    :param seed: seed of the random number generator
+    :param min_treshold: concentrations smaller than cmax/min_treshold are
+        set to NaN
+    :param lambda_z: selection of the terminal phase, "after_max" or "best_fit"
+    :param auc_method: integration rule, "linear" or "linear_up_log_down"
+    :return: DataFrame indexed by timecourse and parameter with the columns
+        mean, sd, median, lower, upper (confidence interval), valid (fraction
+        of samples with a finite parameter) and unit
+    """
+    if ureg is None:
+        from pkdb_analysis.units import ureg
+    if dispersion not in DISPERSIONS:
+        raise ValueError(f"'dispersion' must be one of {DISPERSIONS}: '{dispersion}'")
+    if not 0 < ci < 1:
+        raise ValueError(f"'ci' must be in (0, 1): {ci}")
+
+    time_units = timecourses["time_unit"].tolist()
+    units = timecourses["unit"].tolist()
+    n = len(timecourses)
+    times = [np.asarray(t, dtype=float) for t in timecourses["time"]]
+    concentrations = [
+        per_data_point(c, t.size) for c, t in zip(timecourses[concentration], times)
+    ]
+    spreads = [
+        per_data_point(s, t.size) for s, t in zip(timecourses[dispersion], times)
+    ]
+    lengths = np.array([t.size for t in times], dtype=int)
+    for values in [concentrations, spreads]:
+        if not np.array_equal(lengths, [v.size for v in values]):
+            raise ValueError(
+                f"'time', '{concentration}' and '{dispersion}' must have the "
+                f"same sizes."
+            )
+
+    t = np.concatenate(times) if n else np.array([])
+    c = np.concatenate(concentrations) if n else np.array([])
+    sd = np.concatenate(spreads) if n else np.array([])
+    if dispersion == "cv":
+        sd = sd * c
+
+    # samples x data points of all timecourses, sample k of timecourse j is
+    # segment k * n + j of the flat arrays
+    rng = np.random.default_rng(seed)
+    samples = sample_concentrations(c, sd, n_samples, rng, distribution)
+
+    dose_magnitudes, dose_units = split_doses(doses, n, ureg)
+    sample_doses = None
+    if dose_magnitudes is not None:
+        sample_doses = np.tile(dose_magnitudes, n_samples)
+    t_int = None
+    if intervention_times is not None:
+        t_int = np.tile(time_magnitudes(intervention_times, time_units), n_samples)
+    df = flat_pk_magnitudes(
+        t=np.tile(t, n_samples),
+        c=samples.ravel(),
+        lengths=np.tile(lengths, n_samples),
+        doses=sample_doses,
+        intervention_times=t_int,
+        min_treshold=min_treshold,
+        lambda_z=lambda_z,
+        auc_method=auc_method,
+    )
+
+    parameters = PARAMETERS + (DOSE_PARAMETERS if doses is not None else [])
+    dose_nan = (
+        np.isnan(dose_magnitudes) if doses is not None else np.zeros(n, dtype=bool)
+    )
+    factors, unit_strs = unit_factors(
+        ureg, parameters, time_units, units, dose_units, dose_nan
+    )
+
+    # parameters x samples x timecourses
+    values = np.stack(
+        [
+            df[parameter].values.reshape(n_samples, n) * factors[:, j]
+            for j, parameter in enumerate(parameters)
+        ]
+    )
+    finite = np.isfinite(values)
+    values = np.where(finite, values, np.nan)
+    alpha = (1 - ci) / 2
+    with warnings.catch_warnings():
+        # parameters without finite samples are NaN
+        warnings.simplefilter("ignore", RuntimeWarning)
+        lower, median, upper = np.nanquantile(
+            values, [alpha, 0.5, 1 - alpha], axis=1
+        )
+        stats = {
+            "mean": np.nanmean(values, axis=1),
+            "sd": np.nanstd(values, axis=1, ddof=1),
+            "median": median,
+            "lower": lower,
+            "upper": upper,
+            "valid": finite.mean(axis=1),
+            "unit": unit_strs.T,
+        }
+
+    index = pd.MultiIndex.from_product(
+        [timecourses.index, parameters],
+        names=[timecourses.index.name or "timecourse", "parameter"],
+    )
+    return pd.DataFrame({key: v.T.ravel() for key, v in stats.items()}, index=index)
@@ -1,8 +1,10 @@
 """Module for static plot creation."""
 import logging
+import pickle
 import warnings
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Callable, Dict, List, Set, Tuple
+from typing import Callable, Dict, List, Optional, Set, Tuple
 
 import matplotlib.font_manager as font_manager
 import matplotlib.pyplot as plt
@@ -20,12 +22,18 @@ from sklearn.gaussian_process.kernels import ConstantKernel as C
 from sklearn.gaussian_process.kernels import Matern, WhiteKernel
 from sklearn.preprocessing import StandardScaler
 
+from pkdb_analysis.columns import resolve_column_function
 from pkdb_analysis.core import Sid
 from pkdb_analysis.data import PKData
 from pkdb_analysis.deprecated.analysis import get_one, mscatter
 from pkdb_analysis.filter import f_dosing_in, f_mt_in_substance_in
 from pkdb_analysis.kernels import HeteroscedasticKernel
-from pkdb_analysis.meta_analysis import MetaAnalysis
+from pkdb_analysis.meta_analysis import MetaAnalysis, results_pkdata
+from pkdb_analysis.plotting.results_cache import (
+    REFERENCE_COLUMNS,
+    ResultsCache,
+    results_key,
+)
 from pkdb_analysis.units import ureg
 from pkdb_analysis.utils import create_parent
 
@@ -114,36 +122,111 @@ class PlotContentDefinitionMulti(PlotContentDefinition):
         return "_".join(self.measurement_types)
 
 
+def plot_content_results(
+    plot_content: PlotContentDefinition,
+    pkd: PKData,
+    intervention_substances: Set[str],
+    additional_information: Dict[str, Callable],
+    url: str,
+    replacements: Dict[str, Dict[str, str]],
+) -> Optional[pd.DataFrame]:
+    """Creates the result DataFrame of a plot content (None without studies)."""
+    if pkd.studies.df.empty:
+        return None
+    meta_analysis = MetaAnalysis(pkd, intervention_substances, url)
+    meta_analysis.create_results()
+
+    meta_analysis.add_columns(additional_information)
+    meta_analysis.infer_from_body_weight(
+        by_intervention=plot_content.infer_by_intervention,
+        by_output=plot_content.infer_by_output,
+    )
+    meta_analysis.add_extra_info(replacements)
+    return meta_analysis.results
+
+
+def _is_picklable(obj) -> bool:
+    try:
+        pickle.dumps(obj)
+    except (pickle.PicklingError, AttributeError, TypeError):
+        return False
+    return True
+
+
 def results(
     data_dict: Dict[PlotContentDefinition, PKData],
     intervention_substances: Set[str],
     additional_information: Dict[str, Callable],
     url: str,
     replacements: Dict[str, Dict[str, str]],
+    cache: ResultsCache = None,
+    n_jobs: int = 1,
 ) -> Dict[PlotContentDefinition, pd.DataFrame]:
     """Create result DataFrames.
 
     Create single dataframes from a pkdata instances and infers additional results
-    from body weight.
+    from body weight. With a cache the results are only created if they are not
+    stored for the inputs (see plotting.results_cache). With n_jobs > 1 the results
+    of the plot contents are created in a process pool, the workers only receive
+    the tables of the results (RESULTS_KEYS). The results are in the order of
+    data_dict. The additional_information are column functions, names of
+    registered column functions or row-wise functions (see columns).
     """
+    additional_information = {
+        key: resolve_column_function(f) for key, f in additional_information.items()
+    }
+    keys = {}
     results_dict = {}
     for plot_content, pkd in data_dict.items():
-        meta_analysis = MetaAnalysis(pkd, intervention_substances, url)
-        if not pkd.studies.df.empty:
-            meta_analysis.create_results()
-
-            for key, additional_function in additional_information.items():
-                meta_analysis.results[key] = meta_analysis.results.apply(
-                    additional_function, axis=1
-                )
-            meta_analysis.infer_from_body_weight(
-                by_intervention=plot_content.infer_by_intervention,
-                by_output=plot_content.infer_by_output,
+        if cache is not None:
+            keys[plot_content] = results_key(
+                pkd,
+                plot_content,
+                intervention_substances,
+                additional_information,
+                url,
+                replacements,
+                version=cache.version,
             )
-            meta_analysis.add_extra_info(replacements)
-            results_dict[plot_content] = meta_analysis.results
+            results_dict[plot_content] = cache.get(keys[plot_content])
 
-    return results_dict
+    missing = [
+        plot_content
+        for plot_content in data_dict
+        if results_dict.get(plot_content) is None
+    ]
+    args = (intervention_substances, additional_information, url, replacements)
+    if n_jobs > 1 and len(missing) > 1 and not _is_picklable(args):
+        warnings.warn(
+            "'additional_information' or 'replacements' can not be sent to worker "
+            "processes (e.g. lambda functions), results are created sequentially."
+        )
+        n_jobs = 1
+    if n_jobs > 1 and len(missing) > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            created = executor.map(
+                plot_content_results,
+                missing,
+                [results_pkdata(data_dict[plot_content]) for plot_content in missing],
+                *[[arg] * len(missing) for arg in args],
+            )
+            created = list(created)
+    else:
+        created = [
+            plot_content_results(plot_content, data_dict[plot_content], *args)
+            for plot_content in missing
+        ]
+
+    for plot_content, df in zip(missing, created):
+        results_dict[plot_content] = df
+        if cache is not None and df is not None:
+            cache.set(keys[plot_content], df)
+
+    return {
+        plot_content: results_dict[plot_content]
+        for plot_content in data_dict
+        if results_dict.get(plot_content) is not None
+    }
 
 
 def nothing(x):
@@ -875,8 +958,14 @@ def plot_factory(
     hexbins: bool = False,
     standardize: bool = False,
     replacements: Dict[str, Dict[str, str]] = {},
+    cache_path: Path = None,
+    n_jobs: int = 1,
 ) -> None:
-    """Factory function to create multiple plots defined by each entry of the plotting_categories."""
+    """Factory function to create multiple plots defined by each entry of the plotting_categories.
+
+    With a cache_path the results are stored in and loaded from a ResultsCache,
+    with n_jobs > 1 the results are created in a process pool (see results).
+    """
     intervention_substances_str = {
         substance.sid for substance in intervention_substances
     }
@@ -896,12 +985,12 @@ def plot_factory(
         additional_information=additional_information,
         url=None,
         replacements=replacements,
+        cache=ResultsCache(cache_path) if cache_path else None,
+        n_jobs=n_jobs,
     )
     if table_path:
         for plot_content, df_results in results_dict.items():
-            columns = set(df_results.columns)
-            columns.remove("extra")
-            columns.remove("intervention_extra")
+            columns = set(df_results.columns).difference(REFERENCE_COLUMNS)
 
             df_results[columns].to_csv(table_path / f"{plot_content.sid}.tsv", sep="\t")
 
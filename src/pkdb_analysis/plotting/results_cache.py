@@ -0,0 +1,221 @@
+"""Persisted cache of the results of the plot factories.
+
+The final results of every PlotContentDefinition (see plotting.factory.results)
+are stored in an HDF5 file under the hash of all inputs: the fingerprint of
+the PKData, the plot content, the intervention substances, the additional
+information functions, url, replacements and the code version. Results are
+only recalculated if one of the inputs changed, e.g.
+
+    plot_factory(pkdata, ..., cache_path="results_cache.h5")
+
+The columns referencing the tables of the PKData (REFERENCE_COLUMNS) are not
+stored, i.e. cached results do not contain these columns.
+"""
+import functools
+import logging
+import warnings
+from pathlib import Path
+from types import CodeType, ModuleType
+from typing import Callable, Dict, List, Optional, Set, Union
+
+import pandas as pd
+from tables import NaturalNameWarning
+
+from pkdb_analysis import __version__
+from pkdb_analysis.columns import resolve_column_function
+from pkdb_analysis.data import PKData
+from pkdb_analysis.meta_analysis import study_fingerprints
+from pkdb_analysis.pk.cache import content_hash
+from pkdb_analysis.utils import create_parent
+
+
+logger = logging.getLogger(__name__)
+
+# increase on every change of the results of plotting.factory.results
+RESULTS_VERSION = "1"
+REFERENCE_COLUMNS = ["extra", "intervention_extra"]
+
+
+def pkdata_fingerprint(pkdata: PKData) -> str:
+    """Fingerprint of the content of all tables (see study_fingerprints)."""
+    fingerprints = study_fingerprints(pkdata)
+    return content_hash(list(fingerprints.index), list(fingerprints.values))
+
+
+def _code_content(code: CodeType) -> list:
+    """Content of a code object including nested code objects (e.g. lambdas)."""
+    return [
+        code.co_code.hex(),
+        list(code.co_names),
+        [
+            _code_content(const) if isinstance(const, CodeType) else repr(const)
+            for const in code.co_consts
+        ],
+    ]
+
+
+def _global_names(code: CodeType) -> Set[str]:
+    """Names referenced by a code object and its nested code objects."""
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, CodeType):
+            names |= _global_names(const)
+    return names
+
+
+def _value_fingerprint(value, seen: Set[int]):
+    """Fingerprint of a value referenced by a function."""
+    if isinstance(value, ModuleType):
+        return f"module:{value.__name__}"
+    if callable(value) and not isinstance(value, type):
+        return _callable_fingerprint(value, seen)
+    if isinstance(value, type):
+        return f"{value.__module__}.{value.__qualname__}"
+    return content_hash(value)
+
+
+def _callable_fingerprint(f: Callable, seen: Set[int]) -> str:
+    if isinstance(f, functools.partial):
+        return content_hash(
+            "partial",
+            _callable_fingerprint(f.func, seen),
+            [_value_fingerprint(arg, seen) for arg in f.args],
+            {key: _value_fingerprint(v, seen) for key, v in f.keywords.items()},
+        )
+    name = f"{getattr(f, '__module__', '')}.{getattr(f, '__qualname__', repr(f))}"
+    code = getattr(f, "__code__", None)
+    if code is None:
+        return name
+    if id(f) in seen:
+        # recursive reference
+        return name
+    seen = seen | {id(f)}
+
+    f_globals = getattr(f, "__globals__", {})
+    referenced = {
+        key: _value_fingerprint(f_globals[key], seen)
+        for key in sorted(_global_names(code))
+        if key in f_globals
+    }
+    closure = [
+        _value_fingerprint(cell.cell_contents, seen)
+        for cell in (getattr(f, "__closure__", None) or [])
+    ]
+    defaults = [
+        _value_fingerprint(value, seen)
+        for value in (getattr(f, "__defaults__", None) or ())
+    ]
+    kwdefaults = {
+        key: _value_fingerprint(value, seen)
+        for key, value in (getattr(f, "__kwdefaults__", None) or {}).items()
+    }
+    content = content_hash(
+        _code_content(code), referenced, closure, defaults, kwdefaults
+    )
+    return f"{name}:{content}"
+
+
+def callable_fingerprint(f: Callable) -> str:
+    """Name and hash of the code of a function.
+
+    The hash includes the code, the referenced globals (functions recursively,
+    modules by name, other values by content), the closure values, defaults
+    and the arguments of functools.partial. State which is not referenced in
+    this way (e.g. data files or attributes of modules) is not included, change
+    the `version` of the ResultsCache in this case.
+    """
+    return _callable_fingerprint(f, set())
+
+
+def results_key(
+    pkdata: PKData,
+    plot_content,
+    intervention_substances: Set[str],
+    additional_information: Dict[str, Callable],
+    url: str,
+    replacements: Dict[str, Dict[str, str]],
+    version: str = None,
+) -> str:
+    """Key of the results of a PlotContentDefinition in the ResultsCache.
+
+    :param version: user defined version of the results (see ResultsCache)
+    """
+    return content_hash(
+        "results",
+        RESULTS_VERSION,
+        __version__,
+        version,
+        pkdata_fingerprint(pkdata),
+        {
+            "class": type(plot_content).__name__,
+            "key": plot_content.key,
+            "measurement_types": plot_content.measurement_types,
+            "units_rm": plot_content.units_rm,
+            "y_units": plot_content.y_units,
+            "infer_by_intervention": plot_content.infer_by_intervention,
+            "infer_by_output": plot_content.infer_by_output,
+        },
+        sorted(intervention_substances or []),
+        {
+            key: callable_fingerprint(resolve_column_function(f))
+            for key, f in additional_information.items()
+        },
+        url,
+        replacements,
+    )
+
+
+class ResultsCache(object):
+    """Results of the plot factories in an HDF5 file.
+
+    The `version` is part of the keys of the results, changing it invalidates
+    the stored results, e.g. after changes the fingerprints can not detect (see
+    callable_fingerprint).
+    """
+
+    def __init__(self, path: Union[str, Path], version: str = None):
+        self.path = Path(path)
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _node(key: str) -> str:
+        return f"results_{key}"
+
+    def keys(self) -> List[str]:
+        """Keys of the stored results."""
+        if not self.path.exists():
+            return []
+        with pd.HDFStore(self.path, mode="r") as store:
+            return [node.split("results_", 1)[1] for node in store.keys()]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.keys()
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        """Stored results of the key, None if not stored."""
+        if self.path.exists():
+            with pd.HDFStore(self.path, mode="r") as store:
+                if self._node(key) in store:
+                    self.hits += 1
+                    return store[self._node(key)]
+        self.misses += 1
+        return None
+
+    def set(self, key: str, results: pd.DataFrame) -> None:
+        """Stores the results without the REFERENCE_COLUMNS."""
+        results = results.drop(columns=REFERENCE_COLUMNS, errors="ignore")
+        create_parent(self.path)
+        with warnings.catch_warnings():
+            # object columns are pickled
+            warnings.simplefilter("ignore", pd.errors.PerformanceWarning)
+            warnings.simplefilter("ignore", NaturalNameWarning)
+            with pd.HDFStore(self.path, mode="a") as store:
+                store.put(self._node(key), pd.DataFrame(results), format="fixed")
+        logger.info(f"results '{key}' stored in ResultsCache '{self.path}'.")
+
+    def clear(self) -> None:
+        """Removes all results."""
+        if self.path.exists():
+            self.path.unlink()
@@ -1,11 +1,16 @@
 """
 Querying PK-DB
 """
+import asyncio
 import logging
+import tempfile
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from copy import deepcopy
+from functools import partial
 from io import BytesIO
 from pathlib import Path
-from typing import List, Set
+from typing import Coroutine, Dict, Iterable, List, Set
 from urllib import parse as urlparse
 
 import pandas as pd
@@ -34,8 +39,25 @@ class PKFilter(object):
         "download",
     ]
 
-    def __init__(self, concise: bool = False, download: bool = True):
-        """Create new Filter instance."""
+    def __init__(
+        self,
+        concise: bool = False,
+        download: bool = True,
+        tables: Iterable[str] = None,
+        columns: Dict[str, Iterable[str]] = None,
+    ):
+        """Create new Filter instance.
+
+        The projection on `tables` and `columns` is sent to PK-DB and applied
+        when parsing the download, so excluded tables are neither downloaded
+        nor parsed (see PKData.from_archive).
+
+        :param concise: concise data
+        :param download: download the data as zip archive
+        :param tables: keys of the tables to include, all tables if None
+        :param columns: columns to include per table key (in addition to the
+            key columns), all columns of tables not in columns
+        """
         self.studies = dict()
         self.groups = dict()
         self.individuals = dict()
@@ -47,6 +69,16 @@ class PKFilter(object):
         self.concise = f"{concise}".lower()
         self.download = f"{download}".lower()
 
+        # projection
+        self.tables = None if tables is None else PKData.validate_keys(tables)
+        columns = columns or {}
+        self.columns = {key: list(columns[key]) for key in PKData.validate_keys(columns)}
+
+    @property
+    def projection(self) -> dict:
+        """Keyword arguments of the projection for PKData.from_archive."""
+        return {"tables": self.tables, "columns": self.columns}
+
     @property
     def url_params(self) -> str:
         """Parse filters to url"""
@@ -54,9 +86,14 @@ class PKFilter(object):
 
     def _flat_params(self) -> dict:
         """Helper function to parse filters to url"""
-        return {
+        params = {
             "__".join(keys): value for keys, value in recursive_iter(self.to_dict())
         }
+        if self.tables is not None:
+            params["tables"] = "__".join(self.tables)
+        for key, columns in self.columns.items():
+            params[f"columns__{key}"] = "__".join(columns)
+        return params
 
     def to_dict(self) -> dict:
         """Reformat filter instance to a dictonary."""
@@ -65,6 +102,41 @@ class PKFilter(object):
             for filter_key in PKFilter.KEYS
         }
 
+    def shards(self, shard_size: int) -> List["PKFilter"]:
+        """Splits the filter in multiple filters on the studies.
+
+        Every `__in` filter on the studies (e.g. `name__in`) with more than
+        `shard_size` values is split in chunks of at most `shard_size` values.
+        The shards select disjoint sets of studies, the union of the shards
+        selects the same data as the filter.
+
+        :param shard_size: maximal number of values per `__in` filter
+        :return: list of filters, `[self]` if no splitting is necessary
+        """
+        if shard_size < 1:
+            raise ValueError(f"'shard_size' must be >= 1: {shard_size}")
+
+        shards = [self]
+        for key, value in self.studies.items():
+            if not key.endswith("__in"):
+                continue
+            values = value.split("__")
+            if len(values) <= shard_size:
+                continue
+
+            chunks = [
+                values[k : k + shard_size] for k in range(0, len(values), shard_size)
+            ]
+            new_shards = []
+            for pkfilter in shards:
+                for chunk in chunks:
+                    shard = deepcopy(pkfilter)
+                    shard.studies[key] = "__".join(chunk)
+                    new_shards.append(shard)
+            shards = new_shards
+
+        return shards
+
 
 def query_pkdb_data(
     h5_path: Path = None,
@@ -73,11 +145,17 @@ def query_pkdb_data(
     creator: str = None,
     curators: List[str] = None,
     study_names: List = None,
+    shard_size: int = 100,
+    max_concurrency: int = 8,
 ) -> PKData:
     """Query the PK-DB database.
 
     If no usernames or study_names are provided the complete database will be
     queried.
+
+    Long lists of study_names are split in shards of at most `shard_size`
+    names which are queried in parallel (at most `max_concurrency` at the
+    same time) and merged in a single PKData.
     """
     # update filters
     if pkfilter is None:
@@ -91,7 +169,12 @@ def query_pkdb_data(
         pkfilter.studies["name__in"] = "__".join(study_names)
 
     # query data
-    pkdata = PKDB.query(pkfilter)
+    if len(pkfilter.shards(shard_size)) > 1:
+        pkdata = PKDB.query_sharded(
+            pkfilter, shard_size=shard_size, max_concurrency=max_concurrency
+        )
+    else:
+        pkdata = PKDB.query(pkfilter)
 
     if h5_path is not None:
         logger.info(f"Storing pkdata to HDF5: {h5_path}")
@@ -104,12 +187,42 @@ def query_pkdb_data(
     return pkdata
 
 
+def run_coroutine(coroutine: Coroutine):
+    """Runs the coroutine to completion and returns its result.
+
+    Uses asyncio.run, within a running event loop (e.g. jupyter notebooks) the
+    coroutine runs in a new event loop of a worker thread.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
+
+
 class PKDB(object):
     """Interface to PK-DB.
 
     Helpers for querying PKData from PK-DB.
+
+    Idempotent GET requests are retried up to `RETRIES` times on connection
+    errors, timeouts and on the status codes in `RETRY_STATUS`. The waiting time
+    before the n-th retry is `BACKOFF_FACTOR * 2 ** (n - 1)` seconds. Requests
+    time out after `TIMEOUT` seconds (connect, read), i.e. if no connection is
+    established or no data is received for that time.
     """
 
+    TIMEOUT = (10.0, 300.0)
+    RETRIES = 5
+    BACKOFF_FACTOR = 0.5
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+    RETRY_EXCEPTIONS = (
+        requests.exceptions.ConnectionError,
+        requests.exceptions.ChunkedEncodingError,
+        requests.exceptions.Timeout,
+    )
+
     @classmethod
     def query(cls, pkfilter: PKFilter = None) -> PKData:
         """Creates a PKData representation and gets the data for the provided filters.
@@ -118,17 +231,244 @@ class PKDB(object):
         """
         if pkfilter is None:
             pkfilter = PKFilter()
-
-        url = API_URL + "/filter/" + pkfilter.url_params
+        url = cls._filter_url(pkfilter)
         headers = cls.get_authentication_headers(BASE_URL, USER, PASSWORD)
         logger.warning(url)
+        return PKData.from_download(
+            cls._download(url, headers), **pkfilter.projection
+        )
+
+    @classmethod
+    async def aquery(
+        cls,
+        pkfilter: PKFilter = None,
+        headers: dict = None,
+        executor: Executor = None,
+        raw: bool = False,
+    ) -> PKData:
+        """Asynchronous version of PKDB.query.
+
+        The blocking download runs in the default thread pool of the event loop,
+        decompression and parsing of the archive run in the given executor
+        (default thread pool if None), so the event loop is never blocked.
+
+        :param pkfilter: filter for the query, complete data if None
+        :param headers: authentication headers, retrieved if None
+        :param executor: executor for parsing the downloaded archive
+        :param raw: return the archive as downloaded, i.e., without the update
+            of the intervention pks (see PKData.from_download)
+        """
+        if pkfilter is None:
+            pkfilter = PKFilter()
+        loop = asyncio.get_running_loop()
+        url = cls._filter_url(pkfilter)
+        if headers is None:
+            headers = await loop.run_in_executor(
+                None, cls.get_authentication_headers, BASE_URL, USER, PASSWORD
+            )
+        logger.warning(url)
+        bytes_buffer = await loop.run_in_executor(None, cls._download, url, headers)
+        parse = partial(
+            PKData.from_archive if raw else PKData.from_download,
+            **pkfilter.projection,
+        )
+        return await loop.run_in_executor(executor, parse, bytes_buffer)
+
+    @classmethod
+    async def aquery_many(
+        cls,
+        pkfilters: Iterable[PKFilter],
+        max_concurrency: int = 8,
+        processes: bool = False,
+        raw: bool = False,
+    ) -> List[PKData]:
+        """Queries multiple filters concurrently.
+
+        At most `max_concurrency` downloads are running at the same time.
+        The authentication headers are only retrieved once for all queries.
+
+        :param pkfilters: filters to query
+        :param max_concurrency: maximal number of concurrent queries
+        :param processes: parse the archives in a process pool instead of threads
+        :param raw: return the archives as downloaded (see PKDB.aquery)
+        :return: list of PKData in the order of the pkfilters
+        """
+        if max_concurrency < 1:
+            raise ValueError(f"'max_concurrency' must be >= 1: {max_concurrency}")
+
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(max_concurrency)
+        headers = await loop.run_in_executor(
+            None, cls.get_authentication_headers, BASE_URL, USER, PASSWORD
+        )
+        pool_class = ProcessPoolExecutor if processes else ThreadPoolExecutor
+
+        with pool_class(max_workers=max_concurrency) as executor:
+
+            async def _query(pkfilter: PKFilter) -> PKData:
+                async with semaphore:
+                    return await cls.aquery(
+                        pkfilter, headers=headers, executor=executor, raw=raw
+                    )
 
-        with requests.get(url, headers=headers, stream=True) as r:
-            r.raise_for_status()
-            bytes_buffer = BytesIO()
-            for chunk in r.iter_content(chunk_size=8192):
-                bytes_buffer.write(chunk)
-            return PKData.from_download(bytes_buffer)
+            return list(await asyncio.gather(*[_query(f) for f in pkfilters]))
+
+    @classmethod
+    def query_many(
+        cls,
+        pkfilters: Iterable[PKFilter],
+        max_concurrency: int = 8,
+        processes: bool = False,
+    ) -> List[PKData]:
+        """Queries multiple filters concurrently.
+
+        Blocking wrapper around PKDB.aquery_many. Within a running event loop
+        (e.g. jupyter notebooks) the queries run in the event loop of a worker
+        thread (see run_coroutine), `await PKDB.aquery_many(...)` avoids the
+        thread.
+        """
+        return run_coroutine(
+            cls.aquery_many(
+                pkfilters, max_concurrency=max_concurrency, processes=processes
+            )
+        )
+
+    @classmethod
+    def query_sharded(
+        cls,
+        pkfilter: PKFilter = None,
+        shard_size: int = 100,
+        max_concurrency: int = 8,
+        processes: bool = False,
+    ) -> PKData:
+        """Queries a large filter in shards.
+
+        The filter is split in shards (see PKFilter.shards) which are queried
+        concurrently. The downloaded archives are merged by primary key before
+        the intervention pks are updated, so that the returned PKData is
+        identical to a single query of the complete filter.
+        """
+        if pkfilter is None:
+            pkfilter = PKFilter()
+        pkfilters = pkfilter.shards(shard_size)
+        logger.info(f"Querying {len(pkfilters)} shards")
+        pkdatas = run_coroutine(
+            cls.aquery_many(
+                pkfilters,
+                max_concurrency=max_concurrency,
+                processes=processes,
+                raw=True,
+            )
+        )
+        return PKData._intervention_pk_update(PKData.concat(pkdatas))
+
+    @staticmethod
+    def _filter_url(pkfilter: PKFilter = None) -> str:
+        """Url of the filter endpoint for given filter."""
+        if pkfilter is None:
+            pkfilter = PKFilter()
+        return API_URL + "/filter/" + pkfilter.url_params
+
+    @classmethod
+    def _backoff(cls, attempt: int, reason) -> None:
+        """Waits before the next retry or raises if all retries failed."""
+        if attempt > cls.RETRIES:
+            if isinstance(reason, Exception):
+                raise reason
+            reason.raise_for_status()
+            raise requests.exceptions.RetryError(
+                f"Giving up after {cls.RETRIES} retries: {reason}", response=reason
+            )
+        delay = cls.BACKOFF_FACTOR * 2 ** (attempt - 1)
+        logger.warning(f"Retry {attempt}/{cls.RETRIES} in {delay:.2f} s: {reason}")
+        time.sleep(delay)
+
+    @classmethod
+    def _get(cls, url: str, headers: dict) -> requests.Response:
+        """GET request with retries and exponential backoff."""
+        attempt = 0
+        while True:
+            try:
+                response = requests.get(url, headers=headers, timeout=cls.TIMEOUT)
+            except cls.RETRY_EXCEPTIONS as err:
+                attempt += 1
+                cls._backoff(attempt, err)
+                continue
+            if response.status_code in cls.RETRY_STATUS:
+                attempt += 1
+                cls._backoff(attempt, response)
+                continue
+            return response
+
+    @staticmethod
+    def _validator(response: requests.Response) -> str:
+        """Validator of the content for If-Range (strong ETag or Last-Modified)."""
+        etag = response.headers.get("ETag")
+        if etag and not etag.startswith("W/"):
+            return etag
+        return response.headers.get("Last-Modified")
+
+    @staticmethod
+    def _range_start(response: requests.Response) -> int:
+        """First byte of a partial response (206), None if not given."""
+        content_range = response.headers.get("Content-Range", "")
+        try:
+            return int(content_range.split()[1].split("-")[0])
+        except (IndexError, ValueError):
+            return None
+
+    @classmethod
+    def _download(cls, url: str, headers: dict) -> BytesIO:
+        """Downloads the archive for given url in chunks.
+
+        The archive is spooled to a temporary file. If the connection drops
+        the download is retried and resumed via HTTP Range requests from the
+        bytes already received. The resumed request is conditional on the
+        validator (ETag or Last-Modified) of the first response (If-Range), so
+        that a changed archive is sent completely. The download restarts from
+        the beginning if the server answers with the complete content (200),
+        e.g. without Range support, or if the archive has no validator.
+        """
+        attempt = 0
+        validator = None
+        with tempfile.TemporaryFile() as f:
+            while True:
+                received = f.tell()
+                request_headers = dict(headers)
+                if received and validator:
+                    request_headers["Range"] = f"bytes={received}-"
+                    request_headers["If-Range"] = validator
+                try:
+                    with requests.get(
+                        url, headers=request_headers, stream=True, timeout=cls.TIMEOUT
+                    ) as r:
+                        if r.status_code in cls.RETRY_STATUS:
+                            attempt += 1
+                            cls._backoff(attempt, r)
+                            continue
+                        r.raise_for_status()
+                        if r.status_code == 206 and cls._range_start(r) != received:
+                            # unexpected range, restart the download
+                            f.seek(0)
+                            f.truncate()
+                            validator = None
+                            attempt += 1
+                            cls._backoff(attempt, r)
+                            continue
+                        if r.status_code != 206:
+                            # complete content, restart the download
+                            f.seek(0)
+                            f.truncate()
+                            validator = cls._validator(r)
+                        for chunk in r.iter_content(chunk_size=8192):
+                            f.write(chunk)
+                    break
+                except cls.RETRY_EXCEPTIONS as err:
+                    attempt += 1
+                    cls._backoff(attempt, err)
+
+            f.seek(0)
+            return BytesIO(f.read())
 
     @classmethod
     def query_info_nodes_sids(cls) -> Set[str]:
@@ -151,7 +491,9 @@ class PKDB(object):
                 return {}
         auth_token_url = urlparse.urljoin(api_base, "api-token-auth/")
         try:
-            response = requests.post(auth_token_url, json=auth_dict)
+            response = requests.post(
+                auth_token_url, json=auth_dict, timeout=cls.TIMEOUT
+            )
         except requests.exceptions.ConnectionError as e:
             raise requests.exceptions.InvalidURL(
                 f"Error Connecting (probably wrong url <{api_base}>): ", e
@@ -175,7 +517,7 @@ class PKDB(object):
         logger.info(actual_url)
 
         # FIXME: make first request fast
-        response = requests.get(actual_url, headers=headers)
+        response = PKDB._get(actual_url, headers=headers)
         try:
             response.raise_for_status()
             num_pages = response.json()["last_page"]
@@ -188,7 +530,8 @@ class PKDB(object):
             url_current = actual_url + f"&page={page}"
             logger.info(url_current)
 
-            response = requests.get(url_current, headers=headers)
+            response = PKDB._get(url_current, headers=headers)
+            response.raise_for_status()
             data += response.json()["data"]["data"]
 
         # convert to data frame
@@ -1,14 +1,186 @@
-from typing import Dict, List
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple, Union
 
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 import seaborn as sns
+from scipy import stats
 
 from pkdb_analysis import PKData
 from pkdb_analysis.meta_analysis import MetaAnalysis
 
 
+ARM_CONTROL = "control"
+ARM_INVESTIGATE = "investigate"
+ARMS = [ARM_CONTROL, ARM_INVESTIGATE]
+STATISTICS = ["count", "mean", "sd"]
+
+
+def esc_mean_sd_arrays(
+    count_1: np.ndarray,
+    count_2: np.ndarray,
+    mean_1: np.ndarray,
+    mean_2: np.ndarray,
+    sd_1: np.ndarray,
+    sd_2: np.ndarray,
+) -> Dict[str, np.ndarray]:
+    """Hedges' g of many pairs of trial arms (see OutputPair.esc_mean_sd).
+
+    The arguments are arrays (or scalars) of the counts, means and standard
+    deviations of both arms of every pair.
+
+    :return: dictionary with the arrays pooled_sd, variance, se, weight, es
+        and hedges_g
+    """
+    count_1, count_2, mean_1, mean_2, sd_1, sd_2 = (
+        np.asarray(x, dtype=float)
+        for x in (count_1, count_2, mean_1, mean_2, sd_1, sd_2)
+    )
+    total_n = count_2 + count_1
+    mean_diff = mean_2 - mean_1
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pooled_sd = np.sqrt(
+            (((count_1 - 1) * sd_1 ** 2) + ((count_2 - 1) * sd_2 ** 2))
+            / (count_1 + count_2 - 2)
+        )
+        es = mean_diff / pooled_sd
+
+        variance_1 = total_n / (count_2 * count_1)
+        variance_2 = es ** 2 / (2 * (count_2 + count_1))
+        variance = variance_1 + variance_2
+        return {
+            "pooled_sd": pooled_sd,  # of output
+            "variance": variance,  # of effect size
+            "se": np.sqrt(variance),  # of effect size
+            "weight": 1 / variance,
+            "es": es,  # effect size
+            "hedges_g": es * (1 - 3 / (4 * (total_n) - 9)),
+        }
+
+
+def effect_sizes(df: pd.DataFrame) -> pd.DataFrame:
+    """Adds the effect sizes of all pairs to a table of pair statistics.
+
+    :param df: table with the columns control_count, control_mean, control_sd,
+        investigate_count, investigate_mean and investigate_sd (one row per pair)
+    :return: table with the columns of esc_mean_sd_arrays
+    """
+    return df.assign(
+        **esc_mean_sd_arrays(
+            df["control_count"],
+            df["investigate_count"],
+            df["control_mean"],
+            df["investigate_mean"],
+            df["control_sd"],
+            df["investigate_sd"],
+        )
+    )
+
+
+def arm_statistics(
+    pkdata: PKData,
+    arm: Union[str, np.ndarray],
+    category: Union[str, np.ndarray],
+    study: str = "study_name",
+) -> pd.DataFrame:
+    """Count, mean and standard deviation of every arm of all pairs.
+
+    A pair are the outputs of a study and category, the outputs of a pair are
+    either the control or investigate arm (see OutputPair). The statistics of
+    an arm of individuals are the number of individuals and the mean and
+    standard deviation of the values; of an arm of a group the group count and
+    the mean (median if not reported) and standard deviation of the first
+    output (see OutputPair.get_statistics).
+
+    :param pkdata: filtered PKData with the outputs of all pairs
+    :param arm: column of the outputs or array (one value per output) with the
+        arm (ARM_CONTROL or ARM_INVESTIGATE), outputs without arm are ignored
+    :param category: column of the outputs or array with the category
+    :param study: column of the outputs with the study
+    :return: table with the columns study, category, arm, count, mean and sd
+    """
+    outputs = pkdata.outputs.df
+    df = pd.DataFrame(
+        {
+            "study": outputs[study].values,
+            "category": outputs[category].values
+            if isinstance(category, str)
+            else np.asarray(category),
+            "arm": outputs[arm].values if isinstance(arm, str) else np.asarray(arm),
+            "individual_pk": outputs["individual_pk"].values,
+            "group_pk": outputs["group_pk"].values,
+            "value": outputs["value"].values,
+            "mean": outputs["mean"].fillna(outputs["median"]).values,
+            "sd": outputs["sd"].values,
+        }
+    )
+    df = df[df["arm"].isin(ARMS)]
+    keys = ["study", "category", "arm"]
+    is_individual = df["individual_pk"].fillna(-1) != -1
+
+    individuals = (
+        df[is_individual]
+        .groupby(keys, sort=False)
+        .agg(
+            count=("individual_pk", "nunique"),
+            mean=("value", "mean"),
+            sd=("value", "std"),
+        )
+    )
+    group_counts = (
+        pkdata.groups.df.drop_duplicates("group_pk")
+        .set_index("group_pk")["group_count"]
+        .astype(float)
+    )
+    groups = df[~is_individual].groupby(keys, sort=False).head(1).set_index(keys)
+    groups = groups.assign(count=groups["group_pk"].map(group_counts))[STATISTICS]
+
+    both = individuals.index.intersection(groups.index)
+    if len(both) > 0:
+        raise ValueError(
+            f"One group or individuals are allowed not both: {list(both)}"
+        )
+    return pd.concat([individuals, groups]).reset_index()
+
+
+def pair_statistics_table(
+    pkdata: PKData,
+    arm: Union[str, np.ndarray],
+    category: Union[str, np.ndarray],
+    study: str = "study_name",
+) -> pd.DataFrame:
+    """Statistics and effect sizes of all pairs of a filtered PKData.
+
+    Vectorized version of OutputPair.pair_statistics for all pairs (see
+    arm_statistics) without a PKData per pair. Pairs without both arms are
+    removed with a warning.
+
+    :return: table with a row per pair and the columns of
+        OutputPair.pair_statistics
+    """
+    statistics = arm_statistics(pkdata, arm=arm, category=category, study=study)
+    table = statistics.pivot(
+        index=["study", "category"], columns="arm", values=STATISTICS
+    )
+    table.columns = [f"{arm}_{statistic}" for statistic, arm in table.columns]
+    table = table.reindex(
+        columns=[f"{arm}_{statistic}" for arm in ARMS for statistic in STATISTICS]
+    )
+    incomplete = table.isnull().all(axis=1) | table[
+        [f"{arm}_count" for arm in ARMS]
+    ].isnull().any(axis=1)
+    if incomplete.any():
+        warnings.warn(
+            f"Pairs without control or investigate arm are removed: "
+            f"{list(table.index[incomplete])}"
+        )
+    table = table[~incomplete].reset_index()
+    return effect_sizes(table)
+
+
 class OutputPair(object):
     def __init__(
         self,
@@ -62,29 +234,15 @@ class OutputPair(object):
     ) -> pd.Series:
         """To calculate Hedges’ g from the Mean, Standard Deviation, and counts of both trial arms
         ( adopted from r package https://github.com/strengejacke/esc/tree/eba3c6a62875d9c894466012fe82c0d2253e6137).
-        """
-
-        total_n = count_2 + count_1
-        mean_diff = mean_2 - mean_1
-
-        pooled_sd = np.sqrt(
-            (((count_1 - 1) * sd_1 ** 2) + ((count_2 - 1) * sd_2 ** 2))
-            / (count_1 + count_2 - 2)
-        )
-
-        es = mean_diff / pooled_sd
 
-        variance_1 = total_n / (count_2 * count_1)
-        variance_2 = es ** 2 / (2 * (count_2 + count_1))
-        variance = variance_1 + variance_2
+        See esc_mean_sd_arrays for many pairs.
+        """
         return pd.Series(
             {
-                "pooled_sd": pooled_sd,  # of output
-                "variance": variance,  # of effect size
-                "se": np.sqrt(variance),  # of effect size
-                "weight": 1 / variance,
-                "es": es,  # effect size
-                "hedges_g": es * (1 - 3 / (4 * (total_n) - 9)),
+                key: float(value)
+                for key, value in esc_mean_sd_arrays(
+                    count_1, count_2, mean_1, mean_2, sd_1, sd_2
+                ).items()
             }
         )
 
@@ -128,49 +286,319 @@ def fixed_effect(df: pd.DataFrame, effect_size: str, variance: str) -> Dict:
     }
 
 
-def random_effects(df: pd.DataFrame, effect_size: str, variance: str) -> Dict:
-    fe_statistics = fixed_effect(df, effect_size, variance)
-    weights = 1 / df[variance]
-
-    q = np.sum(weights * (df[effect_size]) ** 2) - (
-        np.sum(weights * df[effect_size])
-    ) ** 2 / np.sum(weights)
-    c = np.sum(weights) - (np.sum(weights ** 2) / np.sum(weights))
+def _sums(w: np.ndarray, y: np.ndarray):
+    """Sum of the weights and weighted mean of every row."""
+    sum_w = w.sum(axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return sum_w, (w * y).sum(axis=-1) / sum_w
+
+
+def _tau2_dl(y: np.ndarray, v: np.ndarray, valid: np.ndarray, **kwargs) -> np.ndarray:
+    """DerSimonian-Laird estimator of the between studies variance."""
+    w = np.where(valid, 1 / v, 0.0)
+    sum_w, mean = _sums(w, y)
+    q = (w * (y - mean[..., None]) ** 2).sum(axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        c = sum_w - (w ** 2).sum(axis=-1) / sum_w
+        df = valid.sum(axis=-1) - 1
+        return np.where((q > df) & (c != 0), (q - df) / c, 0.0)
+
+
+def _tau2_pm(
+    y: np.ndarray,
+    v: np.ndarray,
+    valid: np.ndarray,
+    max_iter: int = 100,
+    tol: float = 1e-10,
+) -> np.ndarray:
+    """Paule-Mandel estimator of the between studies variance.
+
+    Solves Q(tau2) = k - 1 of the generalized Q statistic with the iteration of
+    DerSimonian and Kacker (2007) for all rows at once.
+    """
+    df = valid.sum(axis=-1) - 1
+    tau2 = np.zeros(y.shape[:-1])
+    for _ in range(max_iter):
+        w = np.where(valid, 1 / (v + tau2[..., None]), 0.0)
+        _, mean = _sums(w, y)
+        residuals = np.where(valid, y - mean[..., None], 0.0)
+        q = (w * residuals ** 2).sum(axis=-1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            delta = (q - df) / (w ** 2 * residuals ** 2).sum(axis=-1)
+        delta = np.nan_to_num(delta, nan=0.0, posinf=0.0, neginf=0.0)
+        tau2_new = np.maximum(tau2 + delta, 0.0)
+        converged = np.all(np.abs(tau2_new - tau2) <= tol * np.maximum(tau2, 1))
+        tau2 = tau2_new
+        if converged:
+            break
+    return tau2
+
+
+def _tau2_reml(
+    y: np.ndarray,
+    v: np.ndarray,
+    valid: np.ndarray,
+    max_iter: int = 100,
+    tol: float = 1e-10,
+) -> np.ndarray:
+    """Restricted maximum likelihood estimator of the between studies variance.
+
+    Fixed point iteration (as in the R package metafor) for all rows at once,
+    starting from the DerSimonian-Laird estimate.
+    """
+    tau2 = _tau2_dl(y, v, valid)
+    for _ in range(max_iter):
+        w = np.where(valid, 1 / (v + tau2[..., None]), 0.0)
+        sum_w, mean = _sums(w, y)
+        residuals = np.where(valid, (y - mean[..., None]) ** 2 - v, 0.0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            tau2_new = (w ** 2 * residuals).sum(axis=-1) / (w ** 2).sum(
+                axis=-1
+            ) + 1 / sum_w
+        tau2_new = np.maximum(np.nan_to_num(tau2_new, nan=0.0), 0.0)
+        converged = np.all(np.abs(tau2_new - tau2) <= tol * np.maximum(tau2, 1))
+        tau2 = tau2_new
+        if converged:
+            break
+    return tau2
+
+
+TAU2_ESTIMATORS = {"DL": _tau2_dl, "PM": _tau2_pm, "REML": _tau2_reml}
+
+
+def pooled_effects(
+    y: np.ndarray, v: np.ndarray, method: str = "DL", level: float = 0.95
+) -> Dict[str, np.ndarray]:
+    """Fixed and random effects estimates of every row of effect sizes.
+
+    The effect sizes y and variances v are arrays (..., studies), missing
+    studies are NaN (e.g. padding of categories with fewer studies). All
+    statistics are calculated for all rows at once.
+
+    :param method: estimator of the between studies variance tau2, "DL"
+        (DerSimonian-Laird), "PM" (Paule-Mandel) or "REML"
+    :param level: level of the confidence and prediction intervals
+    :return: dictionary with arrays of the fixed effect, random effects and
+        heterogeneity statistics (Q, I2 in percent, tau2) and intervals
+    """
+    if method not in TAU2_ESTIMATORS:
+        raise ValueError(f"'method' must be one of {list(TAU2_ESTIMATORS)}: {method}")
+    y = np.asarray(y, dtype=float)
+    v = np.asarray(v, dtype=float)
+    valid = np.isfinite(y) & np.isfinite(v) & (v > 0)
+    y = np.where(valid, y, 0.0)
+    v = np.where(valid, v, 1.0)
+    k = valid.sum(axis=-1)
+    df = k - 1
+
+    w = np.where(valid, 1 / v, 0.0)
+    sum_w, fixed_mean = _sums(w, y)
+    q = (w * (y - fixed_mean[..., None]) ** 2).sum(axis=-1)
+    tau2 = TAU2_ESTIMATORS[method](y, v, valid)
+
+    w_random = np.where(valid, 1 / (v + tau2[..., None]), 0.0)
+    sum_w_random, random_mean = _sums(w_random, y)
+    z = stats.norm.ppf(0.5 + level / 2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fixed_variance = 1 / sum_w
+        random_variance = 1 / sum_w_random
+        i2 = np.where(q > 0, np.maximum((q - df) / q, 0.0) * 100, 0.0)
+        t = stats.t.ppf(0.5 + level / 2, np.where(k >= 3, k - 2, np.nan))
+    random_sd = np.sqrt(random_variance)
+    prediction = t * np.sqrt(tau2 + random_variance)
+    return {
+        "n_studies": k,
+        "fixed_effect_variance": fixed_variance,
+        "fixed_effect_se": np.sqrt(fixed_variance),
+        "fixed_effect_weighted_mean": fixed_mean,
+        "random_effects_weighted_mean": random_mean,
+        "random_effects_variance": random_variance,
+        "random_effects_sd": random_sd,
+        "random_effects_lower": random_mean - z * random_sd,
+        "random_effects_upper": random_mean + z * random_sd,
+        "tau2": tau2,
+        "q": q,
+        "q_df": df,
+        "q_pvalue": np.where(df > 0, stats.chi2.sf(q, np.maximum(df, 1)), np.nan),
+        "i2": i2,
+        "prediction_lower": random_mean - prediction,
+        "prediction_upper": random_mean + prediction,
+    }
 
-    df_ = len(df) - 1
-    if q > df_ and c != 0:
-        between_studies_variance = (q - df_) / c
-    else:
-        between_studies_variance = 0
 
-    weights_random_effects = 1 / (df[variance] + between_studies_variance)
-    weighted_mean_random_effects_denominator = np.sum(
-        weights_random_effects * df[effect_size]
-    )
-    weighted_mean_random_effects_nominator = np.sum(weights_random_effects)
-    weighted_mean_random_effects = (
-        weighted_mean_random_effects_denominator
-        / weighted_mean_random_effects_nominator
+def category_arrays(
+    df: pd.DataFrame, on: str, effect_size: str, variance: str
+) -> Tuple[pd.Index, np.ndarray, np.ndarray]:
+    """Effect sizes and variances as arrays (categories, studies) padded with NaN.
+
+    :return: sorted categories, effect sizes and variances
+    """
+    codes, categories = pd.factorize(df[on], sort=True)
+    order = np.argsort(codes, kind="stable")
+    codes = codes[order]
+    counts = np.bincount(codes, minlength=len(categories))
+    positions = np.arange(len(codes)) - np.repeat(np.cumsum(counts) - counts, counts)
+    shape = (len(categories), counts.max() if len(codes) else 0)
+    y = np.full(shape, np.nan)
+    v = np.full(shape, np.nan)
+    y[codes, positions] = df[effect_size].values.astype(float)[order]
+    v[codes, positions] = df[variance].values.astype(float)[order]
+    return pd.Index(categories, name=on), y, v
+
+
+def random_effects(
+    df: pd.DataFrame, effect_size: str, variance: str, method: str = "DL"
+) -> Dict:
+    """Fixed and random effects statistics of the studies (see pooled_effects)."""
+    statistics = pooled_effects(
+        df[effect_size].values[None, :], df[variance].values[None, :], method=method
     )
-    variance_random_effects = 1 / weighted_mean_random_effects_nominator
-    sd_random_effects = np.sqrt(variance_random_effects)
-
-    return {
-        **fe_statistics,
-        "random_effects_weighted_mean": weighted_mean_random_effects,
-        "random_effects_variance": variance_random_effects,
-        "random_effects_sd": sd_random_effects,
+    return {key: value[0] for key, value in statistics.items()}
+
+
+def between_studies_statistics(
+    df: pd.DataFrame,
+    on: str,
+    effect_size: str = "hedges_g",
+    variance: str = "variance",
+    method: str = "DL",
+    level: float = 0.95,
+) -> pd.DataFrame:
+    """Fixed and random effects statistics of all categories (see pooled_effects).
+
+    :return: table with a row per category (sorted)
+    """
+    categories, y, v = category_arrays(df, on, effect_size, variance)
+    statistics = pooled_effects(y, v, method=method, level=level)
+    return pd.DataFrame({"category": categories, **statistics})
+
+
+RESAMPLING_KINDS = ["bootstrap", "permutation"]
+
+
+def resampled_effects(
+    y: np.ndarray,
+    v: np.ndarray,
+    kind: str = "bootstrap",
+    n_resamples: int = 1000,
+    method: str = "DL",
+    level: float = 0.95,
+    statistic: str = "random_effects_weighted_mean",
+    seed: Union[int, np.random.SeedSequence] = None,
+) -> Dict[str, float]:
+    """Resampling confidence interval of a pooled effect of the studies.
+
+    All replicates are drawn as one matrix (replicates x studies) and the
+    pooled effects of all replicates are calculated at once (see
+    pooled_effects).
+
+    - bootstrap: studies drawn with replacement (index matrix)
+    - permutation: random signs of the deviations of the effect sizes from the
+      pooled effect (sign matrix), the p-value is the fraction of replicates
+      with random signs of the effect sizes at least as extreme as the pooled
+      effect (null hypothesis of no effect)
+
+    :param y: effect sizes of the studies (NaN are ignored)
+    :param v: variances of the effect sizes
+    :param statistic: pooled effect (key of pooled_effects)
+    :param seed: seed of the random number generator
+    :return: dictionary with the pooled effect, mean, standard error and
+        percentile interval of the replicates and the p-value
+    """
+    if kind not in RESAMPLING_KINDS:
+        raise ValueError(f"'kind' must be one of {RESAMPLING_KINDS}: {kind}")
+    y = np.asarray(y, dtype=float)
+    v = np.asarray(v, dtype=float)
+    valid = np.isfinite(y) & np.isfinite(v) & (v > 0)
+    y, v = y[valid], v[valid]
+    k = len(y)
+    rng = np.random.default_rng(seed)
+    result = {
+        "n_studies": k,
+        statistic: np.nan,
+        "resampling_mean": np.nan,
+        "resampling_se": np.nan,
+        "resampling_lower": np.nan,
+        "resampling_upper": np.nan,
+        "resampling_pvalue": np.nan,
     }
+    if k == 0:
+        return result
 
-
-def between_studies_statistics(df, on):
-    df_result = pd.DataFrame()
-    for category, category_df in df.groupby([on]):
-        random_effects_result = random_effects(category_df, "hedges_g", "variance")
-        df_result = df_result.append(
-            {"category": category, **random_effects_result}, ignore_index=True
-        )
-    return df_result
+    estimate = float(pooled_effects(y, v, method=method)[statistic])
+    if kind == "bootstrap":
+        index = rng.integers(0, k, size=(n_resamples, k))
+        replicates = pooled_effects(y[index], v[index], method=method)[statistic]
+    else:
+        signs = rng.choice([-1.0, 1.0], size=(n_resamples, k))
+        v = np.broadcast_to(v, signs.shape)
+        replicates = pooled_effects(estimate + signs * (y - estimate), v, method)[
+            statistic
+        ]
+        null = pooled_effects(signs * y, v, method)[statistic]
+        result["resampling_pvalue"] = (
+            np.sum(np.abs(null) >= np.abs(estimate)) + 1
+        ) / (n_resamples + 1)
+
+    lower, upper = np.nanpercentile(
+        replicates, [50 * (1 - level), 50 * (1 + level)]
+    )
+    result.update(
+        {
+            statistic: estimate,
+            "resampling_mean": float(np.nanmean(replicates)),
+            "resampling_se": float(np.nanstd(replicates, ddof=1)),
+            "resampling_lower": lower,
+            "resampling_upper": upper,
+        }
+    )
+    return result
+
+
+def resampling_statistics(
+    df: pd.DataFrame,
+    on: str,
+    effect_size: str = "hedges_g",
+    variance: str = "variance",
+    kind: str = "bootstrap",
+    n_resamples: int = 1000,
+    method: str = "DL",
+    level: float = 0.95,
+    statistic: str = "random_effects_weighted_mean",
+    seed: int = None,
+    n_jobs: int = 1,
+) -> pd.DataFrame:
+    """Resampling confidence intervals of the pooled effects of all categories.
+
+    Every category is resampled with its own seed spawned from `seed` (see
+    resampled_effects), i.e. the results are independent of n_jobs. With
+    n_jobs > 1 the categories are resampled in a process pool.
+
+    :return: table with a row per category (sorted)
+    """
+    categories, y, v = category_arrays(df, on, effect_size, variance)
+    seeds = np.random.SeedSequence(seed).spawn(len(categories))
+    kwargs = dict(
+        kind=kind,
+        n_resamples=n_resamples,
+        method=method,
+        level=level,
+        statistic=statistic,
+    )
+    if n_jobs > 1 and len(categories) > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            futures = [
+                executor.submit(resampled_effects, y[k], v[k], seed=seeds[k], **kwargs)
+                for k in range(len(categories))
+            ]
+            rows = [future.result() for future in futures]
+    else:
+        rows = [
+            resampled_effects(y[k], v[k], seed=seeds[k], **kwargs)
+            for k in range(len(categories))
+        ]
+    columns = ["category"] + (list(rows[0]) if rows else [])
+    return pd.DataFrame(rows).assign(category=categories).reindex(columns=columns)
 
 
 def get_value(series: pd.Series) -> float:
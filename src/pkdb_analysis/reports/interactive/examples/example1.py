@@ -7,12 +7,12 @@ os.environ["API_BASE"] = "http://localhost:8000"
 from dataclasses import dataclass, field
 from pathlib import Path
 
-import pandas as pd
 
 from pkdb_analysis import PKDB, PKData
 from pkdb_analysis.core import Core
 from pkdb_analysis.core import Sid as BaseSid
 from pkdb_analysis.filter import f_effective_n_oc, f_n_oc, f_n_smoking, f_oc, f_smoking
+from pkdb_analysis.meta_analysis import RowRange
 from pkdb_analysis.plotting.factory import PlotContentDefinition
 from pkdb_analysis.reports.interactive.interactive import LegendArgs as LA
 from pkdb_analysis.reports.interactive.interactive import interactive_plot_factory
@@ -78,7 +78,7 @@ MULTI_COLOR_LEGEND = {
         "life_style",
     ),
     "Administration route": LA("intervention_route"),
-    "Coadministration": LA("intervention_extra"),
+    "Coadministration": LA("intervention_names"),
     "Number of interventions": LA(
         "intervention_number",
         [
@@ -115,12 +115,14 @@ def outlier_studies(df):
 
 
 def lifestyle(df):
+    # characteristica of the subject (see MetaAnalysis.create_subject_table)
+    extra = df.extra.df
 
-    if not df.extra[f_smoking].empty and df.extra[f_n_smoking].empty:
+    if not extra[f_smoking].empty and extra[f_n_smoking].empty:
         return "smoking"
-    elif not df.extra[f_oc].empty and df.extra[f_n_oc].empty:
+    elif not extra[f_oc].empty and extra[f_n_oc].empty:
         return "oral contraceptive"
-    elif not df.extra[f_n_smoking].empty and not df.extra[f_effective_n_oc].empty:
+    elif not extra[f_n_smoking].empty and not extra[f_effective_n_oc].empty:
         return "control"
     else:
         return "unknown"
@@ -130,10 +132,9 @@ def intervention_names(df):
     """calculates a column with a information on all applied intervention names.
     This is information is displayed on hover."""
 
-    if isinstance(df.intervention_extra, pd.DataFrame):
-        return " | ".join(df.intervention_extra["name"])
-    else:
-        print(df.intervention_extra)
+    # interventions of the output (see MetaAnalysis.create_intervention_extra)
+    if isinstance(df.intervention_extra, RowRange):
+        return " | ".join(df.intervention_extra.df["name"])
 
 
 # column name and function on how the column name is calculated.
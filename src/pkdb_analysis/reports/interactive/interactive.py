@@ -17,6 +17,7 @@ from pkdb_analysis.plotting.factory import (
     pkdata_by_plot_content,
     results,
 )
+from pkdb_analysis.plotting.results_cache import ResultsCache
 from pkdb_analysis.utils import create_parent
 
 
@@ -507,7 +508,8 @@ def interactive_plot_factory(
     url: str = "http://0.0.0.0:8081",
     create_json=True,
     replacements={},
-
+    cache_path: Path = None,
+    n_jobs: int = 1,
 ):
     intervention_substances_str = {
         substance.sid for substance in intervention_substances
@@ -527,6 +529,8 @@ def interactive_plot_factory(
         additional_information=additional_information,
         url=url,
         replacements=replacements,
+        cache=ResultsCache(cache_path) if cache_path else None,
+        n_jobs=n_jobs,
     )
     copy_dir(Path(__file__).parent / "template", path, "_".join(output_substances_str))
     create_parent(path)
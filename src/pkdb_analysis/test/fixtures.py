@@ -0,0 +1,268 @@
+"""Generator of synthetic PKData for tests and benchmarks.
+
+The generated data has the format of the archives downloaded from the
+filter endpoint of PK-DB (see PKData.from_download), i.e., outputs contain
+one row per intervention and timecourses contain lists of intervention and
+output pks.
+"""
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from pkdb_analysis.data import PKData
+from pkdb_analysis.dtypes import DTYPES
+
+
+def _table(rows: List[Dict], key: str) -> pd.DataFrame:
+    """DataFrame with all columns of the table."""
+    return pd.DataFrame(rows, columns=list(DTYPES[key]))
+
+
+def concentration_curve(
+    time: np.ndarray, dose: float, ka: float, kel: float, vd: float
+) -> np.ndarray:
+    """Concentrations of a one-compartment model with first order absorption."""
+    return dose * ka / (vd * (ka - kel)) * (np.exp(-kel * time) - np.exp(-ka * time))
+
+
+def create_pkdata(
+    n_studies: int = 5,
+    n_groups: int = 2,
+    n_individuals: int = 3,
+    n_timepoints: int = 10,
+    substance: str = "caffeine",
+    seed: int = 42,
+) -> PKData:
+    """Creates synthetic PKData in the download format of PK-DB.
+
+    Every study has a single oral dosing of the substance, groups with
+    individuals, pharmacokinetic outputs (auc, cmax, thalf) for every subject
+    and a concentration timecourse for every subject.
+
+    :param n_studies: number of studies
+    :param n_groups: number of groups per study
+    :param n_individuals: number of individuals per group
+    :param n_timepoints: number of time points per timecourse
+    :param substance: substance of dosing and outputs
+    :param seed: seed of the random number generator
+    """
+    rng = np.random.default_rng(seed)
+    tables = {key: [] for key in PKData.KEYS}
+    pks = {"characteristica": 0, "output": 0, "subset": 0, "individual": 0}
+
+    def next_pk(key: str) -> int:
+        pks[key] += 1
+        return pks[key]
+
+    time = np.linspace(0.5, 24, num=n_timepoints)
+
+    for k_study in range(1, n_studies + 1):
+        sid = f"PKDB{k_study:05d}"
+        study_name = f"Study{k_study}"
+        study = {"study_sid": sid, "study_name": study_name}
+        tables["studies"].append(
+            {
+                "sid": sid,
+                "name": study_name,
+                "licence": "open",
+                "access": "public",
+                "date": "2021-01-01",
+                "creator": "pkdb",
+                "curators": "pkdb",
+                "substances": substance,
+                "reference_pmid": 1000 + k_study,
+                "reference_title": f"Pharmacokinetics of {substance} {k_study}",
+                "reference_date": "2021-01-01",
+            }
+        )
+
+        intervention_pk = k_study
+        dose = float(rng.choice([50.0, 100.0, 200.0]))
+        tables["interventions"].append(
+            {
+                **study,
+                "intervention_pk": intervention_pk,
+                "raw_pk": intervention_pk,
+                "normed": True,
+                "name": f"{substance}{int(dose)}",
+                "route": "oral",
+                "form": "tablet",
+                "application": "single dose",
+                "time": "0",
+                "time_unit": "hr",
+                "measurement_type": "dosing",
+                "substance": substance,
+                "value": dose,
+                "unit": "milligram",
+            }
+        )
+
+        subjects = []
+        for k_group in range(n_groups):
+            group_pk = k_study * 100 + k_group
+            group = {
+                **study,
+                "group_pk": group_pk,
+                "group_name": f"group{k_group}",
+                "group_count": n_individuals,
+                "group_parent_pk": -1,
+            }
+            weights = rng.normal(75.0, 10.0, size=n_individuals)
+            ages = rng.normal(40.0, 10.0, size=n_individuals)
+            for measurement_type, values, unit in [
+                ("weight", weights, "kilogram"),
+                ("age", ages, "year"),
+            ]:
+                tables["groups"].append(
+                    {
+                        **group,
+                        "characteristica_pk": next_pk("characteristica"),
+                        "measurement_type": measurement_type,
+                        "count": n_individuals,
+                        "mean": values.mean(),
+                        "sd": values.std(),
+                        "unit": unit,
+                    }
+                )
+            for measurement_type, choice in [("sex", "M"), ("healthy", "Y")]:
+                tables["groups"].append(
+                    {
+                        **group,
+                        "characteristica_pk": next_pk("characteristica"),
+                        "measurement_type": measurement_type,
+                        "count": n_individuals,
+                        "choice": choice,
+                    }
+                )
+
+            curves = []
+            for k_individual in range(n_individuals):
+                individual_pk = next_pk("individual")
+                individual = {
+                    **study,
+                    "individual_pk": individual_pk,
+                    "individual_name": f"{group['group_name']}_{k_individual}",
+                    "individual_group_pk": group_pk,
+                }
+                for measurement_type, value, unit in [
+                    ("weight", weights[k_individual], "kilogram"),
+                    ("age", ages[k_individual], "year"),
+                ]:
+                    tables["individuals"].append(
+                        {
+                            **individual,
+                            "characteristica_pk": next_pk("characteristica"),
+                            "measurement_type": measurement_type,
+                            "count": 1,
+                            "value": value,
+                            "unit": unit,
+                        }
+                    )
+                for measurement_type, choice in [("sex", "M"), ("healthy", "Y")]:
+                    tables["individuals"].append(
+                        {
+                            **individual,
+                            "characteristica_pk": next_pk("characteristica"),
+                            "measurement_type": measurement_type,
+                            "count": 1,
+                            "choice": choice,
+                        }
+                    )
+
+                ka = rng.uniform(1.0, 3.0)
+                kel = rng.uniform(0.1, 0.3)
+                vd = rng.uniform(30.0, 60.0) * weights[k_individual] / 75.0
+                curve = concentration_curve(time, dose, ka, kel, vd)
+                curve = curve * rng.lognormal(0.0, 0.05, size=n_timepoints)
+                curves.append(curve)
+                subjects.append(
+                    (
+                        {"group_pk": -1, "individual_pk": individual_pk},
+                        {"value": curve},
+                        {"auc": dose / (kel * vd), "cmax": curve.max()},
+                        {"thalf": np.log(2) / kel},
+                    )
+                )
+
+            curves = np.array(curves)
+            subjects.append(
+                (
+                    {"group_pk": group_pk, "individual_pk": -1},
+                    {"mean": curves.mean(axis=0), "sd": curves.std(axis=0)},
+                    {"auc": np.nan, "cmax": curves.max(axis=1).mean()},
+                    {"thalf": np.nan},
+                )
+            )
+
+        for subject, curve, pk_values, thalf in subjects:
+            field = "value" if "value" in curve else "mean"
+            output_base = {
+                **study,
+                **subject,
+                "intervention_pk": intervention_pk,
+                "tissue": "plasma",
+                "method": "HPLC",
+                "normed": True,
+                "substance": substance,
+                "label": f"{substance} pharmacokinetics",
+            }
+            # pharmacokinetic outputs
+            values = {**pk_values, **thalf}
+            units = {"auc": "hour * milligram / liter", "cmax": "milligram / liter"}
+            units["thalf"] = "hour"
+            for measurement_type, value in values.items():
+                if field == "mean" and np.isnan(value):
+                    continue
+                tables["outputs"].append(
+                    {
+                        **output_base,
+                        "output_pk": next_pk("output"),
+                        "measurement_type": measurement_type,
+                        "calculated": False,
+                        "output_type": "output",
+                        "unit": units[measurement_type],
+                        field: value,
+                    }
+                )
+
+            # timecourse with an output per time point
+            output_pks = []
+            for k_time, t in enumerate(time):
+                output_pk = next_pk("output")
+                output_pks.append(output_pk)
+                tables["outputs"].append(
+                    {
+                        **output_base,
+                        "output_pk": output_pk,
+                        "measurement_type": "concentration",
+                        "calculated": False,
+                        "output_type": "timecourse",
+                        "unit": "milligram / liter",
+                        "time": t,
+                        "time_unit": "hr",
+                        **{key: values[k_time] for key, values in curve.items()},
+                    }
+                )
+            tables["timecourses"].append(
+                {
+                    **output_base,
+                    "subset_pk": next_pk("subset"),
+                    "subset_name": f"{substance}_{subject['group_pk']}_{subject['individual_pk']}",
+                    "intervention_pk": (intervention_pk,),
+                    "measurement_type": "concentration",
+                    "unit": "milligram / liter",
+                    "time_unit": "hr",
+                    "output_pk": tuple(output_pks),
+                    "time": tuple(time),
+                    **{key: tuple(values) for key, values in curve.items()},
+                }
+            )
+
+    studies = pd.DataFrame(tables.pop("studies"))
+    scatters = pd.DataFrame(tables.pop("scatters"))
+    return PKData(
+        studies=studies,
+        scatters=scatters,
+        **{key: _table(rows, key) for key, rows in tables.items()},
+    )
@@ -1,11 +1,20 @@
+import warnings
+
+import numpy as np
 import pandas as pd
 import pytest
 
 from pkdb_analysis.reports.effect_analysis import (
     OutputPair,
+    between_studies_statistics,
+    esc_mean_sd_arrays,
     fixed_effect,
+    pair_statistics_table,
     random_effects,
+    resampled_effects,
+    resampling_statistics,
 )
+from pkdb_analysis.test.fixtures import create_pkdata
 
 
 def test_esc_mean_sd():
@@ -33,6 +42,63 @@ def test_esc_mean_sd():
     assert result["weight"] == pytest.approx(27.2374, rel=0.01)
 
 
+def test_esc_mean_sd_arrays():
+    """Effect sizes of many pairs are equal to the effect sizes of single pairs."""
+    rng = np.random.default_rng(42)
+    counts_1, counts_2 = rng.integers(3, 100, (2, 50))
+    means_1, means_2 = rng.lognormal(0, 1, (2, 50))
+    sds_1, sds_2 = rng.lognormal(-1, 0.5, (2, 50))
+    result = pd.DataFrame(
+        esc_mean_sd_arrays(counts_1, counts_2, means_1, means_2, sds_1, sds_2)
+    )
+    for k in [0, 17, 49]:
+        single = OutputPair.esc_mean_sd(
+            counts_1[k], counts_2[k], means_1[k], means_2[k], sds_1[k], sds_2[k]
+        )
+        pd.testing.assert_series_equal(result.iloc[k], single, check_names=False)
+
+
+def test_pair_statistics_table():
+    """Statistics of all pairs are equal to the statistics of OutputPairs."""
+    pkdata = create_pkdata(n_studies=2)
+    outputs = pkdata.outputs.df
+    cmax, auc = (outputs["measurement_type"] == mt for mt in ["cmax", "auc"])
+    arm = np.select(
+        [
+            cmax & outputs["group_pk"].isin([100, 200]),
+            cmax & outputs["group_pk"].isin([101, 201]),
+            auc & outputs["individual_pk"].isin([1, 2, 3, 7, 8, 9]),
+            auc & outputs["individual_pk"].isin([4, 5, 6, 10, 11, 12]),
+        ],
+        ["control", "investigate", "control", "investigate"],
+        None,
+    )
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        table = pair_statistics_table(pkdata, arm=arm, category="measurement_type")
+
+        pairs = []
+        for study, category in zip(table["study"], table["category"]):
+
+            def f_arm(name):
+                return lambda d: (
+                    (d["study_name"] == study)
+                    & (d["measurement_type"] == category)
+                    & (pd.Series(arm, index=d.index) == name)
+                )
+
+            pairs.append(
+                OutputPair(
+                    category,
+                    control=pkdata.filter_output(f_arm("control")),
+                    investigate=pkdata.filter_output(f_arm("investigate")),
+                ).pair_statistics()
+            )
+    reference = pd.DataFrame(pairs)
+    assert len(table) == 4
+    pd.testing.assert_frame_equal(table, reference, check_dtype=False)
+
+
 def test_fixed_effect():
     """
     from https://www.meta-analysis.com/downloads/M-a_f_e_v_r_e_sv.pdf
@@ -71,3 +137,108 @@ def test_random_effects():
     assert result["random_effects_weighted_mean"] == pytest.approx(0.3442, rel=0.01)
     assert result["random_effects_variance"] == pytest.approx(0.0114, rel=0.01)
     assert result["random_effects_sd"] == pytest.approx(0.1068, rel=0.01)
+
+
+def test_heterogeneity():
+    """
+    from https://www.meta-analysis.com/downloads/M-a_f_e_v_r_e_sv.pdf
+
+    """
+    df = pd.DataFrame(
+        {
+            "hedges_g": [0.1, 0.3, 0.35, 0.65, 0.45, 0.15],
+            "variance": [0.03, 0.03, 0.05, 0.01, 0.05, 0.02],
+        }
+    )
+    result = random_effects(df, effect_size="hedges_g", variance="variance")
+
+    assert result["q"] == pytest.approx(12.8056, rel=0.01)
+    assert result["q_df"] == 5
+    assert result["tau2"] == pytest.approx(0.0398, rel=0.01)
+    assert result["i2"] == pytest.approx(60.95, rel=0.01)
+    assert result["random_effects_lower"] < result["random_effects_weighted_mean"]
+    assert result["prediction_lower"] < result["random_effects_lower"]
+
+
+@pytest.mark.parametrize(
+    "method, tau2", [("DL", 0.039786), ("PM", 0.023161), ("REML", 0.033140)]
+)
+def test_tau2_estimators(method, tau2):
+    """Between studies variance of the estimators (PM and REML solved with scipy)."""
+    df = pd.DataFrame(
+        {
+            "hedges_g": [0.1, 0.3, 0.35, 0.65, 0.45, 0.15],
+            "variance": [0.03, 0.03, 0.05, 0.01, 0.05, 0.02],
+        }
+    )
+    result = random_effects(df, "hedges_g", "variance", method=method)
+    assert result["tau2"] == pytest.approx(tau2, rel=1e-4)
+
+
+@pytest.mark.parametrize("method", ["DL", "PM", "REML"])
+def test_between_studies_statistics(method):
+    """Statistics of all categories are equal to the statistics per category."""
+    rng = np.random.default_rng(42)
+    df = pd.DataFrame(
+        {
+            "category": rng.choice(["a", "b", "c", "d"], 40),
+            "hedges_g": rng.normal(0.3, 0.4, 40),
+            "variance": rng.uniform(0.01, 0.1, 40),
+        }
+    )
+    result = between_studies_statistics(df, on="category", method=method)
+
+    assert list(result["category"]) == ["a", "b", "c", "d"]
+    for _, row in result.iterrows():
+        category_df = df[df["category"] == row["category"]]
+        expected = random_effects(category_df, "hedges_g", "variance", method=method)
+        for key, value in expected.items():
+            assert row[key] == pytest.approx(value, rel=1e-8, nan_ok=True)
+
+
+@pytest.mark.parametrize("kind", ["bootstrap", "permutation"])
+def test_resampled_effects(kind):
+    """Resampling intervals are reproducible and contain the pooled effect."""
+    y = [0.1, 0.3, 0.35, 0.65, 0.45, 0.15]
+    v = [0.03, 0.03, 0.05, 0.01, 0.05, 0.02]
+    result = resampled_effects(y, v, kind=kind, n_resamples=2000, seed=42)
+
+    assert result == resampled_effects(y, v, kind=kind, n_resamples=2000, seed=42)
+    assert result["n_studies"] == 6
+    assert result["random_effects_weighted_mean"] == pytest.approx(0.3442, rel=0.01)
+    assert (
+        result["resampling_lower"]
+        < result["random_effects_weighted_mean"]
+        < result["resampling_upper"]
+    )
+    if kind == "permutation":
+        assert 0 < result["resampling_pvalue"] < 0.1
+    else:
+        assert np.isnan(result["resampling_pvalue"])
+
+    with pytest.raises(ValueError):
+        resampled_effects(y, v, kind="jackknife")
+
+
+def test_resampling_statistics():
+    """Resampling of all categories is independent of the number of processes."""
+    rng = np.random.default_rng(42)
+    df = pd.DataFrame(
+        {
+            "category": rng.choice(["a", "b", "c"], 30),
+            "hedges_g": rng.normal(0.3, 0.4, 30),
+            "variance": rng.uniform(0.01, 0.1, 30),
+        }
+    )
+    result = resampling_statistics(df, on="category", n_resamples=200, seed=1)
+    parallel = resampling_statistics(
+        df, on="category", n_resamples=200, seed=1, n_jobs=2
+    )
+
+    assert list(result["category"]) == ["a", "b", "c"]
+    pd.testing.assert_frame_equal(result, parallel)
+    statistics = between_studies_statistics(df, on="category")
+    np.testing.assert_allclose(
+        result["random_effects_weighted_mean"],
+        statistics["random_effects_weighted_mean"],
+    )
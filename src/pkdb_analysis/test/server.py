@@ -0,0 +1,392 @@
+"""Local stand-in for the PK-DB REST API.
+
+Implements the endpoints used by PKDB, PKFilter and query_pkdb_data
+
+- `api-token-auth/`: authentication token
+- `api/v1/filter/`: zip archive (see PKData.to_archive) of the filtered data,
+  projected on the `tables` and `columns__<key>` parameters
+- `api/v1/info_nodes/`: paginated info nodes
+
+with configurable latency, page sizes and failures. This allows to test and
+benchmark the client without the live service, e.g.
+
+    with PKDBServer(create_pkdata(), latency=0.05) as server:
+        with server.client():
+            pkdata = query_pkdb_data(study_names=["Study1", "Study2"])
+
+The server can also be started from the command line
+
+    python -m pkdb_analysis.test.server --port 8000 --studies 100
+"""
+import argparse
+import hashlib
+import json
+import logging
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib import parse as urlparse
+
+import numpy as np
+import pandas as pd
+
+import pkdb_analysis.query
+from pkdb_analysis.data import PKData
+from pkdb_analysis.test.fixtures import create_pkdata
+
+
+logger = logging.getLogger(__name__)
+
+
+class PKDBServer(object):
+    """Local HTTP server serving PKData like PK-DB.
+
+    Failures are injected in the order of the requests: the first `failures`
+    requests are answered with status 503, afterwards the first
+    `drop_connections` archive downloads drop the connection after half of
+    the content. In addition every request fails with probability
+    `failure_rate`. Range requests (with If-Range on the ETag) are supported
+    for archive downloads, the first `wrong_ranges` archive downloads are
+    answered with partial content of an unexpected range.
+    """
+
+    def __init__(
+        self,
+        pkdata: PKData = None,
+        info_nodes: pd.DataFrame = None,
+        latency: float = 0.0,
+        page_size: int = 100,
+        failures: int = 0,
+        drop_connections: int = 0,
+        failure_rate: float = 0.0,
+        wrong_ranges: int = 0,
+        users: Dict[str, str] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        seed: int = 42,
+    ):
+        """Creates the server, use `start` or a with statement to run it.
+
+        :param pkdata: data served by the filter endpoint (raw download format)
+        :param info_nodes: info nodes, created from the pkdata if None
+        :param latency: delay in seconds before every response
+        :param page_size: maximal page size of paginated endpoints
+        :param failures: number of initial requests answered with 503
+        :param drop_connections: number of downloads dropping the connection
+        :param failure_rate: probability of a request being answered with 503
+        :param wrong_ranges: number of downloads answered with a wrong range
+        :param users: username: password of valid users, all users if None
+        :param host: host of the server
+        :param port: port of the server, a free port is used if 0
+        :param seed: seed for the random failures
+        """
+        if pkdata is None:
+            pkdata = create_pkdata()
+        if info_nodes is None:
+            info_nodes = self._info_nodes(pkdata)
+
+        self.pkdata = pkdata
+        self.info_nodes = info_nodes
+        self.latency = latency
+        self.page_size = page_size
+        self.failures = failures
+        self.drop_connections = drop_connections
+        self.failure_rate = failure_rate
+        self.wrong_ranges = wrong_ranges
+        self.users = users
+        self.token = "pkdb-test-token"
+        self.requests: List[str] = []
+        self.range_requests: List[Optional[str]] = []
+
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+        self._archives: Dict[str, bytes] = {}
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def api_url(self) -> str:
+        return self.base_url + "/api/v1"
+
+    def start(self) -> "PKDBServer":
+        """Starts serving in a background thread."""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"PK-DB test server running on {self.base_url}")
+        return self
+
+    def stop(self) -> None:
+        """Stops the server."""
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "PKDBServer":
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    @contextmanager
+    def client(self, user: str = None, password: str = None):
+        """Points the PKDB client to this server within the context."""
+        names = ["BASE_URL", "API_URL", "USER", "PASSWORD"]
+        values = [self.base_url, self.api_url, user, password]
+        original = {name: getattr(pkdb_analysis.query, name) for name in names}
+        for name, value in zip(names, values):
+            setattr(pkdb_analysis.query, name, value)
+        try:
+            yield self
+        finally:
+            for name, value in original.items():
+                setattr(pkdb_analysis.query, name, value)
+
+    @staticmethod
+    def _info_nodes(pkdata: PKData) -> pd.DataFrame:
+        """Info nodes for substances and measurement types of the data."""
+        nodes = []
+        for ntype, column in [
+            ("substance", "substance"),
+            ("measurement_type", "measurement_type"),
+        ]:
+            for sid in sorted(pkdata.outputs[column].dropna().unique()):
+                nodes.append({"sid": sid, "name": sid, "ntype": ntype})
+        return pd.DataFrame(nodes)
+
+    def filter_pkdata(self, params: Dict[str, str]) -> PKData:
+        """Filters the data by the study filters of the filter endpoint."""
+        studies = self.pkdata.studies.df
+        for key, value in params.items():
+            if not key.startswith("studies__"):
+                continue
+            field = key[len("studies__") :]
+            if field.endswith("__in"):
+                field = field[: -len("__in")]
+                studies = studies[studies[field].isin(value.split("__"))]
+            else:
+                studies = studies[studies[field] == value]
+
+        sids = set(studies["sid"])
+        data_dict = {"studies": studies}
+        for key in PKData.KEYS[1:]:
+            df = getattr(self.pkdata, key).df
+            if "study_sid" in df.columns:
+                df = df[df["study_sid"].isin(sids)]
+            data_dict[key] = df
+        return PKData(**data_dict)
+
+    @staticmethod
+    def project_pkdata(pkdata: PKData, params: Dict[str, str]) -> PKData:
+        """Selects the columns of the `columns__<key>` parameters."""
+        data_dict = pkdata.as_dict()
+        for key in PKData.KEYS:
+            columns = params.get(f"columns__{key}")
+            if columns is None:
+                continue
+            selector = PKData._column_selector(columns.split("__"))
+            df = data_dict[key]
+            data_dict[key] = df[[column for column in df.columns if selector(column)]]
+        return PKData(**data_dict)
+
+    def archive(self, query: str) -> bytes:
+        """Zip archive for the query string of the filter endpoint."""
+        with self._lock:
+            if query in self._archives:
+                return self._archives[query]
+
+        params = dict(urlparse.parse_qsl(query, keep_blank_values=True))
+        pkdata = self.project_pkdata(self.filter_pkdata(params), params)
+        tables = None
+        if "tables" in params:
+            tables = [key for key in params["tables"].split("__") if key]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "archive.zip"
+            pkdata.to_archive(path, tables=tables)
+            content = path.read_bytes()
+
+        with self._lock:
+            self._archives[query] = content
+        return content
+
+    def _fail(self) -> bool:
+        """Decides if the current request fails."""
+        with self._lock:
+            if self.failures > 0:
+                self.failures -= 1
+                return True
+            return self._rng.random() < self.failure_rate
+
+    def _drop(self) -> bool:
+        """Decides if the current download drops the connection."""
+        with self._lock:
+            if self.drop_connections > 0:
+                self.drop_connections -= 1
+                return True
+            return False
+
+    def _wrong_range(self) -> bool:
+        """Decides if the current download is answered with a wrong range."""
+        with self._lock:
+            if self.wrong_ranges > 0:
+                self.wrong_ranges -= 1
+                return True
+            return False
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _prepare(self) -> bool:
+                server.requests.append(self.path)
+                if server.latency:
+                    time.sleep(server.latency)
+                if server._fail():
+                    self._send_json({"detail": "Service unavailable"}, status=503)
+                    return False
+                return True
+
+            def _send_json(self, data, status: int = 200):
+                content = json.dumps(data).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def do_POST(self):
+                if not self._prepare():
+                    return
+                if self.path.rstrip("/") != "/api-token-auth":
+                    self._send_json({"detail": "Not found."}, status=404)
+                    return
+                length = int(self.headers.get("Content-Length", 0))
+                auth = json.loads(self.rfile.read(length) or b"{}")
+                username = auth.get("username")
+                if server.users is not None and (
+                    server.users.get(username) != auth.get("password")
+                ):
+                    self._send_json(
+                        {"non_field_errors": ["Unable to log in."]}, status=400
+                    )
+                    return
+                self._send_json({"token": server.token})
+
+            def do_GET(self):
+                if not self._prepare():
+                    return
+                url = urlparse.urlparse(self.path)
+                if url.path.rstrip("/") == "/api/v1/filter":
+                    self._send_archive(url.query)
+                elif url.path.rstrip("/") == "/api/v1/info_nodes":
+                    self._send_page(url.query, server.info_nodes)
+                else:
+                    self._send_json({"detail": "Not found."}, status=404)
+
+            def _send_page(self, query: str, df: pd.DataFrame):
+                params = dict(urlparse.parse_qsl(query))
+                page_size = min(
+                    int(params.get("page_size", server.page_size)), server.page_size
+                )
+                page = int(params.get("page", 1))
+                last_page = max(1, int(np.ceil(len(df) / page_size)))
+                data = df.iloc[(page - 1) * page_size : page * page_size]
+                self._send_json(
+                    {
+                        "current_page": page,
+                        "last_page": last_page,
+                        "data": {
+                            "count": len(df),
+                            "data": json.loads(data.to_json(orient="records")),
+                        },
+                    }
+                )
+
+            def _send_archive(self, query: str):
+                content = server.archive(query)
+                etag = f'"{hashlib.sha256(content).hexdigest()[:16]}"'
+                start = 0
+                range_header = self.headers.get("Range")
+                server.range_requests.append(range_header)
+                if_range = self.headers.get("If-Range")
+                if server._wrong_range():
+                    # partial content starting after the requested byte
+                    if range_header:
+                        start = int(range_header[len("bytes=") :].split("-")[0])
+                    start += 1
+                    self.send_response(206)
+                    self.send_header(
+                        "Content-Range",
+                        f"bytes {start}-{len(content) - 1}/{len(content)}",
+                    )
+                elif range_header and (if_range is None or if_range == etag):
+                    start = int(range_header[len("bytes=") :].split("-")[0])
+                    self.send_response(206)
+                    self.send_header(
+                        "Content-Range",
+                        f"bytes {start}-{len(content) - 1}/{len(content)}",
+                    )
+                else:
+                    self.send_response(200)
+                content = content[start:]
+                self.send_header("ETag", etag)
+                self.send_header("Content-Type", "application/zip")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                if server._drop():
+                    self.wfile.write(content[: len(content) // 2])
+                    self.wfile.flush()
+                    self.close_connection = True
+                    return
+                self.wfile.write(content)
+
+        return Handler
+
+
+def main() -> None:
+    """Runs the server from the command line."""
+    parser = argparse.ArgumentParser(description="Local PK-DB stand-in server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--studies", type=int, default=10, help="number of studies")
+    parser.add_argument("--archive", type=Path, help="serve PKData from zip archive")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    if args.archive:
+        pkdata = PKData.from_archive(args.archive)
+    else:
+        pkdata = create_pkdata(n_studies=args.studies)
+    server = PKDBServer(
+        pkdata,
+        latency=args.latency,
+        page_size=args.page_size,
+        failure_rate=args.failure_rate,
+        host=args.host,
+        port=args.port,
+    )
+    print(f"Serving PK-DB on {server.base_url} (set API_BASE={server.base_url})")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pkdb_analysis import columns
+from pkdb_analysis.columns import (
+    COLUMN_FUNCTIONS,
+    apply_column_function,
+    column_function,
+    register_column_function,
+    resolve_column_function,
+)
+from pkdb_analysis.deprecated.analysis import figure_category
+
+
+DF = pd.DataFrame(
+    {
+        "value": [1.0, 2.0, np.nan, 4.0],
+        "per_bw": [True, False, True, False],
+        "intervention_per_bw": [True, True, False, False],
+    },
+    index=[3, 3, 5, 7],
+)
+
+
+def double_value(d: pd.Series) -> float:
+    return 2 * d["value"]
+
+
+def test_column_function() -> None:
+    """Test column functions receive the selected columns."""
+
+    @column_function(columns=["value"])
+    def double(df: pd.DataFrame) -> pd.Series:
+        assert list(df.columns) == ["value"]
+        return 2 * df["value"]
+
+    timings = {}
+    values = apply_column_function(DF, double, name="double", timings=timings)
+    pd.testing.assert_series_equal(
+        values, DF.apply(double_value, axis=1), check_names=False
+    )
+    assert set(timings) == {"double"}
+
+
+def test_column_function_scalar() -> None:
+    """Test scalars of column functions are broadcasted to the rows."""
+    values = apply_column_function(DF, column_function(lambda df: "x"))
+    assert values.tolist() == ["x"] * len(DF)
+    assert (values.index == DF.index).all()
+
+    with pytest.raises(ValueError):
+        apply_column_function(DF, column_function(lambda df: df["value"].iloc[:2]))
+
+
+def test_register_column_function() -> None:
+    """Test registered column functions are resolved by name."""
+    register_column_function("test_double", lambda df: 2 * df["value"])
+    try:
+        values = apply_column_function(DF, "test_double")
+        assert values.iloc[-1] == 8.0
+        assert resolve_column_function("test_double") is COLUMN_FUNCTIONS["test_double"]
+    finally:
+        del COLUMN_FUNCTIONS["test_double"]
+
+    with pytest.raises(KeyError):
+        resolve_column_function("test_double")
+
+
+def test_row_function(monkeypatch) -> None:
+    """Test row-wise functions are applied and slow functions raise a warning."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        values = apply_column_function(DF, double_value)
+    pd.testing.assert_series_equal(values, DF.apply(double_value, axis=1))
+
+    monkeypatch.setattr(columns, "SLOW_ROW_FUNCTION_SECONDS", 0.0)
+    with pytest.warns(UserWarning, match="consider a column function"):
+        apply_column_function(DF, double_value, name="double")
+    assert apply_column_function(DF.iloc[:0], double_value).empty
+
+
+def test_unit_category() -> None:
+    """Test the vectorized unit category is equal to the row-wise category."""
+    values = apply_column_function(DF, "unit_category")
+    assert values.tolist() == DF.apply(figure_category, axis=1).tolist()
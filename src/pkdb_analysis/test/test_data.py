@@ -1,3 +1,4 @@
+import pandas as pd
 import pytest
 
 from pkdb_analysis import PKData
@@ -50,3 +51,23 @@ def test_concise_pks_3():
     assert d1.outputs.pks == d2.outputs.pks
     assert d1.timecourses.pks == d2.timecourses.pks
     # assert d1.scatters.pks == d2.scatters.pks
+
+
+def test_concat():
+    """Test merging of PKData instances by primary key."""
+    d1 = PKData(
+        studies=pd.DataFrame({"sid": ["S1"]}),
+        groups=pd.DataFrame(
+            {"group_pk": [1, 1, 2], "measurement_type": ["a", "b", "a"]}
+        ),
+    )
+    d2 = PKData(
+        studies=pd.DataFrame({"sid": ["S1", "S2"]}),
+        groups=pd.DataFrame({"group_pk": [2, 3], "measurement_type": ["c", "d"]}),
+    )
+    d = PKData.concat([d1, d2])
+
+    assert d.studies.pks == {"S1", "S2"}
+    assert len(d.studies) == 2
+    assert d.groups.pks == {1, 2, 3}
+    assert list(d.groups.measurement_type) == ["a", "b", "a", "d"]
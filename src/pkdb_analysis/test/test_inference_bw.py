@@ -8,6 +8,7 @@ from pkdb_analysis.data import PKData
 from pkdb_analysis.inference.body_weight import (
     infer_intervention,
     infer_output,
+    infer_table,
     infer_weight,
     ureg,
 )
@@ -128,3 +129,34 @@ def test_inference_by_body_weight3():
     ma.create_results()
     results_inferred = infer_weight(ma.results)
     assert len(results_inferred) > len(ma.results)
+
+
+@pytest.mark.parametrize("unit", ["ng", "mg / kilogram", "mg/100ml"])
+def test_infer_table(unit):
+    df = pd.DataFrame(
+        [INDIVIDUAL_OUTPUT, GROUP_OUTPUT, INDIVIDUAL_NO_BODYWEIGHT_OUTPUT] * 2,
+        index=[0, 0, 1, 1, 2, 2],
+    ).assign(unit=unit)
+    inferred = infer_table(df)
+    expected = df.apply(infer_output, axis="columns").dropna(how="all")
+
+    assert len(inferred) == len(expected) == 4
+    for field in ["unit", "inferred", "per_bw"]:
+        assert inferred[field].tolist() == expected[field].tolist()
+    for field in ["value", "mean", "sd", "cv"]:
+        np.testing.assert_array_equal(
+            inferred[field].astype(float), expected[field].astype(float)
+        )
+    assert inferred["median"].tolist() == [None] * 4
+
+
+def test_inference_by_body_weight_intervention_units():
+    df = pd.DataFrame([INDIVIDUAL_OUTPUT, GROUP_OUTPUT]).assign(
+        intervention_unit=["mg / kilogram", "ng"]
+    )
+    outputs = infer_weight(df, by_output=False)
+    assert len(outputs) == 4
+    units = outputs.intervention_unit.tolist()[2:]
+    assert units == ["milligram", "nanogram / kilogram"]
+    assert outputs.intervention_per_bw.tolist()[2:] == [False, True]
+    np.testing.assert_allclose(outputs.intervention_value[2:], [0.8 * 80, 0.8 / 80])
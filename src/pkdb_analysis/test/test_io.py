@@ -3,7 +3,9 @@ from pathlib import Path
 import pytest
 
 from pkdb_analysis import PKData
+from pkdb_analysis.dtypes import DTYPES
 from pkdb_analysis.test import TESTDATA_CONCISE_FALSE_ZIP, TESTDATA_CONCISE_TRUE_ZIP
+from pkdb_analysis.test.fixtures import create_pkdata
 
 
 def test_read_from_archive() -> None:
@@ -27,3 +29,51 @@ def test_h5(input_path: Path, tmp_path: Path) -> None:
     """Test conversion to HDF5."""
     pkdata = PKData.from_archive(path=input_path)
     pkdata.to_hdf5(tmp_path / "test.h5")
+
+
+def test_read_from_archive_projection(tmp_path: Path) -> None:
+    """Test reading selected tables and columns from archive."""
+    create_pkdata(n_studies=2).to_archive(path=tmp_path / "test.zip")
+    pkdata = PKData.from_archive(
+        path=tmp_path / "test.zip",
+        tables=["studies", "outputs"],
+        columns={"outputs": ["measurement_type", "value"]},
+    )
+    assert not pkdata.outputs.empty
+    assert set(pkdata.outputs.columns) == {
+        "study_sid",
+        "output_pk",
+        "group_pk",
+        "individual_pk",
+        "intervention_pk",
+        "measurement_type",
+        "value",
+    }
+    assert pkdata.timecourses.empty
+    assert list(pkdata.timecourses.columns) == list(DTYPES["timecourses"])
+    assert pkdata.timecourses.subset_pk.dtype == int
+
+
+def test_read_from_archive_empty_columns(tmp_path: Path) -> None:
+    """Test excluded and missing tables have the columns of parsed tables."""
+    pkdata = create_pkdata(n_studies=2)
+    pkdata.to_archive(path=tmp_path / "all.zip")
+    pkdata.to_archive(path=tmp_path / "outputs.zip", tables=["outputs"])
+    parsed = PKData.from_archive(path=tmp_path / "all.zip")
+    excluded = PKData.from_archive(path=tmp_path / "all.zip", tables=["outputs"])
+    missing = PKData.from_archive(path=tmp_path / "outputs.zip")
+
+    for key in PKData.KEYS:
+        columns = list(getattr(parsed, key).columns)
+        assert list(getattr(excluded, key).columns) == columns, key
+        assert list(getattr(missing, key).columns) == columns, key
+        if key != "outputs":
+            assert getattr(excluded, key).empty
+            assert getattr(missing, key).empty
+
+
+def test_read_from_archive_unsupported_table(tmp_path: Path) -> None:
+    """Test error for unknown tables."""
+    create_pkdata(n_studies=1).to_archive(path=tmp_path / "test.zip")
+    with pytest.raises(ValueError):
+        PKData.from_archive(path=tmp_path / "test.zip", tables=["outputs", "foo"])
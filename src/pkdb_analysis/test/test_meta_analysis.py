@@ -0,0 +1,196 @@
+import warnings
+
+import pandas as pd
+import pytest
+
+from pkdb_analysis.data import PKData, PKDataFrame
+from pkdb_analysis.meta_analysis import (
+    NUMERIC_FIELDS,
+    GroupedIndex,
+    MetaAnalysis,
+    RowRange,
+    study_fingerprints,
+)
+from pkdb_analysis.test.fixtures import create_pkdata
+
+
+@pytest.fixture(scope="module")
+def pkdata():
+    """PKData with multiple interventions per intervention_pk."""
+    pkdata = create_pkdata(n_studies=5)
+    df = pkdata.interventions.df
+    extra = []
+    for k, changes in [
+        (0, {"substance": "midazolam", "name": "midazolam"}),
+        (1, {"time": "2", "name": "caffeine_b"}),
+        (2, {"time": "1", "name": "caffeine_c"}),
+    ]:
+        row = df.iloc[k].copy()
+        for key, value in changes.items():
+            row[key] = value
+        extra.append(row)
+    interventions = pd.concat([pd.DataFrame(extra), df]).reset_index(drop=True)
+    pkdata.interventions = PKDataFrame(interventions, pk="intervention_pk")
+    return pkdata
+
+
+def test_grouped_index() -> None:
+    """Test row ranges of a grouped index."""
+    df = pd.DataFrame({"pk": [3, 1, 3, 2, 1], "x": range(5)})
+    index = GroupedIndex(df, "pk")
+    assert len(index) == 3 and 2 in index and 4 not in index
+    assert index.get(3).x.tolist() == [0, 2]
+    assert index.get(4).empty
+    ranges = index.ranges()
+    assert [len(r) for r in ranges] == [2, 1, 2]
+    assert isinstance(ranges[1], RowRange)
+    assert ranges[1].df.x.tolist() == [1, 4]
+
+
+@pytest.mark.parametrize(
+    "intervention_substances, first_intervention, names, removed",
+    [
+        ({"caffeine"}, False, [1, 4, 5], [2, 3]),
+        ({"caffeine"}, True, [1, 2, 3, 4, 5], []),
+        (None, False, [4, 5], [1, 2, 3]),
+    ],
+)
+def test_create_intervention_extra(
+    pkdata, intervention_substances, first_intervention, names, removed
+) -> None:
+    """Test selection of interventions and aggregated warnings."""
+    meta_analysis = MetaAnalysis(
+        pkdata, intervention_substances, first_intervention=first_intervention
+    )
+    with warnings.catch_warnings(record=True) as w:
+        warnings.simplefilter("always")
+        table = meta_analysis.create_intervention_extra()
+    messages = [m for m in w if "removed from the plots" in str(m.message)]
+    assert len(messages) == (1 if removed else 0)
+
+    assert table.intervention_pk.tolist() == names
+    assert table.substance.eq("caffeine").all()
+    assert meta_analysis.intervention_warnings.index.tolist() == removed
+    if first_intervention:
+        assert table.set_index("intervention_pk").time[3] == "0"
+    for pk, extra, number in zip(table.intervention_pk, table.extra, table.number):
+        assert len(extra) == number
+        assert extra.df.intervention_pk.eq(pk).all()
+
+
+def test_create_results() -> None:
+    """Test results with the referenced interventions."""
+    meta_analysis = MetaAnalysis(create_pkdata(n_studies=2), {"caffeine"})
+    meta_analysis.create_results()
+    results = meta_analysis.results
+    assert not results.empty
+    assert results.intervention_number.eq(1).all()
+    assert all(isinstance(e, RowRange) for e in results.intervention_extra)
+
+
+def test_subject_numeric_table() -> None:
+    """Test pivot of numeric fields with duplicated characteristica."""
+    df = pd.DataFrame(
+        {
+            "group_pk": [1, 1, 2, 2, 2],
+            "measurement_type": ["age", "weight", "weight", "weight", "sex"],
+            "mean": [30.0, 70.0, 80.0, 90.0, None],
+            "unit": ["year", "kg", "kg", "kg", None],
+        }
+    ).reindex(columns=["group_pk", "measurement_type", *NUMERIC_FIELDS])
+    table = MetaAnalysis.subject_numeric_table(df, "group_pk", ["weight", "age"])
+
+    assert len(table.columns) == 2 * len(NUMERIC_FIELDS)
+    assert table.loc[1, "mean_weight"] == 70.0 and table.loc[1, "unit_age"] == "year"
+    assert 2 not in table.index
+
+    empty = MetaAnalysis.subject_numeric_table(df.iloc[:0], "group_pk", ["age"])
+    assert empty.empty and "value_age" in empty.columns
+
+
+@pytest.mark.parametrize("subject", ["groups", "individuals"])
+def test_create_subject_table(subject) -> None:
+    """Test subject table with the referenced characteristica."""
+    pkdata = create_pkdata(n_studies=2)
+    meta_analysis = MetaAnalysis(pkdata, {"caffeine"})
+    table = meta_analysis.create_subject_table(subject)
+    subject_df = getattr(pkdata, subject)
+
+    assert len(table) == subject_df.pk_len
+    for pk, extra in zip(table[subject_df.pk], table.extra):
+        characteristica = subject_df[subject_df[subject_df.pk] == pk]
+        assert len(extra) == len(characteristica)
+        pks = set(characteristica.characteristica_pk)
+        assert set(extra.df.characteristica_pk) == pks
+    assert table[["mean_age", "value_age"]].max(axis=1).notnull().all()
+    assert meta_analysis.subject_index(subject) is meta_analysis.subject_index(subject)
+
+
+def test_study_fingerprints() -> None:
+    """Test fingerprints are independent of the row order and detect changes."""
+    pkdata = create_pkdata(n_studies=3)
+    fingerprints = study_fingerprints(pkdata)
+    assert fingerprints.index.tolist() == ["PKDB00001", "PKDB00002", "PKDB00003"]
+
+    tables = pkdata.as_dict()
+    tables["outputs"] = tables["outputs"].sample(frac=1.0, random_state=1)
+    pd.testing.assert_series_equal(study_fingerprints(PKData(**tables)), fingerprints)
+
+    outputs = tables["outputs"].copy()
+    outputs.loc[outputs.study_sid == "PKDB00002", "value"] *= 2
+    tables["outputs"] = outputs
+    changed = study_fingerprints(PKData(**tables)) != fingerprints
+    assert changed.tolist() == [False, True, False]
+
+
+def test_create_results_incremental() -> None:
+    """Test only new or changed studies are calculated."""
+    pkdata = create_pkdata(n_studies=3)
+    meta_analysis = MetaAnalysis(pkdata, {"caffeine"})
+    meta_analysis.create_results()
+    assert len(meta_analysis.calculated_studies) == 3
+    meta_analysis.create_results()
+    assert meta_analysis.calculated_studies == []
+
+    tables = pkdata.as_dict()
+    outputs = tables["outputs"].copy()
+    outputs.loc[outputs.study_sid == "PKDB00002", "value"] *= 2
+    tables["outputs"] = outputs[outputs.study_sid != "PKDB00003"]
+    meta_analysis.pkdata = PKData(**tables)
+    meta_analysis.create_results()
+    assert meta_analysis.calculated_studies == ["PKDB00002", "PKDB00003"]
+
+    expected = MetaAnalysis(PKData(**tables), {"caffeine"})
+    expected.create_results()
+    key = ["output_pk", "group_pk", "individual_pk"]
+    columns = ["study_sid", *key, "value", "intervention_value", "mean_weight"]
+    pd.testing.assert_frame_equal(
+        meta_analysis.results.sort_values(key)[columns].reset_index(drop=True),
+        expected.results.sort_values(key)[columns].reset_index(drop=True),
+    )
+    assert set(meta_analysis.results.study_sid) == {"PKDB00001", "PKDB00002"}
+
+
+def test_create_results_settings() -> None:
+    """Test changed settings of the analysis recalculate the studies."""
+    pkdata = create_pkdata(n_studies=3)
+    meta_analysis = MetaAnalysis(pkdata, {"caffeine"})
+    meta_analysis.create_results()
+    assert not meta_analysis.results.empty
+
+    for substances in [{"midazolam"}, {"caffeine"}]:
+        meta_analysis.intervention_substances = substances
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            meta_analysis.create_results()
+        assert len(meta_analysis.calculated_studies) == 3
+
+        expected = MetaAnalysis(pkdata, substances)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            expected.create_results()
+        assert len(meta_analysis.results) == len(expected.results)
+
+    meta_analysis.first_intervention = True
+    meta_analysis.create_results()
+    assert len(meta_analysis.calculated_studies) == 3
@@ -252,3 +252,39 @@ def test_example_midazolam():
     assert not np.isnan(pk.auc.magnitude)
     assert not np.isnan(pk.aucinf.magnitude)
     assert not np.isnan(pk.vd.magnitude)
+
+
+@pytest.mark.parametrize(
+    "f_example",
+    [example1, example2, example_midazolam, example_Kim2011_Fig2, example_Divoll1982_Fig1],
+)
+def test_resolve_units(f_example) -> None:
+    """Test pharmacokinetics with resolved units are identical."""
+    for tcpk in f_example():
+        for dose in [tcpk.dose, tcpk.Q_(np.nan, "mg")]:
+            pk = TimecoursePK(
+                tcpk.t, tcpk.c, dose=dose, ureg=tcpk.ureg, substance=tcpk.substance
+            ).pk
+            pk_resolved = TimecoursePK(
+                tcpk.t,
+                tcpk.c,
+                dose=dose,
+                ureg=tcpk.ureg,
+                substance=tcpk.substance,
+                resolve_units=True,
+            ).pk
+            for key in pk.parameters + ["slope", "intercept"]:
+                q, q_resolved = getattr(pk, key), getattr(pk_resolved, key)
+                assert q.units == q_resolved.units
+                assert q_resolved.magnitude == pytest.approx(q.magnitude, nan_ok=True)
+            for key in ["r_value", "p_value", "std_err", "max_idx"]:
+                assert getattr(pk_resolved, key) == pytest.approx(
+                    getattr(pk, key), nan_ok=True
+                )
+
+        pk = TimecoursePKNoDosing(tcpk.t, tcpk.c, ureg=tcpk.ureg).pk
+        pk_resolved = TimecoursePKNoDosing(
+            tcpk.t, tcpk.c, ureg=tcpk.ureg, resolve_units=True
+        ).pk
+        for key in pk.parameters:
+            assert getattr(pk, key).units == getattr(pk_resolved, key).units
@@ -0,0 +1,94 @@
+import warnings
+
+import numpy as np
+import pytest
+
+from pkdb_analysis.pk.batch import batch_pk
+from pkdb_analysis.pk.pharmacokinetics import TimecoursePK, TimecoursePKNoDosing
+from pkdb_analysis.test.test_pk_batch import assert_pk_equal, timecourses_df
+from pkdb_analysis.units import ureg
+
+
+Q_ = ureg.Quantity
+T = np.array([0.0, 0.5, 1, 2, 4, 6, 8, 12, 24])
+
+
+def exponential_tcpk(**kwargs) -> TimecoursePKNoDosing:
+    """Monoexponential timecourse c(t) = 10 * exp(-0.2 t)."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return TimecoursePKNoDosing(
+            time=Q_(T, "hr"),
+            concentration=Q_(10 * np.exp(-0.2 * T), "mg/l"),
+            ureg=ureg,
+            **kwargs,
+        )
+
+
+def test_linear_up_log_down_exact() -> None:
+    """Test log-down rule is exact for monoexponential timecourses."""
+    pk = exponential_tcpk(auc_method="linear_up_log_down").pk
+    pk_linear = exponential_tcpk().pk
+
+    assert pk.auc.magnitude == pytest.approx(50 * (1 - np.exp(-0.2 * 24)))
+    assert pk.aucinf.magnitude == pytest.approx(50)
+    assert pk.aumcinf.magnitude == pytest.approx(250)
+    assert pk.mrt.magnitude == pytest.approx(5)
+    assert str(pk.aumc.units) == "hour ** 2 * milligram / liter"
+    assert pk_linear.auc > pk.auc
+
+
+def test_partial_auc() -> None:
+    """Test partial AUC with interpolated window boundaries."""
+    tcpk = exponential_tcpk(auc_method="linear_up_log_down")
+    expected = 50 * (np.exp(-0.2 * 1.5) - np.exp(-0.2 * 10))
+
+    assert tcpk.partial_auc(Q_(1.5, "hr"), Q_(10, "hr")).magnitude == pytest.approx(
+        expected
+    )
+    assert tcpk.partial_auc(Q_(90, "min"), Q_(600, "min")).magnitude == pytest.approx(
+        expected
+    )
+    assert tcpk.partial_auc(Q_(0, "hr"), Q_(24, "hr")) == tcpk.pk.auc
+    assert np.isnan(tcpk.partial_auc(Q_(0, "hr"), Q_(48, "hr")).magnitude)
+
+
+@pytest.mark.parametrize("auc_method", ["linear", "linear_up_log_down"])
+def test_batch_pk_auc_methods(auc_method: str) -> None:
+    """Test batch AUC, AUMC, MRT and partial AUC are identical to TimecoursePK."""
+    rng = np.random.default_rng(1)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        tcpks = [
+            TimecoursePK(
+                time=Q_(T, "hr"),
+                concentration=Q_(
+                    10 * (np.exp(-0.2 * T) - np.exp(-k * T)) + rng.uniform(0, 0.1),
+                    "mg/l",
+                ),
+                dose=Q_(10, "mg"),
+                intervention_time=Q_(30, "min"),
+                ureg=ureg,
+                auc_method=auc_method,
+            )
+            for k in [1.0, 2.0, 4.0]
+        ]
+    windows = {
+        "auc_0_4": (Q_(0, "hr"), Q_(4, "hr")),
+        "auc_1_3": (Q_(1, "hr"), Q_(3, "hr")),
+    }
+    results = batch_pk(
+        timecourses_df(tcpks),
+        doses=[tcpk.dose for tcpk in tcpks],
+        ureg=ureg,
+        intervention_times=[tcpk.intervention_time for tcpk in tcpks],
+        auc_method=auc_method,
+        auc_windows=windows,
+    )
+
+    for k, tcpk in enumerate(tcpks):
+        assert_pk_equal(tcpk.pk.to_dict(), results.iloc[k])
+        for name, (start, end) in windows.items():
+            partial = tcpk.partial_auc(start, end)
+            assert results[name].iloc[k] == pytest.approx(partial.magnitude)
+            assert results[f"{name}_unit"].iloc[k] == str(partial.units)
@@ -0,0 +1,161 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pkdb_analysis.data import PKData
+from pkdb_analysis.pk.batch import batch_pk
+from pkdb_analysis.pk.pharmacokinetics import TimecoursePK, TimecoursePKNoDosing
+from pkdb_analysis.pk.pharmacokinetics_example import (
+    example1,
+    example2,
+    example_Divoll1982_Fig1,
+    example_Kim2011_Fig2,
+    example_midazolam,
+)
+from pkdb_analysis.test.fixtures import create_pkdata
+from pkdb_analysis.units import ureg
+
+
+Q_ = ureg.Quantity
+
+
+def assert_pk_equal(pk_dict: dict, row: pd.Series) -> None:
+    """Compares PKParameters.to_dict with a row of batch_pk."""
+    for key, value in pk_dict.items():
+        if key in ["slope", "intercept"]:
+            assert str(value.units) == row[f"{key}_unit"]
+            value = value.magnitude
+        if key == "compound" or key.endswith("_unit"):
+            assert str(value) == row[key], key
+        else:
+            assert float(row[key]) == pytest.approx(float(value), nan_ok=True), key
+
+
+def timecourses_df(tcpks) -> pd.DataFrame:
+    """Timecourses DataFrame of TimecoursePK instances."""
+    return pd.DataFrame(
+        [
+            {
+                "time": tuple(tcpk.t.magnitude),
+                "value": tuple(tcpk.c.magnitude),
+                "time_unit": str(tcpk.t.units),
+                "unit": str(tcpk.c.units),
+                "substance": tcpk.substance,
+            }
+            for tcpk in tcpks
+        ]
+    )
+
+
+@pytest.fixture(scope="module")
+def example_tcpks():
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return sum(
+            [
+                f()
+                for f in [
+                    example1,
+                    example2,
+                    example_midazolam,
+                    example_Kim2011_Fig2,
+                    example_Divoll1982_Fig1,
+                ]
+            ],
+            [],
+        )
+
+
+def test_batch_pk_examples(example_tcpks) -> None:
+    """Test batch pk is identical to TimecoursePK for the examples."""
+    df = timecourses_df(example_tcpks)
+    doses = [tcpk.dose for tcpk in example_tcpks]
+    results = batch_pk(df, doses=doses, ureg=example_tcpks[0].ureg)
+
+    assert len(results) == len(example_tcpks)
+    for k, tcpk in enumerate(example_tcpks):
+        assert_pk_equal(tcpk.pk.to_dict(), results.iloc[k])
+
+
+def test_batch_pk_no_dosing(example_tcpks) -> None:
+    """Test batch pk without doses is identical to TimecoursePKNoDosing."""
+    df = timecourses_df(example_tcpks)
+    results = batch_pk(df, ureg=example_tcpks[0].ureg)
+
+    assert "vd" not in results.columns
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        for k, tcpk in enumerate(example_tcpks):
+            pk = TimecoursePKNoDosing(
+                tcpk.t, tcpk.c, tcpk.ureg, substance=tcpk.substance
+            ).pk
+            assert_pk_equal(pk.to_dict(), results.iloc[k])
+
+
+def test_batch_pk_timecourses() -> None:
+    """Test batch pk on PKData timecourses with mixed units and doses."""
+    tcs = create_pkdata(n_studies=3).timecourses.df
+    tcs = tcs[~tcs["value"].isnull()].copy()
+    tcs.at[tcs.index[0], "time"] = tuple(np.array(tcs["time"].iloc[0]) * 60)
+    tcs.at[tcs.index[0], "time_unit"] = "min"
+    tcs.at[tcs.index[1], "unit"] = "µmol/l"
+    doses = [Q_(100.0, "mg")] * len(tcs)
+    doses[2] = Q_(np.nan, "mg")
+    doses[3] = Q_(1.5, "mg/kg")
+    intervention_times = [Q_(0.25, "hr")] * len(tcs)
+
+    results = batch_pk(tcs, doses, ureg=ureg, intervention_times=intervention_times)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        for k, (_, tc) in enumerate(tcs.iterrows()):
+            tcpk = TimecoursePK(
+                time=Q_(np.array(tc.time), tc.time_unit),
+                concentration=Q_(np.array(tc.value), tc.unit),
+                dose=doses[k],
+                intervention_time=intervention_times[k],
+                substance=tc.substance,
+                ureg=ureg,
+            )
+            assert_pk_equal(tcpk.pk.to_dict(), results.loc[tc.name])
+
+
+@pytest.mark.parametrize("concentration", ["value", "mean", "median"])
+def test_batch_pk_downloaded_timecourses(tmp_path, concentration: str) -> None:
+    """Test batch pk on downloaded timecourses of individuals and groups."""
+    path = tmp_path / "pkdata.zip"
+    create_pkdata(n_studies=3, n_groups=1, n_individuals=2).to_archive(path)
+    tcs = PKData.from_download(path).timecourses.df
+
+    results = batch_pk(tcs, concentration=concentration)
+
+    assert results.index.tolist() == tcs.index.tolist()
+    reported = tcs[concentration].map(np.ndim) == 1
+    assert results.loc[~reported, "auc"].isnull().all()
+    assert results.loc[~reported, "kel"].isnull().all()
+    assert not results.loc[reported, "auc"].isnull().any()
+    if reported.any():
+        pd.testing.assert_frame_equal(
+            results[reported],
+            batch_pk(tcs[reported], concentration=concentration),
+        )
+
+
+def test_batch_pk_short_curves() -> None:
+    """Test parameters which can not be calculated are NaN."""
+    df = pd.DataFrame(
+        {
+            "time": [(0.0, 1.0, 2.0), (0.0, 1.0, 2.0, 3.0, 4.0), ()],
+            "value": [(1.0, 2.0, 1.0), (0.0, 1.0, 2.0, 3.0, 4.0), ()],
+            "time_unit": "hr",
+            "unit": "mg/l",
+        }
+    )
+    results = batch_pk(df, [Q_(1.0, "mg")] * 3, ureg=ureg)
+
+    assert results.auc.tolist()[:2] == [3.0, 8.0]
+    assert results.kel.isnull().all()
+    assert results.vd.isnull().all()
+    assert np.isnan(results.cmax.iloc[2])
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+from pkdb_analysis.pk.batch import batch_pk
+from pkdb_analysis.pk.cache import PKCache, content_hash
+from pkdb_analysis.test.fixtures import create_pkdata
+from pkdb_analysis.units import ureg
+
+
+Q_ = ureg.Quantity
+
+
+def test_content_hash() -> None:
+    """Test hash depends on the content only."""
+    t = np.array([0.0, 1.0, 2.0])
+    key = content_hash(t, "hr", Q_(1, "mg"), {"a": 1, "b": None})
+
+    assert key == content_hash(t.copy(), "hr", Q_(1, "mg"), {"b": None, "a": 1})
+    assert key != content_hash(t + 1e-12, "hr", Q_(1, "mg"), {"a": 1, "b": None})
+    assert key != content_hash(t, "min", Q_(1, "mg"), {"a": 1, "b": None})
+    assert key != content_hash(t, "hr", Q_(1, "g"), {"a": 1, "b": None})
+
+
+def test_batch_pk_cache(tmp_path) -> None:
+    """Test cached results are identical and only changed curves are calculated."""
+    tcs = create_pkdata(n_studies=3).timecourses.df
+    tcs = tcs[~tcs["value"].isnull()].copy()
+    doses = [Q_(100.0, "mg")] * len(tcs)
+    expected = batch_pk(tcs, doses, ureg=ureg)
+
+    cache = PKCache(tmp_path / "cache.sqlite")
+    results = batch_pk(tcs, doses, ureg=ureg, cache=cache)
+    pd.testing.assert_frame_equal(results, expected)
+    assert (cache.hits, cache.misses) == (0, len(tcs))
+
+    # new run with one changed timecourse
+    cache = PKCache(tmp_path / "cache.sqlite")
+    tcs.at[tcs.index[0], "value"] = tuple(np.array(tcs["value"].iloc[0]) * 2)
+    results = batch_pk(tcs, doses, ureg=ureg, cache=cache)
+    assert (cache.hits, cache.misses) == (len(tcs) - 1, 1)
+    pd.testing.assert_frame_equal(results.iloc[1:], expected.iloc[1:])
+    assert results.auc.iloc[0] == 2 * expected.auc.iloc[0]
+
+    # options are part of the key
+    batch_pk(tcs, doses, ureg=ureg, cache=cache, auc_method="linear_up_log_down")
+    assert cache.misses == 1 + len(tcs)
+
+
+def test_cache_eviction(tmp_path) -> None:
+    """Test least recently used results are evicted."""
+    cache = PKCache(tmp_path / "cache.sqlite", max_size=1000)
+    for k in range(20):
+        cache.set_many({f"key{k}": {"values": list(np.random.rand(20))}})
+        if k >= 1:
+            cache.get_many(["key0"])
+
+    assert cache.size <= 1000
+    assert 0 < len(cache) < 20
+    assert set(cache.get_many(["key0", "key19"])) == {"key0", "key19"}
+    assert cache.get_many(["key1"]) == {}
+
@@ -0,0 +1,58 @@
+import re
+
+import numpy as np
+import pytest
+from matplotlib.image import imread
+
+from pkdb_analysis.pk.figures import PKFigureTemplate, pk_curves, render_pk_figures
+from pkdb_analysis.test.fixtures import create_pkdata
+from pkdb_analysis.units import ureg
+
+
+@pytest.fixture(scope="module")
+def timecourses():
+    tcs = create_pkdata(n_studies=2).timecourses.df
+    return tcs[~tcs["value"].isnull()].iloc[:5]
+
+
+def test_pk_figure_template(timecourses) -> None:
+    """Test the template is reused for different curves."""
+    template = PKFigureTemplate(figsize=(4, 2), dpi=50)
+    curves = list(pk_curves(timecourses))
+    images = []
+    for curve in curves[:2] + curves[:1]:
+        template.draw(curve)
+        images.append(template.to_array())
+
+    assert images[0].shape == (100, 200, 4)
+    assert not np.array_equal(images[0], images[1])
+    np.testing.assert_array_equal(images[0], images[2])
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_render_pk_figures_pdf(timecourses, tmp_path, n_jobs: int) -> None:
+    """Test multipage PDF with a page per timecourse."""
+    path = tmp_path / "figures.pdf"
+    paths = render_pk_figures(
+        timecourses,
+        path,
+        intervention_times=[ureg.Quantity(0.5, "hr")] * len(timecourses),
+        n_jobs=n_jobs,
+        chunk_size=2,
+        figsize=(4, 2),
+        dpi=50,
+    )
+
+    assert paths == [path]
+    pages = re.findall(rb"/Type\s*/Page\b", path.read_bytes())
+    assert len(pages) == len(timecourses)
+
+
+def test_render_pk_figures_grid(timecourses, tmp_path) -> None:
+    """Test image grids of the figures."""
+    paths = render_pk_figures(
+        timecourses, tmp_path / "figures.png", grid=(2, 2), figsize=(4, 2), dpi=50
+    )
+
+    assert [p.name for p in paths] == ["figures_000.png", "figures_001.png"]
+    assert imread(paths[0]).shape[:2] == (200, 400)
@@ -0,0 +1,128 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pkdb_analysis.pk.multiple_dose import (
+    parse_dosing_schedule,
+    single_dose_profile,
+    superposition,
+)
+from pkdb_analysis.pk.pharmacokinetics import TimecoursePK
+from pkdb_analysis.pk.timecourses import timecourse_dosings
+from pkdb_analysis.units import ureg
+
+
+Q_ = ureg.Quantity
+T = np.array([0, 0.5, 1, 2, 4, 6, 8, 12, 24, 36.0])
+
+
+@pytest.mark.parametrize(
+    "time, time_end, expected",
+    [
+        ("0", None, [0]),
+        (2.5, None, [2.5]),
+        ("0, 12, 24", None, [0, 12, 24]),
+        ("[24;0;12]", None, [0, 12, 24]),
+        ("0:12:48", None, [0, 12, 24, 36, 48]),
+        ("0:8", 24.0, [0, 8, 16, 24]),
+    ],
+)
+def test_parse_dosing_schedule(time, time_end, expected) -> None:
+    """Test parsing of dosing time patterns."""
+    np.testing.assert_allclose(parse_dosing_schedule(time, time_end), expected)
+
+
+@pytest.mark.parametrize("time", ["", "every day", "0:12", "0:-1:10", np.nan])
+def test_parse_dosing_schedule_invalid(time) -> None:
+    """Test invalid dosing time patterns raise a ValueError."""
+    with pytest.raises(ValueError):
+        parse_dosing_schedule(time)
+
+
+def test_superposition() -> None:
+    """Test superposition is the sum of the shifted single dose profiles."""
+    t, c = T[1:], 10 * (np.exp(-0.2 * T[1:]) - np.exp(-2 * T[1:]))
+    dosing_times = np.array([0.0, 7.0, 12.5, 30.0])
+    weights = np.array([1.0, 0.5, 2.0, 1.0])
+    t_eval = np.linspace(-5, 60, 301)
+
+    expected = sum(
+        w * single_dose_profile(t, c, 0.2, t_eval - t_dose)
+        for t_dose, w in zip(dosing_times, weights)
+    )
+    np.testing.assert_allclose(
+        superposition(t, c, 0.2, dosing_times, t_eval, weights=weights), expected
+    )
+    assert single_dose_profile(t, c, 0.2, np.array([-1.0, 0.0]))[1] == 0.0
+
+
+def test_steady_state() -> None:
+    """Test steady state of a monoexponential timecourse."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        tcpk = TimecoursePK(
+            time=Q_(T, "hr"),
+            concentration=Q_(10 * np.exp(-0.2 * T), "mg/l"),
+            dose=Q_(10, "mg"),
+            ureg=ureg,
+            auc_method="linear_up_log_down",
+        )
+    ss = tcpk.steady_state(Q_(12, "hr"))
+    r = 1 / (1 - np.exp(-0.2 * 12))
+
+    assert ss.accumulation_ratio == pytest.approx(r)
+    assert ss.cmax.to("mg/l").magnitude == pytest.approx(10 * r)
+    assert ss.cmin.to("mg/l").magnitude == pytest.approx(10 * r * np.exp(-2.4))
+    aucinf = tcpk.pk.aucinf.to(ss.auctau.units).magnitude
+    assert ss.auctau.magnitude == pytest.approx(aucinf)
+    assert ss.tmax.magnitude == 0.0
+
+    # two doses in minutes
+    md = tcpk.multiple_dose(Q_([0, 720], "min"))
+    assert md.n_doses == 2
+    assert md.tau == Q_(12, "hr")
+    assert md.cmax.to("mg/l").magnitude == pytest.approx(10 * (1 + np.exp(-2.4)))
+
+
+def test_steady_state_not_converged() -> None:
+    """Test a warning is raised if the steady state requires more doses."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        tcpk = TimecoursePK(
+            time=Q_(T, "hr"),
+            concentration=Q_(10 * np.exp(-0.2 * T), "mg/l"),
+            dose=Q_(10, "mg"),
+            ureg=ureg,
+        )
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        tcpk.steady_state(Q_(12, "hr"))
+    with pytest.warns(UserWarning, match="max_doses"):
+        ss = tcpk.steady_state(Q_(12, "hr"), max_doses=2)
+    assert ss.n_doses == 2
+
+
+def test_timecourse_dosings_schedule() -> None:
+    """Test dosing schedules of the interventions."""
+    interventions = pd.DataFrame(
+        {
+            "intervention_pk": [1, 2, 3],
+            "measurement_type": "dosing",
+            "normed": True,
+            "substance": "caffeine",
+            "value": 100.0,
+            "unit": "mg",
+            "time": ["0", "0:12", "twice"],
+            "time_end": [np.nan, 36.0, np.nan],
+            "time_unit": "hr",
+        }
+    )
+    timecourses = pd.DataFrame({"intervention_pk": [1, 2, 3], "substance": "caffeine"})
+    dosings = timecourse_dosings(timecourses, interventions)
+
+    assert dosings.dosing_schedule.tolist()[:2] == [(0.0,), (0.0, 12.0, 24.0, 36.0)]
+    assert np.isnan(dosings.dosing_schedule.iloc[2])
+    assert dosings.dosing_time.tolist()[0] == 0.0
+    assert dosings.dosing_time.isnull().tolist() == [False, True, True]
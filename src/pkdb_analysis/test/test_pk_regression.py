@@ -0,0 +1,154 @@
+import warnings
+
+import numpy as np
+import pytest
+from scipy import stats
+
+from pkdb_analysis.pk.batch import batch_pk
+from pkdb_analysis.pk.pharmacokinetics import TimecoursePK
+from pkdb_analysis.pk.regression import best_fit_regression
+from pkdb_analysis.test.test_pk_batch import timecourses_df
+from pkdb_analysis.units import ureg
+
+
+Q_ = ureg.Quantity
+
+
+def brute_force(x: np.ndarray, y: np.ndarray, tolerance: float = 1e-4):
+    """Best trailing window by regression of every window."""
+    fits = []
+    for start in range(len(x) - 2):
+        fit = stats.linregress(x[start:], y[start:])
+        n = len(x) - start
+        if fit.slope < 0:
+            adj = 1 - (1 - fit.rvalue ** 2) * (n - 1) / (n - 2)
+            fits.append((adj, n, fit))
+    best = max(adj for adj, _, _ in fits)
+    return max(
+        [(n, fit) for adj, n, fit in fits if adj >= best - tolerance],
+        key=lambda f: f[0],
+    )
+
+
+def biexponential(t: np.ndarray) -> np.ndarray:
+    """Timecourse with distribution and elimination phase (kel = 0.1 1/hr)."""
+    return 10 * np.exp(-1.5 * t) + 2 * np.exp(-0.1 * t) - 12 * np.exp(-3.0 * t)
+
+
+def test_best_fit_regression_brute_force() -> None:
+    """Test best fit regression against regressions of all windows."""
+    rng = np.random.default_rng(42)
+    xs, ys = [], []
+    for k in range(20):
+        x = np.sort(rng.uniform(0, 24, size=rng.integers(3, 15)))
+        y = np.log(biexponential(x + 1)) + rng.normal(0, 0.05, size=x.size)
+        xs.append(x)
+        ys.append(y)
+    ids = np.repeat(np.arange(len(xs)), [x.size for x in xs])
+    fit = best_fit_regression(np.concatenate(xs), np.concatenate(ys), ids, len(xs))
+
+    for k, (x, y) in enumerate(zip(xs, ys)):
+        n, expected = brute_force(x, y)
+        assert fit["n_points"][k] == n
+        for key, value in zip(
+            ["slope", "intercept", "r_value", "p_value", "std_err"], expected
+        ):
+            assert fit[key][k] == pytest.approx(value, rel=1e-6, abs=1e-12), key
+
+
+def test_best_fit_regression_ragged() -> None:
+    """Test segments are independent of long and short segments in the batch."""
+    rng = np.random.default_rng(1)
+    lengths = np.concatenate([rng.integers(0, 8, size=200), [2000]])
+    xs = [np.sort(rng.uniform(0, 24, size=n)) for n in lengths]
+    ys = [np.log(biexponential(x + 1)) + rng.normal(0, 0.05, x.size) for x in xs]
+    ids = np.repeat(np.arange(lengths.size), lengths)
+    fit = best_fit_regression(np.concatenate(xs), np.concatenate(ys), ids, len(xs))
+
+    for k in [0, 1, 2, 100, len(xs) - 1]:
+        single = best_fit_regression(xs[k], ys[k], np.zeros(lengths[k], int), 1)
+        for key, value in single.items():
+            assert fit[key][k] == pytest.approx(value[0], rel=1e-6, nan_ok=True)
+
+
+def test_best_fit_regression_no_window() -> None:
+    """Test NaN results for segments without a window with negative slope."""
+    x = np.array([0.0, 1.0, 2.0, 0.0, 1.0])
+    y = np.array([1.0, 2.0, 3.0, 2.0, 1.0])
+    fit = best_fit_regression(x, y, np.array([0, 0, 0, 1, 1]), 3)
+
+    assert fit["n_points"].tolist() == [0, 0, 0]
+    assert np.isnan(fit["slope"]).all()
+
+
+def test_best_fit_lambda_z() -> None:
+    """Test best fit lambda_z excludes the distribution phase."""
+    t = np.array([0.0, 0.25, 0.5, 1, 2, 3, 4, 6, 8, 12, 16, 24])
+    kwargs = dict(
+        time=Q_(t, "hr"),
+        concentration=Q_(biexponential(t), "mg/l"),
+        dose=Q_(10, "mg"),
+        ureg=ureg,
+    )
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        pk_all = TimecoursePK(**kwargs).pk
+        tcpk = TimecoursePK(lambda_z="best_fit", **kwargs)
+
+    assert abs(pk_all.kel.magnitude - 0.1) > 0.01
+    assert tcpk.pk.kel.magnitude == pytest.approx(0.1, rel=1e-2)
+
+    results = batch_pk(
+        timecourses_df([tcpk]), doses=[tcpk.dose], ureg=ureg, lambda_z="best_fit"
+    )
+    for key in ["kel", "thalf", "aucinf", "vd", "cl", "r_value", "std_err"]:
+        value = getattr(tcpk.pk, key)
+        value = getattr(value, "magnitude", value)
+        assert results[key].iloc[0] == pytest.approx(value), key
+
+
+@pytest.mark.parametrize("lambda_z", ["after_max", "best_fit"])
+def test_lambda_z_zero_concentration(lambda_z) -> None:
+    """Test a zero concentration only changes the results of its timecourse."""
+    t = np.array([0.0, 0.25, 0.5, 1, 2, 3, 4, 6, 8, 12, 16, 24])
+    tcpks = []
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        for k in range(5):
+            c = biexponential(t) * (k + 1)
+            if k == 3:
+                c[-2] = 0.0
+            tcpks.append(
+                TimecoursePK(
+                    time=Q_(t, "hr"),
+                    concentration=Q_(c, "mg/l"),
+                    dose=Q_(10, "mg"),
+                    ureg=ureg,
+                    lambda_z=lambda_z,
+                )
+            )
+        results = batch_pk(
+            timecourses_df(tcpks),
+            doses=[tcpk.dose for tcpk in tcpks],
+            ureg=ureg,
+            lambda_z=lambda_z,
+        )
+
+        for k, tcpk in enumerate(tcpks):
+            for key in ["kel", "thalf", "aucinf"]:
+                value = getattr(tcpk.pk, key)
+                value = getattr(value, "magnitude", value)
+                assert np.isfinite(value), (k, key)
+                assert results[key].iloc[k] == pytest.approx(value), (k, key)
+
+
+def test_lambda_z_invalid() -> None:
+    """Test unknown lambda_z methods raise a ValueError."""
+    with pytest.raises(ValueError):
+        TimecoursePK(
+            time=Q_(np.arange(5.0), "hr"),
+            concentration=Q_(np.arange(5.0), "mg/l"),
+            dose=Q_(1, "mg"),
+            ureg=ureg,
+            lambda_z="all",
+        )
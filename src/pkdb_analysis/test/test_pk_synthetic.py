@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from pkdb_analysis.pk.batch import batch_pk
+from pkdb_analysis.pk.synthetic import MODELS, synthetic_timecourses
+from pkdb_analysis.units import ureg
+
+
+Q_ = ureg.Quantity
+
+
+@pytest.mark.parametrize("model", MODELS)
+def test_synthetic_timecourses(model) -> None:
+    """Test shape and reproducibility of synthetic timecourses."""
+    timecourses, doses = synthetic_timecourses(50, n_points=12, model=model, seed=1)
+    assert len(timecourses) == len(doses) == 50
+    assert {len(t) for t in timecourses.time} == {12}
+    c = np.array(timecourses.value.tolist())
+    assert np.all(c[:, 0] == 0) and np.all(c[:, 1:] > 0)
+
+    again, _ = synthetic_timecourses(50, n_points=12, model=model, seed=1)
+    assert again.value.tolist() == timecourses.value.tolist()
+
+    pk_df = batch_pk(timecourses, doses)
+    assert pk_df.kel.notnull().all() and (pk_df.tmax > 0).all()
+
+
+def test_synthetic_timecourses_units() -> None:
+    """Test NaN density and timecourses in different units."""
+    kwargs = dict(n_timecourses=300, n_points=20, nan_fraction=0.2, seed=2)
+    timecourses, doses = synthetic_timecourses(**kwargs)
+    c = np.array(timecourses.value.tolist())
+    assert not np.isnan(c[:, 0]).any()
+    assert np.isnan(c[:, 1:]).mean() == pytest.approx(0.2, abs=0.02)
+
+    mixed, _ = synthetic_timecourses(
+        **kwargs, time_units=["hr", "min"], units=["mg/l", "ng/ml"]
+    )
+    assert mixed.time_unit.tolist()[:3] == ["hr", "min", "hr"]
+    pk_df, pk_mixed = batch_pk(timecourses, doses), batch_pk(mixed, doses)
+    for key, unit in [("aucinf", "mg*hr/l"), ("thalf", "hr"), ("cmax", "mg/l")]:
+        np.testing.assert_allclose(
+            *(
+                [
+                    Q_(v, u).to(unit).magnitude
+                    for v, u in zip(df[key], df[f"{key}_unit"])
+                ]
+                for df in (pk_df, pk_mixed)
+            )
+        )
+
+
+def test_synthetic_timecourses_invalid() -> None:
+    """Test invalid arguments."""
+    with pytest.raises(ValueError):
+        synthetic_timecourses(1, model="three_compartment")
+    with pytest.raises(ValueError):
+        synthetic_timecourses(1, nan_fraction=1.0)
@@ -0,0 +1,114 @@
+import subprocess
+import sys
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pkdb_analysis import PKData
+from pkdb_analysis.pk.cache import PKCache
+from pkdb_analysis.pk.pharmacokinetics import TimecoursePK
+from pkdb_analysis.test.fixtures import create_pkdata
+from pkdb_analysis.units import ureg
+
+
+@pytest.fixture(scope="module")
+def pkdata(tmp_path_factory) -> PKData:
+    path = tmp_path_factory.mktemp("pk") / "pkdata.zip"
+    create_pkdata(n_studies=4, n_groups=1, n_individuals=2).to_archive(path)
+    return PKData.from_download(path)
+
+
+def test_compute_pk(pkdata: PKData) -> None:
+    """Test pharmacokinetics of all timecourses."""
+    results = pkdata.compute_pk()
+
+    assert results.subset_pk.tolist() == pkdata.timecourses.subset_pk.tolist()
+    assert results.warnings.map(len).sum() == 0
+    assert (results.dose_unit == "milligram").all()
+    assert (results.vd_unit == "liter").all()
+
+    Q_ = ureg.Quantity
+    tc = pkdata.timecourses.df.iloc[0]
+    dosing = pkdata.interventions.df.set_index("intervention_pk").loc[
+        tc.intervention_pk
+    ]
+    pk = TimecoursePK(
+        time=Q_(np.array(tc.time), tc.time_unit),
+        concentration=Q_(np.array(tc.value), tc.unit),
+        dose=Q_(dosing.value, dosing.unit),
+        ureg=ureg,
+    ).pk
+    row = results.iloc[0]
+    assert row.concentration_field == "value"
+    for key in pk.parameters:
+        assert row[key] == pytest.approx(getattr(pk, key).magnitude, nan_ok=True)
+        assert row[f"{key}_unit"] == str(getattr(pk, key).units)
+
+
+def test_compute_pk_processes(pkdata: PKData) -> None:
+    """Test pharmacokinetics in a process pool are identical."""
+    results = pkdata.compute_pk()
+    results_pool = pkdata.compute_pk(n_jobs=2, chunk_size=3)
+    pd.testing.assert_frame_equal(results, results_pool)
+
+
+def test_compute_pk_warnings(pkdata: PKData) -> None:
+    """Test warnings are captured for every timecourse."""
+    tcs = pkdata.timecourses.df.copy()
+    # short timecourse without regression
+    tcs.at[tcs.index[0], "time"] = tcs["time"].iloc[0][:3]
+    tcs.at[tcs.index[0], "value"] = tcs["value"].iloc[0][:3]
+    # metabolite uses the only dosing of the timecourse
+    tcs.at[tcs.index[1], "substance"] = "paraxanthine"
+    # no dosing
+    tcs.at[tcs.index[2], "intervention_pk"] = -1
+    pkdata = PKData(**{**pkdata.as_dict(), "timecourses": tcs})
+
+    with warnings.catch_warnings(record=True) as record:
+        warnings.simplefilter("always")
+        results = pkdata.compute_pk()
+    assert not [w for w in record if "Regression" in str(w.message)]
+
+    assert any("Regression" in w for w in results.warnings.iloc[0])
+    assert np.isnan(results.kel.iloc[0])
+    assert results.compound.iloc[1] == "paraxanthine"
+    assert not np.isnan(results.vd.iloc[1])
+    assert any("No dosing" in w for w in results.warnings.iloc[2])
+    assert np.isnan(results.vd.iloc[2])
+    assert not np.isnan(results.auc.iloc[2])
+
+
+def test_compute_pk_cache(pkdata: PKData, tmp_path) -> None:
+    """Test cached results are identical to the calculated results."""
+    expected = pkdata.compute_pk()
+    cache = PKCache(tmp_path / "cache.sqlite")
+
+    pd.testing.assert_frame_equal(pkdata.compute_pk(cache=cache), expected)
+    pd.testing.assert_frame_equal(pkdata.compute_pk(cache=cache), expected)
+    assert cache.hits == cache.misses == len(expected)
+
+
+def test_compute_pk_missing_dose_unit(tmp_path) -> None:
+    """Test missing units of interventions stay null and skip the dose."""
+    pkdata = create_pkdata(n_studies=2, n_groups=1, n_individuals=2)
+    pkdata.interventions["unit"] = np.nan
+    path = tmp_path / "pkdata.zip"
+    pkdata.to_archive(path)
+    pkdata = PKData.from_download(path)
+    assert pkdata.interventions.df["unit"].isnull().all()
+
+    results = pkdata.compute_pk()
+    assert results.warnings.map(lambda w: any("No unit" in m for m in w)).all()
+    assert results.vd.isnull().all()
+    assert not results.auc.isnull().any()
+
+
+def test_data_import_without_pk() -> None:
+    """Test importing the data module does not import the pk package."""
+    code = (
+        "import sys, pkdb_analysis.data; "
+        "assert 'pkdb_analysis.pk.timecourses' not in sys.modules"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
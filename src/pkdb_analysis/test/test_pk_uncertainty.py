@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pkdb_analysis.pk.batch import batch_pk
+from pkdb_analysis.pk.uncertainty import monte_carlo_pk, sample_concentrations
+from pkdb_analysis.test.fixtures import create_pkdata
+from pkdb_analysis.units import ureg
+
+
+Q_ = ureg.Quantity
+T = np.array([0.5, 1, 2, 4, 6, 8, 12, 24])
+C = 10 * (np.exp(-0.2 * T) - np.exp(-2.0 * T))
+
+
+def timecourses(sd: float = 0.1) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "time": [tuple(T), tuple(T[:-1])],
+            "mean": [tuple(C), tuple(2 * C[:-1])],
+            "sd": [tuple(sd * C), tuple(sd * 2 * C[:-1])],
+            "cv": [tuple([sd] * T.size), tuple([sd] * (T.size - 1))],
+            "time_unit": ["hr", "min"],
+            "unit": "mg/l",
+        },
+        index=pd.Index(["tc1", "tc2"], name="subset"),
+    )
+
+
+def test_sample_concentrations() -> None:
+    """Test mean and sd of the sampled concentrations."""
+    rng = np.random.default_rng(42)
+    c = np.array([1.0, 10.0, 0.0, 5.0])
+    sd = np.array([0.2, 1.0, 1.0, np.nan])
+    for distribution in ["lognormal", "normal"]:
+        samples = sample_concentrations(c, sd, 100000, rng, distribution)
+        assert samples.shape == (100000, 4)
+        assert (samples >= 0).all()
+        assert samples[:, :2].mean(axis=0) == pytest.approx(c[:2], rel=1e-2)
+        assert samples[:, :2].std(axis=0) == pytest.approx(sd[:2], rel=2e-2)
+        assert (samples[:, 3] == 5.0).all()
+
+
+def test_monte_carlo_pk() -> None:
+    """Test confidence intervals contain the parameters of the timecourses."""
+    tcs = timecourses()
+    doses = [Q_(100, "mg")] * 2
+    result = monte_carlo_pk(tcs, doses=doses, ureg=ureg, n_samples=500, seed=1)
+    pk = batch_pk(tcs, doses=doses, ureg=ureg, concentration="mean")
+
+    assert list(result.index.names) == ["subset", "parameter"]
+    for subset in tcs.index:
+        for parameter in ["auc", "cmax", "kel", "thalf", "vd"]:
+            row = result.loc[(subset, parameter)]
+            value = pk.loc[subset, parameter]
+            assert row["lower"] < value < row["upper"]
+            assert row["mean"] == pytest.approx(value, rel=0.05)
+            assert row["unit"] == pk.loc[subset, f"{parameter}_unit"]
+            assert row["valid"] == 1.0
+
+
+def test_monte_carlo_pk_seed() -> None:
+    """Test results are reproducible with a seed and cv equals sd."""
+    tcs = timecourses()
+    kwargs = dict(ureg=ureg, n_samples=100, seed=7)
+    result = monte_carlo_pk(tcs, **kwargs)
+    pd.testing.assert_frame_equal(result, monte_carlo_pk(tcs, **kwargs))
+    pd.testing.assert_frame_equal(
+        result, monte_carlo_pk(tcs, dispersion="cv", **kwargs)
+    )
+    assert not result.equals(monte_carlo_pk(tcs, ureg=ureg, n_samples=100, seed=8))
+    assert "vd" not in result.index.get_level_values("parameter")
+
+
+def test_monte_carlo_pk_no_dispersion() -> None:
+    """Test without dispersion all samples are identical to the timecourse."""
+    result = monte_carlo_pk(timecourses(sd=0.0), ureg=ureg, n_samples=10, seed=1)
+    auc = result.xs("auc", level="parameter")
+    assert (auc["lower"] == auc["upper"]).all()
+    assert (auc["sd"] == 0).all()
+
+
+def test_sample_concentrations_positive() -> None:
+    """Test samples of the normal distribution with large sd are positive."""
+    rng = np.random.default_rng(42)
+    samples = sample_concentrations(C, 0.8 * C, 10000, rng, "normal")
+    assert (samples > 0).all()
+
+
+@pytest.mark.parametrize("lambda_z", ["after_max", "best_fit"])
+def test_monte_carlo_pk_large_dispersion(lambda_z) -> None:
+    """Test parameters of (formerly zero clipped) normal samples are valid."""
+    result = monte_carlo_pk(
+        timecourses(sd=0.8),
+        ureg=ureg,
+        n_samples=200,
+        seed=1,
+        distribution="normal",
+        lambda_z=lambda_z,
+    )
+    assert (result.xs("auc", level="parameter")["valid"] == 1.0).all()
+    assert (result.xs("kel", level="parameter")["valid"] > 0.9).all()
+
+
+def test_monte_carlo_pk_pkdata() -> None:
+    """Test timecourses of PKData with scalar NaN concentrations or sd."""
+    tcs = create_pkdata(n_studies=1).timecourses.df
+    for concentration in ["mean", "value"]:
+        result = monte_carlo_pk(
+            tcs, ureg=ureg, concentration=concentration, n_samples=20, seed=1
+        )
+        cmax = result.xs("cmax", level="parameter")
+        reported = tcs[concentration].apply(lambda v: isinstance(v, tuple)).values
+        dispersion = tcs["sd"].apply(lambda v: isinstance(v, tuple)).values
+
+        assert len(cmax) == len(tcs)
+        assert cmax["mean"].notnull().values[reported].all()
+        assert cmax["mean"].isnull().values[~reported].all()
+        undispersed = cmax[reported & ~dispersion]
+        assert (undispersed["lower"] == undispersed["upper"]).all()
@@ -0,0 +1,81 @@
+import warnings
+
+import pandas as pd
+import pytest
+
+from pkdb_analysis.core import Core, Sid
+from pkdb_analysis.meta_analysis import RESULTS_KEYS, results_pkdata
+from pkdb_analysis.plotting.factory import (
+    PlotContentDefinition,
+    pkdata_by_plot_content,
+    results,
+)
+from pkdb_analysis.plotting.results_cache import REFERENCE_COLUMNS
+from pkdb_analysis.test.fixtures import create_pkdata
+
+
+CORE = Core(sids={"auc", "cmax", "caffeine"})
+
+
+def double_value(d):
+    return 2 * d["value"]
+
+
+@pytest.fixture(scope="module")
+def data_dict():
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return pkdata_by_plot_content(
+            create_pkdata(n_studies=3),
+            [
+                PlotContentDefinition(sid=Sid("auc", CORE)),
+                PlotContentDefinition(sid=Sid("cmax", CORE)),
+            ],
+            intervention_substances={"caffeine"},
+            output_substances={"caffeine"},
+            exclude_study_names=set(),
+        )
+
+
+def test_results_pkdata(data_dict) -> None:
+    """Test only the tables of the results are sent to the workers."""
+    pkd = list(data_dict.values())[0]
+    subset = results_pkdata(pkd)
+    for key, df in subset.as_dict().items():
+        assert len(df) == (len(getattr(pkd, key).df) if key in RESULTS_KEYS else 0)
+
+
+def test_results_parallel(data_dict) -> None:
+    """Test results of a process pool are equal to sequential results."""
+    kwargs = dict(
+        data_dict=data_dict,
+        intervention_substances={"caffeine"},
+        additional_information={"double": double_value},
+        url="",
+        replacements={},
+    )
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        sequential = results(**kwargs, n_jobs=1)
+        parallel = results(**kwargs, n_jobs=2)
+
+    assert list(parallel) == list(sequential) == list(data_dict)
+    for plot_content, df in sequential.items():
+        pd.testing.assert_frame_equal(
+            parallel[plot_content].drop(columns=REFERENCE_COLUMNS),
+            df.drop(columns=REFERENCE_COLUMNS),
+        )
+
+
+def test_results_parallel_not_picklable(data_dict) -> None:
+    """Test results are created sequentially for lambda functions."""
+    with pytest.warns(UserWarning, match="created sequentially"):
+        created = results(
+            data_dict,
+            intervention_substances={"caffeine"},
+            additional_information={"double": lambda d: 2 * d["value"]},
+            url="",
+            replacements={},
+            n_jobs=2,
+        )
+    assert list(created) == list(data_dict)
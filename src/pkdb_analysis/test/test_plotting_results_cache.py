@@ -0,0 +1,130 @@
+import functools
+import warnings
+
+import pandas as pd
+import pytest
+
+from pkdb_analysis.core import Core, Sid
+from pkdb_analysis.meta_analysis import MetaAnalysis
+from pkdb_analysis.plotting.factory import (
+    PlotContentDefinition,
+    pkdata_by_plot_content,
+    results,
+)
+from pkdb_analysis.plotting.results_cache import (
+    REFERENCE_COLUMNS,
+    ResultsCache,
+    callable_fingerprint,
+)
+from pkdb_analysis.test.fixtures import create_pkdata
+
+
+CORE = Core(sids={"auc", "cmax", "caffeine"})
+
+
+@pytest.fixture(scope="module")
+def data_dict():
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return pkdata_by_plot_content(
+            create_pkdata(n_studies=2),
+            [PlotContentDefinition(sid=Sid("auc", CORE))],
+            intervention_substances={"caffeine"},
+            output_substances={"caffeine"},
+            exclude_study_names=set(),
+        )
+
+
+def test_results_cache(tmp_path, data_dict, monkeypatch) -> None:
+    """Test results are only created for inputs which are not cached."""
+    calls = []
+    create_results = MetaAnalysis.create_results
+
+    def counted_create_results(self):
+        calls.append(self)
+        create_results(self)
+
+    monkeypatch.setattr(MetaAnalysis, "create_results", counted_create_results)
+    cache = ResultsCache(tmp_path / "results.h5")
+    kwargs = dict(
+        data_dict=data_dict,
+        intervention_substances={"caffeine"},
+        additional_information={"double": lambda d: 2 * d["value"]},
+        url="",
+        replacements={},
+        cache=cache,
+    )
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        created = results(**kwargs)
+        cached = results(**kwargs)
+        assert len(calls) == 1 and cache.hits == 1 and len(cache.keys()) == 1
+
+        df = list(created.values())[0].drop(columns=REFERENCE_COLUMNS)
+        pd.testing.assert_frame_equal(list(cached.values())[0], df)
+
+        results(**{**kwargs, "replacements": {"intervention_route": {"oral": "po"}}})
+        assert len(calls) == 2 and len(cache.keys()) == 2
+
+    cache.clear()
+    assert cache.keys() == []
+
+
+def test_callable_fingerprint() -> None:
+    """Test fingerprints of functions change with the code."""
+
+    def f(d):
+        return d["value"]
+
+    def g(d):
+        return 2 * d["value"]
+
+    assert callable_fingerprint(f) == callable_fingerprint(f)
+    code_f, code_g = (callable_fingerprint(h).split(":")[1] for h in (f, g))
+    assert code_f != code_g
+    assert callable_fingerprint(len) == "builtins.len"
+
+
+def scale(d):
+    return d["value"]
+
+
+def scaled(d):
+    return 2 * scale(d)
+
+
+def test_callable_fingerprint_references(monkeypatch) -> None:
+    """Test fingerprints change with helpers, closures and partial arguments."""
+    fingerprint = callable_fingerprint(scaled)
+    monkeypatch.setitem(globals(), "scale", lambda d: d["value"] + 1)
+    assert callable_fingerprint(scaled) != fingerprint
+
+    def closure(factor):
+        return lambda d: factor * d["value"]
+
+    assert callable_fingerprint(closure(2)) == callable_fingerprint(closure(2))
+    assert callable_fingerprint(closure(2)) != callable_fingerprint(closure(3))
+
+    def multiply(d, factor):
+        return factor * d["value"]
+
+    assert callable_fingerprint(
+        functools.partial(multiply, factor=2)
+    ) != callable_fingerprint(functools.partial(multiply, factor=3))
+
+
+def test_results_cache_version(tmp_path, data_dict) -> None:
+    """Test the version of the cache is part of the keys."""
+    kwargs = dict(
+        data_dict=data_dict,
+        intervention_substances={"caffeine"},
+        additional_information={},
+        url="",
+        replacements={},
+    )
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        results(**kwargs, cache=ResultsCache(tmp_path / "results.h5"))
+        cache = ResultsCache(tmp_path / "results.h5", version="2")
+        results(**kwargs, cache=cache)
+    assert cache.hits == 0 and len(cache.keys()) == 2
@@ -1,6 +1,18 @@
+import asyncio
 import os
+import threading
+import time
+from io import BytesIO
+from pathlib import Path
 
-from pkdb_analysis import PKDB, PKFilter
+import pandas as pd
+import pytest
+import requests
+
+from pkdb_analysis import PKDB, PKData, PKFilter, query_pkdb_data
+from pkdb_analysis.dtypes import DTYPES
+from pkdb_analysis.test.fixtures import create_pkdata
+from pkdb_analysis.test.server import PKDBServer
 
 
 # os.environ["API_BASE"] = "http://localhost:8000/api/v1"
@@ -20,3 +32,269 @@ def test_query_infonodes() -> None:
     info_nodes = PKDB.query_info_nodes_sids()
     print(info_nodes)
     assert 1
+
+
+@pytest.fixture
+def archive_bytes(tmp_path: Path) -> bytes:
+    """Archive of an empty PKData instance."""
+    pkdata = PKData(
+        **{key: pd.DataFrame(columns=list(dtypes)) for key, dtypes in DTYPES.items()}
+    )
+    path = tmp_path / "empty.zip"
+    pkdata.to_archive(path)
+    return path.read_bytes()
+
+
+@pytest.fixture
+def offline_pkdb(monkeypatch, archive_bytes: bytes) -> dict:
+    """Replaces the download from PK-DB by a slow local download."""
+    state = {"running": 0, "max_running": 0, "urls": []}
+    lock = threading.Lock()
+
+    def _download(url, headers):
+        with lock:
+            state["running"] += 1
+            state["max_running"] = max(state["max_running"], state["running"])
+            state["urls"].append(url)
+        time.sleep(0.05)
+        with lock:
+            state["running"] -= 1
+        return BytesIO(archive_bytes)
+
+    monkeypatch.setattr(PKDB, "_download", staticmethod(_download))
+    monkeypatch.setattr(
+        PKDB, "get_authentication_headers", classmethod(lambda cls, *args: {})
+    )
+    return state
+
+
+def test_aquery(offline_pkdb: dict) -> None:
+    """Test asynchronous query of a single filter."""
+    pkdata = asyncio.run(PKDB.aquery(PKFilter()))
+    assert isinstance(pkdata, PKData)
+    assert len(offline_pkdb["urls"]) == 1
+
+
+def test_query_many(offline_pkdb: dict) -> None:
+    """Test concurrent queries are limited by max_concurrency."""
+    pkfilters = []
+    for k in range(6):
+        pkfilter = PKFilter()
+        pkfilter.studies = {"name": f"Study{k}"}
+        pkfilters.append(pkfilter)
+
+    results = PKDB.query_many(pkfilters, max_concurrency=2)
+
+    assert len(results) == 6
+    assert all(isinstance(pkdata, PKData) for pkdata in results)
+    assert offline_pkdb["max_running"] == 2
+    assert len(offline_pkdb["urls"]) == 6
+
+
+def test_query_many_processes(offline_pkdb: dict) -> None:
+    """Test parsing of the archives in a process pool."""
+    results = PKDB.query_many([PKFilter(), PKFilter()], processes=True)
+    assert len(results) == 2
+    assert all(isinstance(pkdata, PKData) for pkdata in results)
+
+
+def test_query_sharded_running_loop(offline_pkdb: dict) -> None:
+    """Test blocking queries within a running event loop (e.g. jupyter)."""
+
+    async def notebook_cell() -> PKData:
+        names = [f"Study{k}" for k in range(25)]
+        return query_pkdb_data(study_names=names, shard_size=10)
+
+    pkdata = asyncio.run(notebook_cell())
+    assert isinstance(pkdata, PKData)
+    assert len(offline_pkdb["urls"]) == 3
+
+
+def test_pkfilter_shards() -> None:
+    """Test splitting of a filter in shards."""
+    pkfilter = PKFilter()
+    names = [f"Study{k}" for k in range(7)]
+    pkfilter.studies["name__in"] = "__".join(names)
+
+    shards = pkfilter.shards(shard_size=3)
+    assert len(shards) == 3
+    shard_names = [shard.studies["name__in"].split("__") for shard in shards]
+    assert [len(n) for n in shard_names] == [3, 3, 1]
+    assert sum(shard_names, []) == names
+    # original filter is not modified
+    assert pkfilter.studies["name__in"] == "__".join(names)
+    assert pkfilter.shards(shard_size=10) == [pkfilter]
+
+
+def test_query_pkdb_data_sharded(offline_pkdb: dict) -> None:
+    """Test long lists of study names are queried in shards."""
+    names = [f"Study{k}" for k in range(25)]
+    pkdata = query_pkdb_data(study_names=names, shard_size=10)
+
+    assert isinstance(pkdata, PKData)
+    assert len(offline_pkdb["urls"]) == 3
+
+
+@pytest.fixture(scope="module")
+def local_pkdata() -> PKData:
+    return create_pkdata(n_studies=6, n_groups=1, n_individuals=2)
+
+
+def test_server_query(local_pkdata: PKData) -> None:
+    """Test query against the local PK-DB server."""
+    with PKDBServer(local_pkdata, users={"pkdb": "secret"}) as server:
+        with server.client(user="pkdb", password="secret"):
+            pkdata = query_pkdb_data(study_names=["Study1", "Study3"])
+            info_nodes = PKDB.query_info_nodes_sids()
+
+    assert set(pkdata.studies.name) == {"Study1", "Study3"}
+    assert pkdata.outputs.study_name.isin({"Study1", "Study3"}).all()
+    assert info_nodes == {"caffeine", "auc", "cmax", "concentration", "thalf"}
+    assert server.requests[0] == "/api-token-auth/"
+
+
+def test_pkfilter_projection() -> None:
+    """Test projection parameters of the filter."""
+    pkfilter = PKFilter(
+        tables=["studies", "outputs"], columns={"outputs": ["substance", "value"]}
+    )
+    params = pkfilter._flat_params()
+    assert params["tables"] == "studies__outputs"
+    assert params["columns__outputs"] == "substance__value"
+    assert "tables" not in PKFilter()._flat_params()
+    with pytest.raises(ValueError):
+        PKFilter(tables=["foo"])
+
+
+def test_server_query_projection(local_pkdata: PKData) -> None:
+    """Test excluded tables are not downloaded."""
+    pkfilter = PKFilter(
+        tables=["studies", "interventions", "outputs"],
+        columns={"outputs": ["measurement_type", "value", "unit"]},
+    )
+    with PKDBServer(local_pkdata) as server:
+        with server.client():
+            pkdata = PKDB.query(pkfilter)
+        content = server.archive(pkfilter.url_params[1:])
+        content_all = server.archive(PKFilter().url_params[1:])
+
+    assert len(content) < len(content_all)
+    assert pkdata.studies.pk_len == 6
+    assert pkdata.interventions.pk_len == 6
+    assert "unit" in pkdata.outputs.columns
+    assert "tissue" not in pkdata.outputs.columns
+    for key in ["groups", "individuals", "timecourses", "scatters"]:
+        df = getattr(pkdata, key)
+        assert df.empty
+        assert list(df.columns) == list(DTYPES[key])
+
+
+def test_server_query_sharded(local_pkdata: PKData) -> None:
+    """Test sharded query gives the same data as a single query."""
+    names = [f"Study{k}" for k in range(1, 7)]
+    with PKDBServer(local_pkdata, latency=0.01) as server:
+        with server.client():
+            pkdata = query_pkdb_data(study_names=names, shard_size=100)
+            pkdata_sharded = query_pkdb_data(study_names=names, shard_size=2)
+
+    assert len(server.requests) == 1 + 3
+    for key in PKData.KEYS:
+        df = getattr(pkdata, key)
+        df_sharded = getattr(pkdata_sharded, key)
+        assert len(df) == len(df_sharded)
+    assert pkdata.outputs.output_pk.sort_values().tolist() == (
+        pkdata_sharded.outputs.output_pk.sort_values().tolist()
+    )
+    assert pkdata.interventions.pk_len == pkdata_sharded.interventions.pk_len
+
+
+def test_server_page_size(local_pkdata: PKData) -> None:
+    """Test paginated endpoints with small page sizes."""
+    with PKDBServer(local_pkdata, page_size=2) as server:
+        with server.client():
+            info_nodes = PKDB.query_info_nodes_sids()
+
+    assert len(info_nodes) == 5
+    assert len(server.requests) == 1 + 3
+
+
+def test_download_retry_resume(monkeypatch, local_pkdata: PKData) -> None:
+    """Test download is retried and resumed after failures."""
+    monkeypatch.setattr(PKDB, "BACKOFF_FACTOR", 0.01)
+    with PKDBServer(local_pkdata, failures=1, drop_connections=1) as server:
+        with server.client():
+            pkdata = PKDB.query()
+        content = server.archive(PKFilter().url_params[1:])
+
+    assert pkdata.studies.pk_len == 6
+    assert len(server.requests) == 3
+    # 503 response, dropped download, resumed download
+    range_headers = server.range_requests
+    assert len(range_headers) == 2
+    assert range_headers[0] is None
+    # resumed from the bytes received before the connection dropped
+    start = int(range_headers[1][len("bytes=") : -1])
+    assert 0 < start <= len(content) // 2
+
+
+def test_download_changed_archive(monkeypatch, local_pkdata: PKData) -> None:
+    """Test a changed archive is downloaded completely instead of resumed."""
+    monkeypatch.setattr(PKDB, "BACKOFF_FACTOR", 0.01)
+    changed = create_pkdata(n_studies=2)
+    with PKDBServer(local_pkdata, drop_connections=1) as server:
+        archive = server.archive
+        calls = []
+
+        def changing_archive(query: str) -> bytes:
+            calls.append(query)
+            if len(calls) == 1:
+                return archive(query)
+            with PKDBServer(changed) as other:
+                return other.archive(query)
+
+        server.archive = changing_archive
+        with server.client():
+            pkdata = PKDB.query()
+
+    # resumed request with If-Range answered with the complete new archive
+    assert server.range_requests[1] is not None
+    assert pkdata.studies.pk_len == changed.studies.pk_len
+
+
+def test_download_timeout(monkeypatch, local_pkdata: PKData) -> None:
+    """Test stalled requests time out and are retried."""
+    monkeypatch.setattr(PKDB, "BACKOFF_FACTOR", 0.01)
+    monkeypatch.setattr(PKDB, "RETRIES", 1)
+    monkeypatch.setattr(PKDB, "TIMEOUT", (1.0, 0.05))
+    with PKDBServer(local_pkdata, latency=0.5) as server:
+        with server.client():
+            with pytest.raises(requests.exceptions.Timeout):
+                PKDB.query(PKFilter())
+    assert len(server.requests) >= 2
+
+
+def test_download_wrong_range(monkeypatch, local_pkdata: PKData) -> None:
+    """Test unexpected ranges restart the download until retries are exhausted."""
+    monkeypatch.setattr(PKDB, "BACKOFF_FACTOR", 0.01)
+    monkeypatch.setattr(PKDB, "RETRIES", 2)
+    with PKDBServer(local_pkdata, wrong_ranges=1) as server:
+        with server.client():
+            pkdata = PKDB.query()
+    assert pkdata.studies.pk_len == 6
+    assert len(server.requests) == 2
+
+    with PKDBServer(local_pkdata, wrong_ranges=100) as server:
+        with server.client():
+            with pytest.raises(requests.exceptions.RetryError):
+                PKDB.query()
+    assert len(server.requests) == 3
+
+
+def test_download_retries_exhausted(monkeypatch, local_pkdata: PKData) -> None:
+    """Test error is raised if all retries fail."""
+    monkeypatch.setattr(PKDB, "BACKOFF_FACTOR", 0.01)
+    monkeypatch.setattr(PKDB, "RETRIES", 1)
+    with PKDBServer(local_pkdata, failures=3) as server:
+        with server.client():
+            with pytest.raises(requests.exceptions.HTTPError):
+                PKDB.query()